@@ -0,0 +1,120 @@
+"""
+anomalias.py
+- Detector de tendencias por cama sobre el stream de vitales (FC / SpO2)
+- EWMA rápida vs. lenta para detectar deterioro gradual (cambio por ventana de ~10 min)
+- z-score sobre la EWMA rápida: una muestra atípica no entra en las medias (un glitch aislado no
+  simula una tendencia). Sólo protege el estado de la tendencia: los umbrales clínicos fijos se
+  evalúan sobre cada muestra, porque una caída brusca real también es atípica
+- Memoria y trabajo O(1) por muestra
+"""
+
+import math
+import os
+
+TAU_RAPIDA = float(os.environ.get("TENDENCIA_TAU_RAPIDA", "60"))    # s
+TAU_LENTA  = float(os.environ.get("TENDENCIA_TAU_LENTA",  "600"))   # s
+# Ventana sobre la que se expresa el cambio ("SpO2 cae 3% en 10 min")
+VENTANA    = float(os.environ.get("TENDENCIA_VENTANA",    "600"))   # s
+
+# z-score a partir del cual una muestra se considera glitch
+Z_ATIPICO = float(os.environ.get("TENDENCIA_Z_ATIPICO", "4.0"))
+# Glitches consecutivos tras los cuales se acepta el cambio como real
+ATIPICOS_MAX = 3
+# Muestras antes de emitir eventos (calentamiento del detector)
+MUESTRAS_MINIMAS = 12
+
+# Cambio (fast - slow) que dispara una alerta de tendencia
+CAIDA_SPO2 = float(os.environ.get("TENDENCIA_CAIDA_SPO2", "3"))    # %
+CAMBIO_FC  = float(os.environ.get("TENDENCIA_CAMBIO_FC",  "20"))   # lpm
+
+VARIANZA_MINIMA = 1.0
+
+EVENTO_ATIPICO = "ATIPICO"
+EVENTO_BAJA    = "BAJA"
+EVENTO_SUBE    = "SUBE"
+
+
+class DetectorVital:
+    """EWMA rápida/lenta + varianza exponencial para una señal de una cama."""
+
+    __slots__ = ("umbral", "rapida", "lenta", "varianza", "t", "muestras", "atipicos", "armado")
+
+    def __init__(self, umbral: float):
+        self.umbral   = umbral
+        self.rapida   = None
+        self.lenta    = None
+        self.varianza = VARIANZA_MINIMA
+        self.t        = None
+        self.muestras = 0
+        self.atipicos = 0
+        self.armado   = True
+
+    @property
+    def delta(self) -> float:
+        """Cambio estimado en VENTANA segundos.
+
+        Ante una rampa de pendiente m, rapida - lenta converge a m·(TAU_LENTA - TAU_RAPIDA).
+        """
+        if self.rapida is None:
+            return 0.0
+        return (self.rapida - self.lenta) * VENTANA / (TAU_LENTA - TAU_RAPIDA)
+
+    def actualizar(self, valor: float, t: float) -> str | None:
+        """Procesa una muestra; devuelve ATIPICO, BAJA, SUBE o None."""
+        if self.rapida is None:
+            self.rapida = self.lenta = float(valor)
+            self.t = t
+            self.muestras = 1
+            return None
+
+        dt = max(t - self.t, 0.0)
+        desvio = valor - self.rapida
+
+        # Muestra atípica → no contamina las medias (el llamador igual evalúa sus umbrales)
+        if self.muestras >= MUESTRAS_MINIMAS and abs(desvio) > Z_ATIPICO * math.sqrt(self.varianza):
+            self.atipicos += 1
+            if self.atipicos < ATIPICOS_MAX:
+                return EVENTO_ATIPICO
+        self.atipicos = 0
+
+        a_rapida = 1 - math.exp(-dt / TAU_RAPIDA)
+        a_lenta  = 1 - math.exp(-dt / TAU_LENTA)
+        self.rapida  += a_rapida * desvio
+        self.lenta   += a_lenta * (valor - self.lenta)
+        self.varianza = max(VARIANZA_MINIMA, (1 - a_rapida) * (self.varianza + a_rapida * desvio * desvio))
+        self.t = t
+        self.muestras += 1
+
+        if self.muestras < MUESTRAS_MINIMAS:
+            return None
+
+        # Histéresis: re-armar cuando la tendencia vuelve a la mitad del umbral
+        delta = self.delta
+        if not self.armado:
+            if abs(delta) < self.umbral / 2:
+                self.armado = True
+            return None
+        if delta <= -self.umbral:
+            self.armado = False
+            return EVENTO_BAJA
+        if delta >= self.umbral:
+            self.armado = False
+            return EVENTO_SUBE
+        return None
+
+
+class DetectorVitales:
+    """Par de detectores FC + SpO2 de una cama."""
+
+    __slots__ = ("fc", "spo2")
+
+    def __init__(self):
+        self.fc   = DetectorVital(CAMBIO_FC)
+        self.spo2 = DetectorVital(CAIDA_SPO2)
+
+    def actualizar(self, fc: int, spo2: int, t: float) -> dict:
+        """Devuelve {"fc": evento|None, "spo2": evento|None}; 0 = sin medición."""
+        return {
+            "fc":   self.fc.actualizar(fc, t)     if fc   > 0 else None,
+            "spo2": self.spo2.actualizar(spo2, t) if spo2 > 0 else None,
+        }
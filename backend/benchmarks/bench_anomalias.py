@@ -0,0 +1,97 @@
+"""
+bench_anomalias.py — replay del detector de tendencias sobre muestras de vitales
+
+Uso (desde backend/):
+    python benchmarks/bench_anomalias.py                    # 2M muestras sintéticas
+    python benchmarks/bench_anomalias.py -n 5000000
+    python benchmarks/bench_anomalias.py --bd               # histórico de la tabla vitales (DATABASE_URL)
+    python benchmarks/bench_anomalias.py --bd --limite 1000000
+
+Reporta muestras/s y eventos emitidos por tipo.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from anomalias import DetectorVitales  # noqa: E402
+
+INTERVALO_VITALES = 10  # s entre muestras (igual que el ESP32)
+
+
+def muestras_sinteticas(n: int, camas: int, semilla: int = 7):
+    """(cama, t, fc, spo2) con deriva lenta, glitches y ceros del MAX30102."""
+    rnd = random.Random(semilla)
+    fc_base   = [rnd.uniform(65, 90) for _ in range(camas)]
+    spo2_base = [rnd.uniform(95, 99) for _ in range(camas)]
+    for i in range(n):
+        cama = i % camas
+        t    = (i // camas) * INTERVALO_VITALES
+        fc_base[cama]   = min(140, max(45, fc_base[cama]   + rnd.gauss(0, 0.3)))
+        spo2_base[cama] = min(100, max(80, spo2_base[cama] + rnd.gauss(0, 0.05)))
+        fc   = int(fc_base[cama]   + rnd.gauss(0, 2))
+        spo2 = int(spo2_base[cama] + rnd.gauss(0, 0.7))
+        r = rnd.random()
+        if r < 0.002:
+            fc, spo2 = 0, 0
+        elif r < 0.004:
+            fc = rnd.choice((0, 30, 220))
+        yield cama, t, fc, spo2
+
+
+def muestras_bd(limite: int | None):
+    from database import SessionLocal
+    from models import Vitales
+
+    db = SessionLocal()
+    try:
+        q = db.query(Vitales.paciente_id, Vitales.timestamp, Vitales.fc, Vitales.spo2).order_by(Vitales.id)
+        if limite:
+            q = q.limit(limite)
+        for pid, ts, fc, spo2 in q.yield_per(50_000):
+            yield pid, ts.timestamp() if ts else 0.0, fc or 0, spo2 or 0
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=2_000_000, help="muestras sintéticas")
+    parser.add_argument("--camas", type=int, default=200)
+    parser.add_argument("--bd", action="store_true", help="leer histórico desde la tabla vitales")
+    parser.add_argument("--limite", type=int, default=None, help="máximo de filas a leer con --bd")
+    args = parser.parse_args()
+
+    # Materializar primero para medir sólo el detector
+    fuente   = muestras_bd(args.limite) if args.bd else muestras_sinteticas(args.n, args.camas)
+    muestras = list(fuente)
+    print(f"Muestras cargadas: {len(muestras):,}")
+
+    detectores: dict = {}
+    eventos = Counter()
+    inicio = time.perf_counter()
+    for cama, t, fc, spo2 in muestras:
+        det = detectores.get(cama)
+        if det is None:
+            det = detectores[cama] = DetectorVitales()
+        ev = det.actualizar(fc, spo2, t)
+        if ev["fc"]:
+            eventos[f"fc_{ev['fc']}"] += 1
+        if ev["spo2"]:
+            eventos[f"spo2_{ev['spo2']}"] += 1
+    dur = time.perf_counter() - inicio
+
+    print(f"Camas:      {len(detectores)}")
+    print(f"Tiempo:     {dur:.2f} s")
+    print(f"Throughput: {len(muestras) / dur:,.0f} muestras/s")
+    for k, v in sorted(eventos.items()):
+        print(f"  {k:<14} {v:,}")
+
+
+if __name__ == "__main__":
+    main()
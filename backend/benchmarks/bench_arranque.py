@@ -0,0 +1,99 @@
+"""
+bench_arranque.py — tiempo de import y de arranque del backend, con presupuesto
+
+Uso (desde backend/):
+    python benchmarks/bench_arranque.py                                   # SQLite temporal
+    python benchmarks/bench_arranque.py --bd mysql://… --repeticiones 9
+    python benchmarks/bench_arranque.py --presupuesto-import-ms 1200 --presupuesto-arranque-ms 150
+
+Cada repetición es un proceso nuevo (como un contenedor recién escalado) que mide:
+  - import: `import main` completo (FastAPI, SQLAlchemy, modelos, rutas)
+  - arranque: el lifespan hasta quedar listo para atender (init_db, alertas activas,
+    temporizadores de escalado, tareas de fondo lanzadas)
+y qué subsistemas pesados quedaron cargados. El primer arranque sobre la BD (crea el esquema)
+se reporta aparte; el resto son arranques con el esquema ya aplicado.
+
+Sale con 1 si la mediana de import o de arranque supera su presupuesto, o si ReportLab, Resend
+o aiohttp se cargaron al arrancar (deben cargarse en el primer uso) — apto para CI.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+PESADOS = ("reportlab", "resend", "aiohttp")
+
+HIJO = """
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+
+async def arrancar():
+    async with main.lifespan(main.app):
+        t2 = time.perf_counter()
+    return t2
+
+t2 = asyncio.run(arrancar())
+print(json.dumps({"import": (t1 - t0) * 1000, "arranque": (t2 - t1) * 1000,
+                  "pesados": [m for m in %r if m in sys.modules]}))
+""" % (PESADOS,)
+
+
+def medir(entorno: dict) -> dict:
+    salida = subprocess.run([sys.executable, "-c", HIJO], cwd=BACKEND, env=entorno,
+                            capture_output=True, text=True, timeout=120)
+    if salida.returncode != 0:
+        sys.exit(f"El proceso hijo falló:\n{salida.stderr[-2000:]}")
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bd", default="", help="DATABASE_URL (vacío = SQLite temporal)")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--presupuesto-import-ms", type=float, default=1500)
+    parser.add_argument("--presupuesto-arranque-ms", type=float, default=250)
+    args = parser.parse_args()
+
+    directorio = tempfile.mkdtemp(prefix="bench_arranque_")
+    entorno = {**os.environ,
+               "DATABASE_URL":   args.bd or f"sqlite:///{directorio}/arranque.db",
+               "SPOOL_DIR":      os.path.join(directorio, "spool"),
+               "MQTT_HOST":      "127.0.0.1", "MQTT_PORT": "1", "MQTT_TLS": "0",
+               "TELEGRAM_TOKEN": "", "LOG_NIVEL": "CRITICAL"}
+
+    primero = medir(entorno)
+    medidas = [medir(entorno) for _ in range(args.repeticiones)]
+    imports   = [m["import"] for m in medidas]
+    arranques = [m["arranque"] for m in medidas]
+    pesados   = sorted({p for m in [primero, *medidas] for p in m["pesados"]})
+
+    med_import, med_arranque = statistics.median(imports), statistics.median(arranques)
+    print(f"\n{args.repeticiones} procesos nuevos sobre {entorno['DATABASE_URL']}\n")
+    print(f"  primer arranque (crea el esquema)  {primero['arranque']:8.1f} ms")
+    print(f"  import main      mediana {med_import:8.1f} ms   máx {max(imports):8.1f}   "
+          f"presupuesto {args.presupuesto_import_ms:.0f}")
+    print(f"  arranque         mediana {med_arranque:8.1f} ms   máx {max(arranques):8.1f}   "
+          f"presupuesto {args.presupuesto_arranque_ms:.0f}")
+    print(f"  cargados al arrancar: {', '.join(pesados) or 'ninguno de ' + ', '.join(PESADOS)}")
+
+    fallas = []
+    if med_import > args.presupuesto_import_ms:
+        fallas.append("import fuera de presupuesto")
+    if med_arranque > args.presupuesto_arranque_ms:
+        fallas.append("arranque fuera de presupuesto")
+    if pesados:
+        fallas.append("subsistemas pesados cargados al arrancar: " + ", ".join(pesados))
+    print("\n" + ("FALLA: " + "; ".join(fallas) if fallas else "OK"))
+    sys.exit(1 if fallas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+bench_caos.py — prueba de caos de la conexión MQTT: cortes repetidos sin perder lecturas
+
+Uso (desde backend/):
+    python benchmarks/bench_caos.py
+    python benchmarks/bench_caos.py --camas 20 --segundos 120 --cortes 15
+    python benchmarks/bench_caos.py --max-recuperacion 3
+
+Levanta el broker local, el backend real (sesión MQTT persistente) y N camas que publican en QoS1
+con su propia sesión persistente y reintento. Durante la corrida el broker corta todas las
+conexiones de golpe (broker_local.cortar_conexiones) a intervalos aleatorios.
+
+Verifica:
+  - sin pérdida: cada (dispositivo, ts) confirmado por el broker (PUBACK) está en suero/vitales
+  - sin duplicados: ninguna clave repetida en la BD (redeliveries descartadas por idempotencia)
+  - recuperación acotada: desde cada corte hasta que el backend vuelve a estar conectado
+Sale con código 1 si alguna verificación falla.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import deque
+
+import aiomqtt
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from bench_e2e import CamaSimulada, ProcesoBackend, TOPIC_LECTURAS, TOPIC_VITALES, percentil  # noqa: E402
+from broker_local import BrokerLocal  # noqa: E402
+
+CLIENTE_BACKEND = "bench_backend"
+TABLAS = {TOPIC_LECTURAS: "suero", TOPIC_VITALES: "vitales"}
+
+
+async def cama_resiliente(cama: CamaSimulada, puerto: int, hasta: float, confirmados: dict):
+    """Genera 1 lectura/s (+ vitales cada 10 s) y la publica QoS1; lo no confirmado se reintenta tras reconectar."""
+    pendientes = deque()
+    siguiente, n = time.monotonic() + random.random(), 0
+    while siguiente < hasta or pendientes:
+        try:
+            async with aiomqtt.Client("127.0.0.1", puerto, identifier=f"esp32_caos_{cama.numero}",
+                                      clean_session=False, timeout=5) as client:
+                while siguiente < hasta or pendientes:
+                    if time.monotonic() >= siguiente and siguiente < hasta:
+                        t = time.monotonic()
+                        pendientes.append((TOPIC_LECTURAS, cama.lectura(t)))
+                        if n % 10 == 0:
+                            pendientes.append((TOPIC_VITALES, cama.vitales(t)))
+                        n += 1
+                        siguiente += 1.0
+                    while pendientes:
+                        topic, payload = pendientes[0]
+                        await client.publish(topic, json.dumps(payload), qos=1)
+                        pendientes.popleft()
+                        confirmados[topic].add((payload["dispositivo"], payload["ts"]))
+                    if siguiente < hasta:
+                        await asyncio.sleep(max(0.0, siguiente - time.monotonic()))
+        except aiomqtt.MqttError:
+            await asyncio.sleep(random.uniform(0.1, 0.5))
+
+
+async def provocar_cortes(broker: BrokerLocal, args, hasta: float, recuperaciones: list):
+    intervalo = args.segundos / (args.cortes + 1)
+    while time.monotonic() + intervalo < hasta:
+        await asyncio.sleep(random.uniform(0.5, 1.5) * intervalo)
+        broker.cortar_conexiones()
+        corte = time.monotonic()
+        while time.monotonic() - corte < 120:
+            sesion = broker.sesiones.get(CLIENTE_BACKEND)
+            if sesion is not None and sesion.writer is not None:
+                break
+            await asyncio.sleep(0.01)
+        recuperaciones.append(time.monotonic() - corte)
+
+
+def claves_en_bd(bd: str) -> dict[str, list]:
+    engine = create_engine(bd.replace("mysql://", "mysql+pymysql://", 1))
+    with engine.connect() as conn:
+        claves = {tabla: [tuple(r) for r in conn.execute(text(f"SELECT dispositivo, seq FROM {tabla}"))]
+                  for tabla in TABLAS.values()}
+    engine.dispose()
+    return claves
+
+
+async def esperar_drenaje(bd: str, esperadas: int, timeout: float = 30) -> dict:
+    """Espera a que el spool del backend vuelque todo (o a que el total deje de crecer)."""
+    limite, anterior, estable = time.monotonic() + timeout, -1, 0
+    while True:
+        claves = await asyncio.to_thread(claves_en_bd, bd)
+        total  = sum(len(c) for c in claves.values())
+        estable = estable + 1 if total == anterior else 0
+        if total >= esperadas or estable >= 6 or time.monotonic() > limite:
+            return claves
+        anterior = total
+        await asyncio.sleep(0.5)
+
+
+async def ejecutar(args, bd: str) -> bool:
+    broker = BrokerLocal()
+    puerto_mqtt = await broker.iniciar()
+    os.environ.setdefault("REORDEN_RETRASO_MS", "500")
+    backend = ProcesoBackend(bd, puerto_mqtt, args.puerto_http)
+    try:
+        await asyncio.to_thread(backend.esperar_listo)
+        await asyncio.sleep(1)
+
+        inicio = time.monotonic()
+        hasta  = inicio + args.segundos
+        confirmados    = {topic: set() for topic in TABLAS}
+        recuperaciones = []
+        camas = [CamaSimulada(i + 1, 1.0) for i in range(args.camas)]
+        await asyncio.gather(
+            *(cama_resiliente(c, puerto_mqtt, hasta, confirmados) for c in camas),
+            provocar_cortes(broker, args, hasta, recuperaciones),
+        )
+        esperadas = sum(len(c) for c in confirmados.values())
+        claves    = await esperar_drenaje(bd, esperadas)
+    finally:
+        backend.detener()
+        await broker.detener()
+
+    ok = True
+    print(f"\n{args.camas} camas, {args.segundos} s, {len(recuperaciones)} cortes")
+    for topic, tabla in TABLAS.items():
+        en_bd     = claves[tabla]
+        unicas    = set(en_bd)
+        perdidas  = len(confirmados[topic] - unicas)
+        repetidas = len(en_bd) - len(unicas)
+        ok &= perdidas == 0 and repetidas == 0
+        print(f"  {tabla:<8} confirmadas {len(confirmados[topic]):>6}   en BD {len(unicas):>6}   "
+              f"perdidas {perdidas:>4}   duplicadas {repetidas:>4}")
+    if recuperaciones:
+        peor = max(recuperaciones)
+        ok &= peor <= args.max_recuperacion
+        print(f"  recuperación (s)   p50 {percentil(recuperaciones, 50):.2f}   p95 {percentil(recuperaciones, 95):.2f}   "
+              f"máx {peor:.2f}   (límite {args.max_recuperacion:g})")
+    print("  resultado:", "OK" if ok else "FALLO")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--camas", type=int, default=10)
+    parser.add_argument("--segundos", type=int, default=60)
+    parser.add_argument("--cortes", type=int, default=10)
+    parser.add_argument("--max-recuperacion", type=float, default=5.0, help="s máximos de un corte a la reconexión")
+    parser.add_argument("--bd", default="", help="DATABASE_URL (SQLite temporal si se omite)")
+    parser.add_argument("--puerto-http", type=int, default=8766)
+    args = parser.parse_args()
+
+    if args.bd:
+        ok = asyncio.run(ejecutar(args, args.bd))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            ok = asyncio.run(ejecutar(args, f"sqlite:///{os.path.join(tmp, 'bench_caos.db')}"))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
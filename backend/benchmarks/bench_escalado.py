@@ -0,0 +1,120 @@
+"""
+bench_escalado.py — temporizadores de escalado: costo por operación y precisión del disparo
+
+Uso (desde backend/):
+    python benchmarks/bench_escalado.py                        # 5000 alertas, vencen en 10 s
+    python benchmarks/bench_escalado.py --alertas 20000 --segundos 20 --reconocidas 0.5
+
+Programa N alertas activas cuyo escalado vence repartido en los próximos S segundos (como si
+se hubieran creado en distintos momentos), reconoce una fracción antes de que venzan y mide:
+  - µs por programar (heap push) y por cancelar (marca + compactación amortizada)
+  - desfase real de cada disparo respecto a su vencimiento (p50 / p99 / máx)
+  - que ninguna alerta reconocida se escale y que todas las demás se escalen una vez
+  - episodios: varias alertas del mismo (paciente_id, tipo) escalan una sola vez; reconocida la
+    que escalaba, toma el turno la siguiente
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from escalado import Escalador  # noqa: E402
+
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+async def ejecutar(args):
+    disparos: dict[int, float] = {}
+
+    async def notificar(alerta, paso, canal):
+        disparos[alerta["id"]] = time.monotonic()
+        return True
+
+    escalador = Escalador(notificar, pasos=[(args.segundos, "bench")])
+    tarea = asyncio.create_task(escalador.correr())
+    await asyncio.sleep(0)
+
+    rnd    = random.Random(7)
+    ahora  = time.monotonic()
+    creadas = {i: ahora - rnd.uniform(0, args.segundos - 1) for i in range(1, args.alertas + 1)}
+
+    inicio = time.perf_counter()
+    for alerta_id, creada in creadas.items():
+        escalador.programar({"id": alerta_id, "tipo": "SPO2_BAJA", "mensaje": "", "valor": None,
+                             "paciente_id": alerta_id}, creada=creada)
+    us_programar = (time.perf_counter() - inicio) / args.alertas * 1e6
+
+    # Se reconocen antes de vencer (las que vencen en más de 1 s)
+    candidatas   = [i for i, c in creadas.items() if c + args.segundos - time.monotonic() > 1.0]
+    reconocidas  = set(rnd.sample(candidatas, int(len(candidatas) * args.reconocidas)))
+    inicio = time.perf_counter()
+    for alerta_id in reconocidas:
+        escalador.cancelar([alerta_id])
+    us_cancelar = (time.perf_counter() - inicio) / max(1, len(reconocidas)) * 1e6
+
+    await asyncio.sleep(args.segundos + 0.5)
+    tarea.cancel()
+
+    desfases = [(disparos[i] - (c + args.segundos)) * 1000 for i, c in creadas.items() if i in disparos]
+    escaladas_de_mas = len(reconocidas & disparos.keys())
+    faltantes        = len(creadas.keys() - reconocidas - disparos.keys())
+
+    print(f"\n{args.alertas} alertas, {len(reconocidas)} reconocidas antes de vencer")
+    print(f"  programar   {us_programar:8.2f} µs/op")
+    print(f"  cancelar    {us_cancelar:8.2f} µs/op")
+    print(f"  desfase ms  p50 {percentil(desfases, 50):.2f}   p99 {percentil(desfases, 99):.2f}   "
+          f"máx {max(desfases, default=0):.2f}")
+    print(f"  disparadas {len(disparos)}   reconocidas escaladas {escaladas_de_mas}   sin escalar {faltantes}")
+    return escaladas_de_mas == 0 and faltantes == 0
+
+
+async def episodios() -> bool:
+    escaladas: list[int] = []
+
+    async def notificar(alerta, paso, canal):
+        escaladas.append(alerta["id"])
+        return True
+
+    escalador = Escalador(notificar, pasos=[(0.2, "bench")])
+    tarea = asyncio.create_task(escalador.correr())
+    await asyncio.sleep(0)
+    for alerta_id in (1, 2, 3):             # SpO2 oscilando alrededor del umbral: 3 alertas, un episodio
+        escalador.programar({"id": alerta_id, "tipo": "SPO2_BAJA", "mensaje": "", "valor": None,
+                             "paciente_id": 7})
+    escalador.programar({"id": 4, "tipo": "SPO2_BAJA", "mensaje": "", "valor": None, "paciente_id": 8})
+    await asyncio.sleep(0.4)
+    primera = sorted(escaladas)
+    escalador.cancelar([1])                 # reconocida la que escalaba: sigue la 2
+    await asyncio.sleep(0.4)
+    escalador.cancelar([2, 3, 4])
+    tarea.cancel()
+
+    ok = primera == [1, 4] and sorted(escaladas) == [1, 2, 4] and not escalador.activa(3)
+    print(f"\nepisodios: escaladas {primera} → tras reconocer la 1: {sorted(escaladas)}   "
+          f"{'ok' if ok else 'FALLA (esperado [1, 4] → [1, 2, 4])'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--alertas", type=int, default=5000)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--reconocidas", type=float, default=0.3, help="fracción reconocida antes de vencer")
+    args = parser.parse_args()
+    ok = asyncio.run(ejecutar(args))
+    ok = asyncio.run(episodios()) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+bench_filtros.py — costo de los filtros de ingesta y su efecto en alertas / escrituras
+
+Uso (desde backend/):
+    python benchmarks/bench_filtros.py                      # 200 camas × 1 h sintética a 1 Hz
+    python benchmarks/bench_filtros.py --camas 200 --segundos 7200
+    python benchmarks/bench_filtros.py --bd                 # tablas suero + vitales (DATABASE_URL)
+
+Requiere DATABASE_URL definida (importa los umbrales de mqtt_client).
+
+Compara, sobre los mismos datos:
+  - sin filtro: lógica de alertas original sobre valores crudos
+  - con filtro: rangos físicos + Hampel/EMA + histéresis de recuperación
+Y el costo clínico del filtrado: retraso de la alerta de umbral ante un cambio real en escalón
+(SpO2 97 → 85, FC 80 → 130) con vitales cada 10 s, sin Hampel y con ventanas de 3 y 5.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from filtros import (FiltroHampel, FiltrosCama, en_rango, HAMPEL_VENTANA_VITALES, PISO_MAD,  # noqa: E402
+                     RANGO_PESO, RANGO_FC, RANGO_SPO2)
+from mqtt_client import UMBRAL_FC_ALTA, UMBRAL_FC_BAJA, UMBRAL_SPO2, HISTERESIS_RECUPERACION  # noqa: E402
+
+PESO_ALERTA, PESO_CRITICO = 150.0, 100.0
+PERIODO_VITALES = 10        # s entre muestras de vitales
+
+
+# ── Datos ─────────────────────────────────────────────────────
+def datos_sinteticos(camas: int, segundos: int, semilla: int = 11):
+    """(tipo, cama, t, valores) con jitter de celda, picos y ceros del MAX30102."""
+    rnd   = random.Random(semilla)
+    peso  = [rnd.uniform(200, 500) for _ in range(camas)]
+    goteo = [rnd.uniform(40, 120) / 3600 for _ in range(camas)]
+    fc    = [rnd.uniform(60, 100) for _ in range(camas)]
+    spo2  = [rnd.uniform(94, 99) for _ in range(camas)]
+    for t in range(segundos):
+        for c in range(camas):
+            peso[c] -= goteo[c]
+            if peso[c] < 90:
+                peso[c] = 500.0                       # recarga por bomba
+            p = peso[c] + rnd.gauss(0, 2.5)
+            if rnd.random() < 0.005:
+                p += rnd.choice((-60, 60, 4000))      # golpe / basura de la celda
+            yield "suero", c, t, (p,)
+            if t % 10 == c % 10:
+                f = int(fc[c] + rnd.gauss(0, 3))
+                s = int(spo2[c] + rnd.gauss(0, 1))
+                r = rnd.random()
+                if r < 0.02:
+                    f, s = 0, 0
+                elif r < 0.03:
+                    f, s = rnd.choice((0, 255, 300)), rnd.choice((0, 127))
+                yield "vitales", c, t, (f, s)
+
+
+def datos_bd():
+    from database import SessionLocal
+    from models import Suero, Vitales
+
+    db = SessionLocal()
+    try:
+        filas = []
+        for pid, ts, peso in db.query(Suero.paciente_id, Suero.timestamp, Suero.peso).yield_per(50_000):
+            filas.append((ts, "suero", pid, (peso,)))
+        for pid, ts, fc, spo2 in db.query(Vitales.paciente_id, Vitales.timestamp, Vitales.fc, Vitales.spo2).yield_per(50_000):
+            filas.append((ts, "vitales", pid, (fc, spo2)))
+    finally:
+        db.close()
+    filas.sort(key=lambda f: f[0])
+    for ts, tipo, pid, valores in filas:
+        yield tipo, pid, ts.timestamp(), valores
+
+
+# ── Réplica de la lógica de alertas ───────────────────────────
+class Contador:
+    def __init__(self, histeresis: float):
+        self.histeresis = histeresis
+        self.nivel      = defaultdict(lambda: None)
+        self.alertas_suero   = 0
+        self.alertas_vitales = 0
+        self.escrituras = 0
+
+    def suero(self, cama, peso: float):
+        self.escrituras += 1
+        nivel = self.nivel[cama]
+        if peso > PESO_ALERTA:
+            if nivel and peso > PESO_ALERTA + self.histeresis:
+                self.nivel[cama] = None
+            return
+        nuevo = "CRITICO" if peso <= PESO_CRITICO else "BAJO"
+        if nivel == "CRITICO" or nivel == nuevo:
+            return
+        self.nivel[cama] = nuevo
+        self.alertas_suero += 1
+
+    def vitales(self, fc: int, spo2: int):
+        self.escrituras += 1
+        if fc > UMBRAL_FC_ALTA or 0 < fc < UMBRAL_FC_BAJA:
+            self.alertas_vitales += 1
+        if 0 < spo2 < UMBRAL_SPO2:
+            self.alertas_vitales += 1
+
+
+# ── Retraso de alerta ante un escalón real ───────────────────
+def retraso_escalon(ventana: int, senal: str, repeticiones: int = 500, semilla: int = 7) -> list[float]:
+    """Segundos desde el escalón hasta la primera muestra filtrada que cruza el umbral clínico."""
+    rnd = random.Random(semilla)
+    base, escalon, ruido, cruza = {
+        "spo2": (97, 85, 1.0, lambda v: 0 < v < UMBRAL_SPO2),
+        "fc":   (80, 130, 3.0, lambda v: v > UMBRAL_FC_ALTA),
+    }[senal]
+    retrasos = []
+    for _ in range(repeticiones):
+        hampel = FiltroHampel(ventana, PISO_MAD[senal]) if ventana >= 3 else None
+        for i in range(60):
+            valor = int(round((base if i < 30 else escalon) + rnd.gauss(0, ruido)))
+            filtrado = int(round(hampel.filtrar(valor))) if hampel else valor
+            if i >= 30 and cruza(filtrado):
+                retrasos.append((i - 30) * PERIODO_VITALES)
+                break
+    return retrasos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--camas", type=int, default=200)
+    parser.add_argument("--segundos", type=int, default=3600)
+    parser.add_argument("--bd", action="store_true", help="usar datos grabados de la BD")
+    args = parser.parse_args()
+
+    datos = list(datos_bd() if args.bd else datos_sinteticos(args.camas, args.segundos))
+    print(f"Mensajes: {len(datos):,}")
+
+    crudo = Contador(histeresis=0)
+    for tipo, cama, _t, v in datos:
+        if tipo == "suero":
+            crudo.suero(cama, v[0])
+        else:
+            crudo.vitales(*v)
+
+    filtrado  = Contador(histeresis=HISTERESIS_RECUPERACION)
+    filtros   = defaultdict(FiltrosCama)
+    t_filtros = 0.0
+    for tipo, cama, t, v in datos:
+        inicio = time.perf_counter()
+        f = filtros[cama]
+        if tipo == "suero":
+            ok = en_rango(v[0], RANGO_PESO)
+            if ok:
+                peso = f.peso(v[0], t)
+        else:
+            ok = en_rango(v[0], RANGO_FC) and en_rango(v[1], RANGO_SPO2)
+            if ok:
+                fc, spo2 = f.vitales(*v)
+        t_filtros += time.perf_counter() - inicio
+        if ok:
+            filtrado.suero(cama, peso) if tipo == "suero" else filtrado.vitales(fc, spo2)
+
+    def pct(a, b):
+        return f"{(1 - b / a) * 100:5.1f}%" if a else "  n/a"
+
+    print(f"{'':14}{'sin filtro':>12}{'con filtro':>12}{'reducción':>11}")
+    for nombre in ("alertas_suero", "alertas_vitales"):
+        a, b = getattr(crudo, nombre), getattr(filtrado, nombre)
+        print(f"{nombre.replace('_', ' '):14}{a:>12,}{b:>12,}{pct(a, b):>11}")
+    print(f"{'escrituras BD':14}{crudo.escrituras:>12,}{filtrado.escrituras:>12,}{pct(crudo.escrituras, filtrado.escrituras):>11}")
+    print(f"Costo filtros: {t_filtros / len(datos) * 1e6:.2f} µs/mensaje "
+          f"→ {len(datos) / t_filtros:,.0f} mensajes/s en un proceso")
+
+    print(f"\nRetraso de la alerta ante un escalón real (vitales cada {PERIODO_VITALES} s; "
+          f"ventana actual {HAMPEL_VENTANA_VITALES})")
+    print(f"{'':18}{'medio':>8}{'máx':>8}")
+    for senal, nombre in (("spo2", "SpO2 97 → 85"), ("fc", "FC 80 → 130")):
+        for ventana in (0, 3, 5):
+            r = retraso_escalon(ventana, senal)
+            etiqueta = f"{nombre} H{ventana}" if ventana else f"{nombre} crudo"
+            print(f"{etiqueta:18}{sum(r) / len(r):>7.0f}s{max(r):>7.0f}s")
+
+
+if __name__ == "__main__":
+    main()
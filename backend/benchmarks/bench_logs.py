@@ -0,0 +1,74 @@
+"""
+bench_logs.py — costo en el event loop de las líneas de log del camino caliente
+
+Uso (desde backend/):
+    python benchmarks/bench_logs.py
+    python benchmarks/bench_logs.py -n 500000
+
+Compara, por mensaje MQTT simulado (📨 + 💓):
+  - print:        print() síncrono a stdout (comportamiento anterior)
+  - log DEBUG:    logging estructurado activo (QueueHandler, JSON en hilo aparte)
+  - log muestreo: DEBUG activo con muestreo 1/100
+  - log INFO:     líneas de debug desactivadas
+La salida se redirige a /dev/null para medir sólo el costo sobre el loop.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import logs  # noqa: E402
+
+TOPIC   = "posta/consultorio/lecturas"
+PAYLOAD = {"peso": 312.4, "bomba": False, "estado": "NORMAL", "ts": 1760000000}
+
+
+async def con_print(n: int):
+    for _ in range(n):
+        print(f"📨 {TOPIC} → {PAYLOAD}")
+        print(f"💓 Vitales → FC:{78} SpO2:{97} → NORMAL")
+
+
+async def con_log(n: int, log: logging.Logger):
+    for _ in range(n):
+        if logs.muestrear(log, "mqtt_mensaje"):
+            log.debug("📨 %s → %s", TOPIC, PAYLOAD, extra={"tipo": "mqtt_mensaje"})
+        if logs.muestrear(log, "vitales"):
+            log.debug("💓 Vitales → FC:%s SpO2:%s → %s", 78, 97, "NORMAL", extra={"tipo": "vitales"})
+
+
+def medir(nombre: str, coro, n: int):
+    inicio = time.perf_counter()
+    asyncio.run(coro)
+    dur = time.perf_counter() - inicio
+    print(f"{nombre:<14}{dur / n * 1e6:>10.2f} µs/mensaje", file=sys.__stderr__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("-n", type=int, default=200_000)
+    args = parser.parse_args()
+
+    sys.stdout = open(os.devnull, "w")
+    logs.configurar(nivel="DEBUG", muestreo="mqtt_mensaje=1,vitales=1")
+    log = logs.obtener("bench")
+
+    medir("print", con_print(args.n), args.n)
+    medir("log DEBUG", con_log(args.n, log), args.n)
+
+    logs.configurar(muestreo="mqtt_mensaje=100,vitales=100")
+    medir("log muestreo", con_log(args.n, log), args.n)
+
+    logging.getLogger(logs.RAIZ).setLevel(logging.INFO)
+    medir("log INFO", con_log(args.n, log), args.n)
+
+    logs.detener()
+
+
+if __name__ == "__main__":
+    main()
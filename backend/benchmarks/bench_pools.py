@@ -0,0 +1,130 @@
+"""
+bench_pools.py — aislamiento de la ingesta frente a reportes pesados (pools separados)
+
+Uso (desde backend/):
+    python benchmarks/generar_dataset.py --bd sqlite:///historial.db          # una vez
+    python benchmarks/bench_pools.py --bd sqlite:///historial.db
+    python benchmarks/bench_pools.py --bd mysql://… --camas 200 --reportes 20 --segundos 30
+
+Tres fases de --segundos cada una, con la misma ingesta (un INSERT de --camas filas por
+segundo por el pool "ingesta", como el spool):
+  - base:       sin reportes
+  - compartido: --reportes consultas pesadas en lazo cerrado sobre el MISMO pool que la ingesta
+                (la situación anterior: un único engine para todo)
+  - separado:   las mismas consultas por el pool "lectura" (get_db_lectura / réplica)
+Reporta la latencia de cada lote de ingesta (checkout + INSERT + commit) p50/p95/p99/máx y
+cuántos reportes terminaron. Las filas insertadas se borran al final.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return float("nan")
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+async def fase(nombre: str, args, reporte) -> dict:
+    from sqlalchemy import insert
+    from database import engine
+    from models import Suero
+
+    hasta     = time.monotonic() + args.segundos
+    latencias = []
+    reportes  = [0]
+    ingesta_ex = ThreadPoolExecutor(2)
+    loop = asyncio.get_running_loop()
+
+    def insertar():
+        filas = [{"peso": 300.0, "bomba": False, "estado_suero": "NORMAL", "dispositivo": f"bench_pools_{c}"}
+                 for c in range(args.camas)]
+        inicio = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(insert(Suero.__table__), filas)
+        return time.perf_counter() - inicio
+
+    async def ingesta():
+        siguiente = time.monotonic()
+        while siguiente < hasta:
+            latencias.append(await loop.run_in_executor(ingesta_ex, insertar) * 1000)
+            siguiente += 1.0
+            await asyncio.sleep(max(0.0, siguiente - time.monotonic()))
+
+    async def cliente():
+        while time.monotonic() < hasta:
+            await reporte()
+            reportes[0] += 1
+
+    clientes = [cliente() for _ in range(args.reportes)] if reporte else []
+    await asyncio.gather(ingesta(), *clientes)
+    ingesta_ex.shutdown()
+    return {"fase": nombre, "lotes": len(latencias), "reportes": reportes[0],
+            "p50": percentil(latencias, 50), "p95": percentil(latencias, 95),
+            "p99": percentil(latencias, 99), "max": max(latencias, default=0)}
+
+
+async def ejecutar(args) -> list[dict]:
+    from sqlalchemy import delete, func, select
+    from database import async_engine_lectura, engine, minuto
+    from models import Suero
+
+    # Reporte pesado: agregación por minuto de todo el historial (sin filtro de paciente)
+    consulta = (select(minuto(Suero.timestamp).label("minuto"), func.avg(Suero.peso), func.count())
+                .group_by("minuto").order_by("minuto"))
+    reportes_ex = ThreadPoolExecutor(args.reportes)
+    loop = asyncio.get_running_loop()
+
+    def reporte_sync():
+        with engine.connect() as conn:
+            conn.execute(consulta).all()
+
+    async def compartido():
+        await loop.run_in_executor(reportes_ex, reporte_sync)
+
+    async def separado():
+        async with async_engine_lectura.connect() as conn:
+            (await conn.execute(consulta)).all()
+
+    resultados = [await fase("base", args, None),
+                  await fase("compartido", args, compartido),
+                  await fase("separado", args, separado)]
+    reportes_ex.shutdown()
+    with engine.begin() as conn:
+        conn.execute(delete(Suero.__table__).where(Suero.dispositivo.like("bench_pools_%")))
+    await async_engine_lectura.dispose()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bd", required=True, help="DATABASE_URL con historial (generar_dataset.py)")
+    parser.add_argument("--lectura", default="", help="DATABASE_URL_LECTURA (réplica); vacío = misma BD")
+    parser.add_argument("--camas", type=int, default=100, help="filas por lote de ingesta (1 lote/s)")
+    parser.add_argument("--reportes", type=int, default=20, help="clientes de reportes concurrentes")
+    parser.add_argument("--segundos", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.bd
+    if args.lectura:
+        os.environ["DATABASE_URL_LECTURA"] = args.lectura
+    os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+    resultados = asyncio.run(ejecutar(args))
+    print(f"\n{args.camas} filas/s de ingesta, {args.reportes} clientes de reportes, {args.segundos} s por fase\n")
+    print(f"{'fase':<12}{'lotes':>7}{'reportes':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'máx':>9}   (ms por lote)")
+    for r in resultados:
+        print(f"{r['fase']:<12}{r['lotes']:>7}{r['reportes']:>10}"
+              f"{r['p50']:>9.1f}{r['p95']:>9.1f}{r['p99']:>9.1f}{r['max']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
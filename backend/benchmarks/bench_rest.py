@@ -0,0 +1,197 @@
+"""
+bench_rest.py — prueba de carga de los endpoints de lectura sobre un historial grande
+
+Uso (desde backend/):
+    python benchmarks/generar_dataset.py --bd sqlite:///historial.db          # una vez
+    python benchmarks/bench_rest.py --bd sqlite:///historial.db               # levanta el backend
+    python benchmarks/bench_rest.py --url http://127.0.0.1:8000 --dashboards 100 --segundos 300
+
+Escenario:
+  - dashboards: replican el polling de useLecturas para un paciente al azar
+      · al cargar: /suero/por-minuto, /vitales/por-minuto y /alertas en paralelo
+      · cada --intervalo s: /suero/por-minuto y /alertas en paralelo
+    (arrancan escalonados dentro del primer intervalo, como usuarios reales)
+  - navegantes: recorren las otras pantallas con --pausa s entre vistas
+      · /pacientes, /suero/rango (1 h de la estancia del paciente), /stats
+
+Con --clientes N el escenario pasa a ser de saturación: N clientes en lazo cerrado (sin pausas)
+piden la mezcla de endpoints del dashboard y las pantallas. Mide el throughput máximo del backend
+frente a muchos pollers concurrentes (p. ej. --clientes 200).
+
+Reporta por endpoint: peticiones, errores, req/s y latencia p50/p95/p99/máx.
+--json guarda el resultado para comparar antes/después de un cambio de índices o caché.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import aiohttp
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+
+class Registro:
+    def __init__(self):
+        self.latencias = defaultdict(list)
+        self.errores   = defaultdict(int)
+
+    async def get(self, session: aiohttp.ClientSession, nombre: str, ruta: str, **params):
+        inicio = time.perf_counter()
+        try:
+            async with session.get(ruta, params=params) as res:
+                await res.read()
+                if res.status >= 400:
+                    self.errores[nombre] += 1
+        except aiohttp.ClientError:
+            self.errores[nombre] += 1
+        self.latencias[nombre].append((time.perf_counter() - inicio) * 1000)
+
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return float("nan")
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+async def dashboard(session, reg: Registro, pacientes: list, args, hasta: float):
+    pid = random.choice(pacientes)["id"]
+    await asyncio.sleep(random.uniform(0, args.intervalo))
+    await asyncio.gather(
+        reg.get(session, "/suero/por-minuto",   "/suero/por-minuto",   limit=60, paciente_id=pid),
+        reg.get(session, "/vitales/por-minuto", "/vitales/por-minuto", limit=60, paciente_id=pid),
+        reg.get(session, "/alertas",            "/alertas",            limit=50, paciente_id=pid),
+    )
+    siguiente = time.monotonic() + args.intervalo
+    while siguiente < hasta:
+        await asyncio.sleep(max(0.0, siguiente - time.monotonic()))
+        await asyncio.gather(
+            reg.get(session, "/suero/por-minuto", "/suero/por-minuto", limit=60, paciente_id=pid),
+            reg.get(session, "/alertas",          "/alertas",          limit=50, paciente_id=pid),
+        )
+        siguiente += args.intervalo
+
+
+async def navegante(session, reg: Registro, pacientes: list, args, hasta: float):
+    while time.monotonic() < hasta:
+        await reg.get(session, "/pacientes", "/pacientes")
+        await asyncio.sleep(args.pausa)
+
+        p = random.choice(pacientes)
+        if p.get("fecha_ingreso"):
+            desde = datetime.fromisoformat(p["fecha_ingreso"]) + timedelta(hours=random.randint(12, 22))
+            await reg.get(session, "/suero/rango", "/suero/rango",
+                          desde=desde.isoformat(sep=" "), hasta=(desde + timedelta(hours=1)).isoformat(sep=" "))
+            await asyncio.sleep(args.pausa)
+
+        await reg.get(session, "/stats", "/stats")
+        await asyncio.sleep(args.pausa)
+
+
+async def cliente_saturado(session, reg: Registro, pacientes: list, hasta: float):
+    """Lazo cerrado: la siguiente petición sale apenas vuelve la anterior."""
+    while time.monotonic() < hasta:
+        pid = random.choice(pacientes)["id"]
+        vista = random.random()
+        if vista < 0.35:
+            await reg.get(session, "/suero/por-minuto", "/suero/por-minuto", limit=60, paciente_id=pid)
+        elif vista < 0.6:
+            await reg.get(session, "/alertas", "/alertas", limit=50, paciente_id=pid)
+        elif vista < 0.75:
+            await reg.get(session, "/vitales/por-minuto", "/vitales/por-minuto", limit=60, paciente_id=pid)
+        elif vista < 0.85:
+            await reg.get(session, "/pacientes/{id}", f"/pacientes/{pid}")
+        elif vista < 0.95:
+            await reg.get(session, "/config", "/config")
+        else:
+            await reg.get(session, "/pacientes", "/pacientes")
+
+
+async def ejecutar(args, url: str) -> dict:
+    reg = Registro()
+    conector = aiohttp.TCPConnector(limit=max(args.conexiones, args.clientes))
+    async with aiohttp.ClientSession(url, connector=conector, timeout=aiohttp.ClientTimeout(total=60)) as session:
+        async with session.get("/pacientes") as res:
+            pacientes = await res.json()
+        if not pacientes:
+            raise SystemExit("sin pacientes: correr antes benchmarks/generar_dataset.py")
+
+        inicio = time.monotonic()
+        hasta  = inicio + args.segundos
+        if args.clientes:
+            await asyncio.gather(*(cliente_saturado(session, reg, pacientes, hasta) for _ in range(args.clientes)))
+        else:
+            await asyncio.gather(
+                *(dashboard(session, reg, pacientes, args, hasta) for _ in range(args.dashboards)),
+                *(navegante(session, reg, pacientes, args, hasta) for _ in range(args.navegantes)),
+            )
+        duracion = time.monotonic() - inicio
+
+    resultado = {}
+    if args.clientes:
+        total = sum(len(lat) for lat in reg.latencias.values())
+        print(f"\n{args.clientes} clientes en lazo cerrado, {duracion:.0f} s — {total / duracion:.1f} req/s en total\n")
+        resultado["total"] = {"n": total, "req_s": total / duracion}
+    else:
+        print(f"\n{args.dashboards} dashboards + {args.navegantes} navegantes, {duracion:.0f} s\n")
+    print(f"{'endpoint':<22}{'n':>7}{'err':>6}{'req/s':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'máx':>9}   (ms)")
+    for nombre in sorted(reg.latencias):
+        lat = reg.latencias[nombre]
+        fila = {
+            "n":     len(lat),
+            "err":   reg.errores[nombre],
+            "req_s": len(lat) / duracion,
+            "p50":   percentil(lat, 50),
+            "p95":   percentil(lat, 95),
+            "p99":   percentil(lat, 99),
+            "max":   max(lat),
+        }
+        resultado[nombre] = fila
+        print(f"{nombre:<22}{fila['n']:>7}{fila['err']:>6}{fila['req_s']:>8.2f}"
+              f"{fila['p50']:>9.1f}{fila['p95']:>9.1f}{fila['p99']:>9.1f}{fila['max']:>9.1f}")
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="", help="backend ya levantado")
+    parser.add_argument("--bd", default="", help="DATABASE_URL: levanta el backend contra esta BD")
+    parser.add_argument("--dashboards", type=int, default=50)
+    parser.add_argument("--navegantes", type=int, default=5)
+    parser.add_argument("--intervalo", type=float, default=60, help="s entre recargas del dashboard (60 en useLecturas)")
+    parser.add_argument("--pausa", type=float, default=5, help="s entre vistas de un navegante")
+    parser.add_argument("--clientes", type=int, default=0, help="N clientes en lazo cerrado (saturación)")
+    parser.add_argument("--segundos", type=int, default=180)
+    parser.add_argument("--conexiones", type=int, default=100)
+    parser.add_argument("--puerto-http", type=int, default=8766)
+    parser.add_argument("--json", default="", help="archivo donde guardar los resultados")
+    args = parser.parse_args()
+
+    if not args.url and not args.bd:
+        parser.error("indicar --url o --bd")
+
+    backend = None
+    if args.bd:
+        from bench_e2e import ProcesoBackend
+        backend = ProcesoBackend(args.bd, puerto_mqtt=1, puerto_http=args.puerto_http)   # MQTT sin broker
+        backend.esperar_listo()
+    try:
+        resultado = asyncio.run(ejecutar(args, args.url or f"http://127.0.0.1:{args.puerto_http}"))
+    finally:
+        if backend:
+            backend.detener()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+bench_sala.py — vista de sala (sala.py): tamaño del payload y costo del servidor de 10 a 200 camas
+
+Uso (desde backend/):
+    python benchmarks/bench_sala.py                             # 10, 50, 100, 200 camas · 300 s simulados
+    python benchmarks/bench_sala.py --camas 10 200 400 --segundos 600
+
+Simula para cada tamaño de sala camas que publican suero cada 1 s (goteo de 60–150 ml/h con
+ruido de la celda) y vitales cada 10 s (paseo aleatorio de FC/SpO2), alimenta el Tablero como
+los handlers MQTT y arma un delta por segundo (tick). Reporta:
+  - µs por lectura (actualizar la fila de la cama) y µs por tick (delta + orjson)
+  - bytes por tick y por cama·s que recibe cada cliente de /ws/sala, y tamaño de la instantánea
+  - lo mismo para la alternativa de reenviar cada lectura (mensajes "lectura"/"vitales" de /ws)
+Las columnas por cama deben quedar planas al crecer la sala.
+
+Al final verifica el estado por cama de MQTTManager: dos dispositivos con pacientes y señales
+distintas (uno vaciándose con vitales alterados, otro estable) pasan por los handlers MQTT y cada
+fila del tablero, estimación de goteo y alerta debe quedar en su cama (sale con 1 si falla).
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("LOG_NIVEL", "ERROR")
+os.environ.setdefault("SPOOL_DIR", tempfile.mkdtemp(prefix="bench_sala_"))
+
+import orjson                      # noqa: E402
+
+import sala                        # noqa: E402
+from sala import Tablero           # noqa: E402
+
+PESO_CRITICO = 100.0
+
+
+class CamaSimulada:
+    def __init__(self, rnd: random.Random, indice: int):
+        self.rnd   = rnd
+        self.cama  = f"cama{indice:03d}"
+        self.peso  = rnd.uniform(200, 500)
+        self.goteo = rnd.uniform(60, 150) / 3600          # ml/s
+        self.fc    = rnd.randint(65, 95)
+        self.spo2  = rnd.randint(95, 99)
+
+    def lectura(self) -> tuple:
+        self.peso -= self.goteo
+        if self.peso < PESO_CRITICO:
+            self.peso = 500.0                              # recarga de la bomba
+        filtrado = self.peso + self.rnd.gauss(0, 0.2)
+        return filtrado, (self.peso - PESO_CRITICO) / (self.goteo * 60)
+
+    def vitales(self) -> tuple:
+        self.fc   = min(130, max(50, self.fc + self.rnd.choice((-1, 0, 0, 1))))
+        self.spo2 = min(100, max(88, self.spo2 + self.rnd.choice((-1, 0, 0, 0, 0, 1))))
+        return self.fc, self.spo2
+
+
+def ejecutar(n: int, segundos: int) -> dict:
+    rnd     = random.Random(n)
+    tablero = Tablero()
+    camas   = [CamaSimulada(rnd, i) for i in range(n)]
+
+    us_lectura, us_tick, bytes_tick = [], [], []
+    bytes_por_lectura = 0
+    for s in range(segundos):
+        inicio = time.perf_counter()
+        for c in camas:
+            peso, minutos = c.lectura()
+            tablero.suero(c.cama, None, peso, False, "NORMAL", minutos)
+        lecturas = n
+        if s % 10 == 0:
+            for c in camas:
+                fc, spo2 = c.vitales()
+                tablero.vitales(c.cama, None, fc, spo2, "NORMAL")
+            lecturas += n
+        us_lectura.append((time.perf_counter() - inicio) / lecturas * 1e6)
+
+        inicio = time.perf_counter()
+        delta  = tablero.delta()
+        cuerpo = orjson.dumps(delta) if delta else b""
+        us_tick.append((time.perf_counter() - inicio) * 1e6)
+        bytes_tick.append(len(cuerpo))
+
+        # Alternativa: cada lectura reenviada a cada cliente, como los mensajes de /ws
+        c = camas[0]
+        bytes_lectura = len(orjson.dumps({
+            "type": "lectura", "data": {"id": 123456, "timestamp": "2026-01-01T08:00:00.123456",
+                                        "time": "08:00:00", "paciente_id": 1, "peso": round(c.peso, 1),
+                                        "bomba": False, "estado_suero": "NORMAL", "origen_comando": None},
+            "estado": {"peso": round(c.peso, 1), "bomba": False, "estado_suero": "NORMAL", "fc": c.fc,
+                       "spo2": c.spo2, "estado_vitales": "NORMAL"},
+            "estimacion": {"peso_filtrado": round(c.peso, 1), "goteo_ml_h": 90.0, "min_hasta_alerta": 80.0,
+                           "min_hasta_critico": 120.0, "muestras": 300, "recargas": 0},
+            "crudo": {"peso": round(c.peso, 1)}, "ts": None}))
+        bytes_por_lectura += n * bytes_lectura
+
+    instantanea = len(orjson.dumps(tablero.instantanea()))
+    return {
+        "camas":        n,
+        "us_lectura":   statistics.median(us_lectura),
+        "us_tick":      statistics.median(us_tick),
+        "bytes_tick":   statistics.mean(bytes_tick),
+        "bytes_cama_s": statistics.mean(bytes_tick) / n,
+        "instantanea":  instantanea,
+        "inst_cama":    instantanea / n,
+        "ingenuo_s":    bytes_por_lectura / segundos,
+    }
+
+
+async def _alimentar_camas(manager, alertas: list):
+    from mqtt_client import TOPIC_LECTURAS, TOPIC_VITALES
+    from reorden import Mensaje
+
+    class WS:
+        async def broadcast(self, mensaje):
+            if mensaje["type"] == "alertas":
+                alertas.extend(mensaje["data"])
+
+    ws, inicio = WS(), int(time.time() * 1000)
+    camas = {  # cama: (peso inicial, g/s, fc, spo2)
+        "camaA": (400.0, 0.6, 120, 88),
+        "camaB": (450.0, 0.02, 75, 98),
+    }
+    for s in range(600):
+        for cama, (peso, goteo, fc, spo2) in camas.items():
+            base = {"dispositivo": cama, "ts": inicio + s * 1000}
+            await manager._procesar_lecturas(Mensaje(TOPIC_LECTURAS, {**base, "peso": peso - goteo * s,
+                                                                      "bomba": False, "estado": "NORMAL"},
+                                                     cama, s), ws)
+            if s % 10 == 0:
+                await manager._procesar_vitales(Mensaje(TOPIC_VITALES, {**base, "fc": fc, "spo2": spo2},
+                                                        cama, s), ws)
+
+
+def verificar_camas() -> bool:
+    import logs
+    from mqtt_client import MQTTManager
+
+    logs.configurar()
+    manager, alertas = MQTTManager(), []
+    manager.set_paciente_activo({"id": 1, "nombre": "Cama", "apellido": "A"}, "camaA")
+    manager.set_paciente_activo({"id": 2, "nombre": "Cama", "apellido": "B"}, "camaB")
+    asyncio.run(_alimentar_camas(manager, alertas))
+    sala.tablero.delta()                       # el tick lleva el nivel de alerta a las filas
+
+    filas = {f[0]: dict(zip(sala.CAMPOS, f)) for f in sala.tablero.instantanea()["camas"]}
+    a, b  = filas["camaA"], filas["camaB"]
+    goteo = {p: (manager.estimacion_suero(p) or {}).get("goteo_ml_h") or 0 for p in (1, 2)}
+    tipos = {p: sorted({x["tipo"] for x in alertas if x["paciente_id"] == p}) for p in (1, 2, None)}
+    fallas = [texto for texto, ok in (
+        ("paciente de cada fila",     (a["paciente_id"], b["paciente_id"]) == (1, 2)),
+        ("peso por cama",             a["peso"] < 150 < 400 < b["peso"]),
+        ("vitales por cama",          (a["fc"], a["spo2"], b["fc"], b["spo2"]) == (120, 88, 75, 98)),
+        ("goteo por cama",            goteo[1] > 10 * goteo[2] > 0),
+        ("alertas sólo de la cama A", tipos[1] and not tipos[2] and not tipos[None]),
+        ("nivel de alerta por cama",  (a["alerta"], b["alerta"]) == ("critica", None)),
+    ) if not ok]
+
+    print(f"\nestado por cama (2 dispositivos × 600 s): goteo A {goteo[1]:.0f} ml/h · B {goteo[2]:.0f} ml/h   "
+          f"alertas A {tipos[1]} · B {tipos[2]}   {'ok' if not fallas else 'FALLA: ' + ', '.join(fallas)}")
+    return not fallas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--camas", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--segundos", type=int, default=300, help="segundos simulados (1 tick por segundo)")
+    args = parser.parse_args()
+
+    print(f"\n{args.segundos} s simulados, 1 tick/s\n")
+    print(f"{'camas':>6}{'µs/lectura':>12}{'µs/tick':>10}{'B/tick':>9}{'B/cama·s':>10}"
+          f"{'instant.':>10}{'B/cama':>8}   {'por lectura B/s':>16}{'B/cama·s':>10}")
+    for n in args.camas:
+        r = ejecutar(n, args.segundos)
+        print(f"{r['camas']:>6}{r['us_lectura']:>12.2f}{r['us_tick']:>10.1f}{r['bytes_tick']:>9.0f}"
+              f"{r['bytes_cama_s']:>10.1f}{r['instantanea']:>10}{r['inst_cama']:>8.1f}   "
+              f"{r['ingenuo_s']:>16.0f}{r['ingenuo_s'] / n:>10.1f}")
+
+    ok = verificar_camas()
+    shutil.rmtree(os.environ["SPOOL_DIR"], ignore_errors=True)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+bench_serializacion.py — costo de armar y serializar una respuesta de lista grande (/suero/rango)
+
+Uso (desde backend/):
+    python benchmarks/bench_serializacion.py                  # 10 000 filas, SQLite en memoria
+    python benchmarks/bench_serializacion.py --filas 50000 --repeticiones 9
+
+Compara, sobre las mismas filas, el camino anterior y el actual de un endpoint de lista:
+  - anterior: objetos ORM + to_dict con isoformat y strftime por fila + jsonable_encoder de
+              FastAPI + json.dumps (JSONResponse)
+  - ORM+orjson: objetos ORM + to_dict actual + orjson (sólo cambia el encoder)
+  - actual:   tuplas Core de Suero.select_lista() + Suero.dicts_lista + ORJSONResponse directa
+Separa el tiempo en filas (consulta + materialización), dicts y JSON; reporta la mediana de
+--repeticiones. Al final, tamaño del cuerpo sin comprimir, con gzip (nivel del middleware) y
+con brotli si está instalado.
+"""
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+import orjson                                                # noqa: E402
+from fastapi.encoders import jsonable_encoder                # noqa: E402
+from sqlalchemy import insert, select                        # noqa: E402
+
+from database import Base, SessionLocal, engine              # noqa: E402
+from models import Suero                                     # noqa: E402
+
+COMPRESION_NIVEL = int(os.environ.get("COMPRESION_NIVEL", "5"))
+
+
+def to_dict_anterior(r) -> dict:
+    return {
+        "id":             r.id,
+        "timestamp":      r.timestamp.isoformat() if r.timestamp else None,
+        "time":           r.timestamp.strftime("%H:%M:%S") if r.timestamp else "--",
+        "paciente_id":    r.paciente_id,
+        "peso":           round(r.peso, 1) if r.peso is not None else 0,
+        "bomba":          r.bomba or False,
+        "estado_suero":   r.estado_suero or "NORMAL",
+        "origen_comando": r.origen_comando,
+    }
+
+
+def json_anterior(contenido) -> bytes:
+    # JSONResponse.render de Starlette sobre la salida de jsonable_encoder
+    return json.dumps(jsonable_encoder(contenido), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def json_orjson(contenido) -> bytes:
+    return orjson.dumps(contenido, option=orjson.OPT_NON_STR_KEYS)
+
+
+def poblar(n: int):
+    Base.metadata.create_all(bind=engine)
+    inicio = datetime(2026, 1, 1, 8, 0, 0)
+    with engine.begin() as conn:
+        conn.execute(insert(Suero.__table__), [
+            {"timestamp": inicio + timedelta(seconds=i, microseconds=i * 37 % 1_000_000),
+             "paciente_id": 1 + i % 20, "peso": 500.0 - i * 0.01, "bomba": i % 50 == 0,
+             "estado_suero": "NORMAL", "dispositivo": "bench", "seq": i}
+            for i in range(n)])
+
+
+def medir(filas, dicts, serializar, repeticiones: int) -> dict:
+    tiempos = {"filas": [], "dicts": [], "json": []}
+    cuerpo  = b""
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        rows = filas()
+        t1 = time.perf_counter()
+        contenido = dicts(rows)
+        t2 = time.perf_counter()
+        cuerpo = serializar(contenido)
+        t3 = time.perf_counter()
+        tiempos["filas"].append(t1 - t0)
+        tiempos["dicts"].append(t2 - t1)
+        tiempos["json"].append(t3 - t2)
+    resultado = {k: statistics.median(v) * 1000 for k, v in tiempos.items()}
+    resultado["total"] = sum(resultado.values())
+    resultado["cuerpo"] = cuerpo
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=10_000)
+    parser.add_argument("--repeticiones", type=int, default=7)
+    args = parser.parse_args()
+
+    poblar(args.filas)
+
+    def filas_orm():
+        with SessionLocal() as db:
+            return db.scalars(select(Suero).order_by(Suero.timestamp)).all()
+
+    def filas_core():
+        with engine.connect() as conn:
+            return conn.execute(Suero.select_lista().order_by(Suero.timestamp)).all()
+
+    caminos = [
+        ("anterior",   filas_orm,  lambda rows: [to_dict_anterior(r) for r in rows], json_anterior),
+        ("ORM+orjson", filas_orm,  lambda rows: [r.to_dict() for r in rows],        json_orjson),
+        ("actual",     filas_core, Suero.dicts_lista,                               json_orjson),
+    ]
+    resultados = [(nombre, medir(f, d, s, args.repeticiones)) for nombre, f, d, s in caminos]
+
+    cuerpos = {r["cuerpo"] for _, r in resultados}
+    print(f"\n{args.filas} filas de suero, mediana de {args.repeticiones}   "
+          f"(cuerpos idénticos: {'sí' if len(cuerpos) == 1 else 'NO'})\n")
+    print(f"{'camino':<12}{'filas':>9}{'dicts':>9}{'json':>9}{'total':>9}   (ms)")
+    base = resultados[0][1]["total"]
+    for nombre, r in resultados:
+        print(f"{nombre:<12}{r['filas']:>9.1f}{r['dicts']:>9.1f}{r['json']:>9.1f}{r['total']:>9.1f}"
+              f"   ×{base / r['total']:.1f}")
+
+    cuerpo = resultados[-1][1]["cuerpo"]
+    t0 = time.perf_counter()
+    comprimido = gzip.compress(cuerpo, compresslevel=COMPRESION_NIVEL)
+    ms_gzip = (time.perf_counter() - t0) * 1000
+    print(f"\ncuerpo {len(cuerpo) / 1024:.0f} KiB   gzip nivel {COMPRESION_NIVEL} {len(comprimido) / 1024:.0f} KiB "
+          f"({ms_gzip:.1f} ms)", end="")
+    try:
+        import brotli
+        t0 = time.perf_counter()
+        comprimido = brotli.compress(cuerpo, quality=4)
+        print(f"   brotli q4 {len(comprimido) / 1024:.0f} KiB ({(time.perf_counter() - t0) * 1000:.1f} ms)")
+    except ImportError:
+        print("   (brotli no instalado)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+bench_sqlite.py — rendimiento de ingesta del modo borde (SQLite) frente a una sala completa
+
+Uso (desde backend/):
+    python benchmarks/bench_sqlite.py
+    python benchmarks/bench_sqlite.py --camas 40 --segundos 20 --lectores 8
+
+Escribe con una sesión y un commit por mensaje (el peor caso: la ingesta real agrupa en lotes
+vía spool), 10 lecturas por cada vitales, mientras --lectores hilos consultan la agregación
+por minuto, como los dashboards. Compara:
+  - WAL · synchronous=NORMAL  (modo borde)
+  - rollback · synchronous=FULL (SQLite por defecto)
+Reporta filas/s sostenidas, latencia del commit (p50/p99), lecturas/s y errores "database is
+locked", y el margen respecto a lo que produce una sala de --camas camas (1 + 0,1 filas/s por cama).
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+MODOS = [
+    ("WAL · synchronous=NORMAL",   {"SQLITE_WAL": "1", "SQLITE_SYNCHRONOUS": "NORMAL"}),
+    ("rollback · synchronous=FULL", {"SQLITE_WAL": "0", "SQLITE_SYNCHRONOUS": "FULL"}),
+]
+
+
+def percentil(valores: list, p: float) -> float:
+    if not valores:
+        return float("nan")
+    valores = sorted(valores)
+    return valores[min(len(valores) - 1, int(len(valores) * p / 100))]
+
+
+def medir(segundos: float, lectores: int) -> dict:
+    """Corre dentro del subproceso, con DATABASE_URL y pragmas ya en el entorno."""
+    from sqlalchemy import func
+    from database import SessionLocal, init_db, minuto
+    from models import Suero, Vitales
+
+    init_db()
+
+    def guardar(modelo, **campos):
+        db = SessionLocal()
+        try:
+            db.add(modelo(timestamp=datetime.utcnow() - timedelta(hours=5), **campos))
+            db.commit()
+        finally:
+            db.close()
+
+    parar = threading.Event()
+    lecturas, bloqueos = [0], [0]
+
+    def lector():
+        while not parar.is_set():
+            db = SessionLocal()
+            try:
+                db.query(minuto(Suero.timestamp).label("minuto"), func.avg(Suero.peso)) \
+                  .group_by("minuto").order_by("minuto").limit(60).all()
+                lecturas[0] += 1
+            except Exception as e:
+                if "locked" not in str(e):
+                    raise
+                bloqueos[0] += 1
+            finally:
+                db.close()
+
+    hilos = [threading.Thread(target=lector, daemon=True) for _ in range(lectores)]
+    for h in hilos:
+        h.start()
+
+    commits, filas = [], 0
+    fin = time.perf_counter() + segundos
+    while time.perf_counter() < fin:
+        inicio = time.perf_counter()
+        try:
+            if filas % 11 == 10:
+                guardar(Vitales, fc=random.randint(60, 100), spo2=random.randint(92, 99), estado_vitales="NORMAL")
+            else:
+                guardar(Suero, peso=round(random.uniform(100, 500), 1), bomba=False, estado_suero="NORMAL")
+        except Exception as e:
+            if "locked" not in str(e):
+                raise
+            bloqueos[0] += 1
+            continue
+        commits.append((time.perf_counter() - inicio) * 1000)
+        filas += 1
+
+    parar.set()
+    for h in hilos:
+        h.join()
+    return {
+        "filas_s":  filas / segundos,
+        "p50":      percentil(commits, 50),
+        "p99":      percentil(commits, 99),
+        "lecturas": lecturas[0] / segundos,
+        "bloqueos": bloqueos[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--camas", type=int, default=30)
+    parser.add_argument("--segundos", type=float, default=10)
+    parser.add_argument("--lectores", type=int, default=4)
+    parser.add_argument("--interno", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.interno:
+        print(json.dumps(medir(args.segundos, args.lectores)))
+        return
+
+    requerido = args.camas * 1.1
+    print(f"Sala de {args.camas} camas → {requerido:.0f} filas/s; {args.lectores} lectores concurrentes\n")
+    print(f"{'modo':<30}{'filas/s':>9}{'margen':>8}{'commit p50':>12}{'p99':>8}{'lect/s':>8}{'locked':>8}")
+    for nombre, pragmas in MODOS:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {**os.environ, **pragmas,
+                   "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+                   "LOG_NIVEL": "WARNING", "TRAZAS_ACTIVAS": "0"}
+            salida = subprocess.run(
+                [sys.executable, __file__, "--interno", "--segundos", str(args.segundos), "--lectores", str(args.lectores)],
+                env=env, capture_output=True, text=True, check=True,
+            ).stdout
+        r = json.loads(salida.strip().splitlines()[-1])
+        print(f"{nombre:<30}{r['filas_s']:>9.0f}{r['filas_s'] / requerido:>7.0f}×"
+              f"{r['p50']:>10.2f}ms{r['p99']:>6.1f}ms{r['lecturas']:>8.1f}{r['bloqueos']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+broker_local.py — broker MQTT 3.1.1 mínimo en asyncio, para benchmarks y pruebas de caos
+
+Sustituye a HiveMQ en local (sin TLS ni autenticación). Soporta:
+  - CONNECT / CONNACK, PINGREQ, DISCONNECT
+  - SUBSCRIBE / UNSUBSCRIBE con comodines + y #
+  - PUBLISH QoS 0 y 1 (PUBACK), sin retain
+  - Sesiones persistentes (clean_session=0): suscripciones, cola QoS1 y entregas sin PUBACK
+    sobreviven a la desconexión y se reenvían (DUP) al reconectar
+  - cortar_conexiones(): corta todos los sockets de golpe (caos)
+
+Uso independiente:
+    python benchmarks/broker_local.py --port 1883
+"""
+
+import argparse
+import asyncio
+import struct
+from collections import deque
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+COLA_OFFLINE_MAX = 100_000
+
+
+def _longitud(n: int) -> bytes:
+    salida = bytearray()
+    while True:
+        byte, n = n % 128, n // 128
+        salida.append(byte | (0x80 if n else 0))
+        if not n:
+            return bytes(salida)
+
+
+def _cadena(texto: str) -> bytes:
+    b = texto.encode()
+    return struct.pack("!H", len(b)) + b
+
+
+def _paquete(tipo: int, flags: int, cuerpo: bytes) -> bytes:
+    return bytes([(tipo << 4) | flags]) + _longitud(len(cuerpo)) + cuerpo
+
+
+def coincide(filtro: str, topic: str) -> bool:
+    f, t = filtro.split("/"), topic.split("/")
+    for i, parte in enumerate(f):
+        if parte == "#":
+            return True
+        if i >= len(t) or (parte != "+" and parte != t[i]):
+            return False
+    return len(f) == len(t)
+
+
+class _Sesion:
+    def __init__(self, client_id: str, persistente: bool):
+        self.client_id     = client_id
+        self.persistente   = persistente
+        self.suscripciones: dict[str, int] = {}
+        self.writer        = None
+        self.offline       = deque(maxlen=COLA_OFFLINE_MAX)
+        self.en_vuelo: dict[int, tuple[str, bytes]] = {}    # QoS1 escritos, sin PUBACK del cliente
+        self.siguiente_id  = 0
+
+    def nuevo_id(self) -> int:
+        self.siguiente_id = self.siguiente_id % 65535 + 1
+        return self.siguiente_id
+
+
+class BrokerLocal:
+    def __init__(self):
+        self.sesiones: dict[str, _Sesion] = {}
+        self.server: asyncio.AbstractServer | None = None
+        self._tareas: set[asyncio.Task] = set()
+        self.publicados = 0
+        self.entregados = 0
+        self.cortes     = 0
+
+    async def iniciar(self, host: str = "127.0.0.1", port: int = 0) -> int:
+        self.server = await asyncio.start_server(self._atender, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def detener(self):
+        if self.server:
+            self.server.close()
+        self.cortar_conexiones()
+        for tarea in self._tareas:
+            tarea.cancel()
+        await asyncio.gather(*self._tareas, return_exceptions=True)
+
+    def cortar_conexiones(self):
+        """Cierra todos los sockets sin DISCONNECT (simula caída de red / reinicio del broker)."""
+        for client_id, sesion in list(self.sesiones.items()):
+            if sesion.writer is not None:
+                sesion.writer.transport.abort()
+                sesion.writer = None
+            if not sesion.persistente:
+                del self.sesiones[client_id]
+        self.cortes += 1
+
+    # ── Lectura de paquetes ──────────────────────────────────
+    @staticmethod
+    async def _leer(reader) -> tuple[int, int, bytes]:
+        cabecera = (await reader.readexactly(1))[0]
+        mult, largo = 1, 0
+        while True:
+            b = (await reader.readexactly(1))[0]
+            largo += (b & 0x7F) * mult
+            if not b & 0x80:
+                break
+            mult *= 128
+        cuerpo = await reader.readexactly(largo) if largo else b""
+        return cabecera >> 4, cabecera & 0x0F, cuerpo
+
+    async def _atender(self, reader, writer):
+        sesion = None
+        tarea  = asyncio.current_task()
+        self._tareas.add(tarea)
+        try:
+            tipo, _flags, cuerpo = await self._leer(reader)
+            if tipo != CONNECT:
+                return
+            sesion, presente = self._conectar(cuerpo, writer)
+            writer.write(_paquete(CONNACK, 0, bytes([1 if presente else 0, 0])))
+            for pid, (topic, payload) in list(sesion.en_vuelo.items()):
+                writer.write(_paquete(PUBLISH, 0x0A, _cadena(topic) + struct.pack("!H", pid) + payload))
+            while sesion.offline:
+                topic, payload = sesion.offline.popleft()
+                self._enviar(sesion, topic, payload, 1)
+
+            while True:
+                tipo, flags, cuerpo = await self._leer(reader)
+                if tipo == PUBLISH:
+                    self._recibir_publish(flags, cuerpo, writer)
+                elif tipo == SUBSCRIBE:
+                    pid = cuerpo[:2]
+                    i, concedidos = 2, bytearray()
+                    while i < len(cuerpo):
+                        n = struct.unpack("!H", cuerpo[i:i + 2])[0]
+                        filtro = cuerpo[i + 2:i + 2 + n].decode()
+                        qos = min(cuerpo[i + 2 + n] & 0x03, 1)
+                        sesion.suscripciones[filtro] = qos
+                        concedidos.append(qos)
+                        i += 3 + n
+                    writer.write(_paquete(SUBACK, 0, pid + bytes(concedidos)))
+                elif tipo == UNSUBSCRIBE:
+                    i = 2
+                    while i < len(cuerpo):
+                        n = struct.unpack("!H", cuerpo[i:i + 2])[0]
+                        sesion.suscripciones.pop(cuerpo[i + 2:i + 2 + n].decode(), None)
+                        i += 2 + n
+                    writer.write(_paquete(UNSUBACK, 0, cuerpo[:2]))
+                elif tipo == PUBACK:
+                    sesion.en_vuelo.pop(struct.unpack("!H", cuerpo[:2])[0], None)
+                elif tipo == PINGREQ:
+                    writer.write(_paquete(PINGRESP, 0, b""))
+                elif tipo == DISCONNECT:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._tareas.discard(tarea)
+            if sesion is not None and sesion.writer is writer:
+                sesion.writer = None
+                if not sesion.persistente:
+                    self.sesiones.pop(sesion.client_id, None)
+            writer.close()
+
+    def _conectar(self, cuerpo: bytes, writer) -> tuple[_Sesion, bool]:
+        n = struct.unpack("!H", cuerpo[:2])[0]
+        i = 2 + n                          # nombre del protocolo
+        flags = cuerpo[i + 1]
+        i += 4                             # nivel + flags + keepalive
+        n = struct.unpack("!H", cuerpo[i:i + 2])[0]
+        client_id = cuerpo[i + 2:i + 2 + n].decode() or f"anon-{id(writer)}"
+        persistente = not flags & 0x02
+
+        anterior = self.sesiones.get(client_id)
+        if anterior and anterior.writer is not None:
+            anterior.writer.transport.abort()      # toma de sesión por el mismo client_id
+        if anterior and persistente:
+            anterior.writer = writer
+            return anterior, True
+        sesion = _Sesion(client_id, persistente)
+        sesion.writer = writer
+        self.sesiones[client_id] = sesion
+        return sesion, False
+
+    def _recibir_publish(self, flags: int, cuerpo: bytes, writer):
+        qos = (flags >> 1) & 0x03
+        n = struct.unpack("!H", cuerpo[:2])[0]
+        topic = cuerpo[2:2 + n].decode()
+        i = 2 + n
+        if qos:
+            writer.write(_paquete(PUBACK, 0, cuerpo[i:i + 2]))
+            i += 2
+        payload = cuerpo[i:]
+        self.publicados += 1
+        for sesion in self.sesiones.values():
+            for filtro, qos_sub in sesion.suscripciones.items():
+                if coincide(filtro, topic):
+                    self._enviar(sesion, topic, payload, min(qos, qos_sub))
+                    break
+
+    def _enviar(self, sesion: _Sesion, topic: str, payload: bytes, qos: int):
+        if sesion.writer is None:
+            if qos and sesion.persistente:
+                sesion.offline.append((topic, payload))
+            return
+        cuerpo = _cadena(topic)
+        if qos:
+            pid = sesion.nuevo_id()
+            cuerpo += struct.pack("!H", pid)
+            if sesion.persistente:
+                sesion.en_vuelo[pid] = (topic, payload)
+        sesion.writer.write(_paquete(PUBLISH, qos << 1, cuerpo + payload))
+        self.entregados += 1
+
+
+async def _main(port: int):
+    broker = BrokerLocal()
+    puerto = await broker.iniciar("0.0.0.0", port)
+    print(f"Broker MQTT local escuchando en :{puerto}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=1883)
+    asyncio.run(_main(parser.parse_args().port))
@@ -0,0 +1,81 @@
+"""
+cache_respuestas.py
+- Cache en memoria de respuestas de recursos de referencia (pacientes, médicos, config), que
+  sólo cambian por acciones de administración: un acierto no toca la BD
+- Cada entrada guarda el cuerpo JSON ya serializado y su ETag (hash del cuerpo); si el cliente
+  manda If-None-Match con ese ETag se responde 304 sin cuerpo. El ETag es débil (W/): el mismo
+  contenido puede viajar comprimido con gzip o brotli
+- Invalidación explícita por recurso desde los endpoints de escritura; una generación por
+  recurso evita guardar un cuerpo calculado antes de una invalidación concurrente
+- CACHE_RESPUESTAS_TTL acota la vida de una entrada (cambios hechos directo en la BD);
+  0 desactiva el cache
+"""
+
+import hashlib
+import os
+import time
+
+import orjson
+from fastapi import Request, Response
+
+from metricas import Contador
+
+CACHE_RESPUESTAS_TTL = float(os.environ.get("CACHE_RESPUESTAS_TTL", "300"))
+
+CONSULTAS = Contador("cache_respuestas_total", "Peticiones a recursos cacheados por resultado",
+                     ("recurso", "resultado"))
+
+
+class _Entrada:
+    __slots__ = ("etag", "cuerpo", "vence")
+
+    def __init__(self, etag: str, cuerpo: bytes, vence: float):
+        self.etag   = etag
+        self.cuerpo = cuerpo
+        self.vence  = vence
+
+
+_entradas:     dict[str, dict] = {}     # recurso → {clave: _Entrada}
+_generaciones: dict[str, int]  = {}
+
+
+def invalidar(*recursos: str):
+    for recurso in recursos:
+        _entradas.pop(recurso, None)
+        _generaciones[recurso] = _generaciones.get(recurso, 0) + 1
+
+
+def _etag(cuerpo: bytes) -> str:
+    return 'W/"' + hashlib.blake2b(cuerpo, digest_size=8).hexdigest() + '"'
+
+
+def _coincide(request: Request, etag: str) -> bool:
+    cabecera = request.headers.get("if-none-match")
+    if not cabecera:
+        return False
+    etiquetas = {e.strip().removeprefix("W/") for e in cabecera.split(",")}
+    return etag.removeprefix("W/") in etiquetas or "*" in etiquetas
+
+
+def _responder(request: Request, recurso: str, entrada: _Entrada, resultado: str) -> Response:
+    cabeceras = {"ETag": entrada.etag, "Cache-Control": "no-cache"}
+    if _coincide(request, entrada.etag):
+        CONSULTAS.de(recurso, "304").inc()
+        return Response(status_code=304, headers=cabeceras)
+    CONSULTAS.de(recurso, resultado).inc()
+    return Response(content=entrada.cuerpo, media_type="application/json", headers=cabeceras)
+
+
+async def responder(request: Request, recurso: str, clave, producir) -> Response:
+    """Respuesta cacheada de recurso/clave; producir() (async) devuelve el contenido si no hay entrada."""
+    ahora   = time.monotonic()
+    entrada = _entradas.get(recurso, {}).get(clave)
+    if entrada is not None and entrada.vence > ahora:
+        return _responder(request, recurso, entrada, "hit")
+
+    generacion = _generaciones.get(recurso, 0)
+    cuerpo  = orjson.dumps(await producir(), default=str, option=orjson.OPT_NON_STR_KEYS)
+    entrada = _Entrada(_etag(cuerpo), cuerpo, ahora + CACHE_RESPUESTAS_TTL)
+    if CACHE_RESPUESTAS_TTL > 0 and _generaciones.get(recurso, 0) == generacion:
+        _entradas.setdefault(recurso, {})[clave] = entrada
+    return _responder(request, recurso, entrada, "miss")
@@ -0,0 +1,244 @@
+"""
+ciclo_alertas.py
+- Ciclo de vida de las alertas: activa → reconocida → archivada
+- Reconocer por id o por paciente toca sólo esas filas (índice (paciente_id, activa, id)) y sólo
+  descuenta las que su UPDATE pasó de activa a reconocida: UPDATE … RETURNING donde el dialecto lo
+  soporta (SQLite); en MySQL, SELECT … FOR UPDATE de las activas y UPDATE acotado a esos ids. Dos
+  reconocimientos concurrentes de la misma alerta no la descuentan dos veces
+- Conteo de activas en memoria por paciente: un GROUP BY al arrancar y después se mantiene
+  en cada alta (mqtt_client) y en cada reconocimiento — /stats ya no escanea la tabla.
+  También las críticas (nivel de alerta de cada cama en sala.py) y una versión que cambia con
+  cada alta o reconocimiento
+- Alta (emitir): la alerta cuenta y se notifica al momento; la fila va a la BD después, desde una
+  tarea que inserta fuera del event loop (guardar). Con la BD caída las alertas esperan en memoria
+  y se reintentan con backoff: ni el aviso en vivo ni Telegram dependen de la BD
+- Guardada (ya tiene id) → programa su escalado (escalado.py); reconocimiento → lo cancela
+- Archivador (tarea del lifespan): las reconocidas hace más de ALERTAS_ARCHIVO_RETRASO s pasan
+  a alertas_archivo en lotes (INSERT … SELECT + DELETE en una transacción); la tabla caliente
+  queda con las activas y las recién reconocidas
+"""
+
+import asyncio
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, or_, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import escalado
+from database import engine
+from logs import obtener
+from metricas import Contador, DB_COMMIT, Medidor
+from models import Alerta, AlertaArchivada
+
+ALERTAS_ARCHIVO_RETRASO   = int(os.environ.get("ALERTAS_ARCHIVO_RETRASO", "600"))     # s tras reconocerla
+ALERTAS_ARCHIVO_INTERVALO = float(os.environ.get("ALERTAS_ARCHIVO_INTERVALO", "60"))  # s entre pasadas
+ALERTAS_ARCHIVO_LOTE      = int(os.environ.get("ALERTAS_ARCHIVO_LOTE", "1000"))
+
+ESPERA_MIN, ESPERA_MAX = 1.0, 30.0     # backoff de guardar() con la BD caída
+
+log = obtener("alertas")
+
+_alertas = Alerta.__table__
+_archivo = AlertaArchivada.__table__
+_activas: Counter = Counter()          # paciente_id (None = sin paciente) → alertas activas
+_criticas: Counter = Counter()         # paciente_id → activas de ALERTAS_CRITICAS
+version = 0                            # cambia con cada alta / reconocimiento
+_por_guardar: list = []                # (Alerta sin id, monotonic del alta) emitidas, aún no en la BD
+_hay_por_guardar: asyncio.Event | None = None
+
+ALERTAS_CRITICAS = {"SUERO_CRITICO", "SPO2_BAJA"}
+
+ARCHIVADAS = Contador("alertas_archivadas_total", "Alertas reconocidas movidas a alertas_archivo")
+
+
+def _ahora() -> datetime:
+    return datetime.utcnow() - timedelta(hours=5)
+
+
+# ── Conteo en memoria ────────────────────────────────────────
+def cargar_activas():
+    """Una sola vez al arrancar (usa el índice (activa, id))."""
+    global version
+    with engine.connect() as conn:
+        filas = conn.execute(select(_alertas.c.paciente_id, _alertas.c.tipo, func.count())
+                             .where(_alertas.c.activa == True)             # noqa: E712
+                             .group_by(_alertas.c.paciente_id, _alertas.c.tipo)).all()
+    _activas.clear()
+    _criticas.clear()
+    for paciente_id, tipo, n in filas:
+        _activas[paciente_id] += n
+        if tipo in ALERTAS_CRITICAS:
+            _criticas[paciente_id] += n
+    version += 1
+
+
+def emitir(alertas: list) -> list[dict]:
+    """Alta de alertas recién evaluadas (objetos Alerta sin guardar): cuentan al momento y quedan en
+    cola para guardar(). Devuelve sus dicts para notificar ya, con "id": None hasta que se guarden."""
+    global version
+    ahora, creada = datetime.utcnow(), time.monotonic()
+    for a in alertas:
+        a.timestamp = a.timestamp or ahora
+        a.activa    = True
+        _activas[a.paciente_id] += 1
+        if a.tipo in ALERTAS_CRITICAS:
+            _criticas[a.paciente_id] += 1
+        _por_guardar.append((a, creada))
+    version += 1
+    if _hay_por_guardar is not None:
+        _hay_por_guardar.set()
+    return [a.to_dict() for a in alertas]
+
+
+def _insertar(alertas: list) -> list[int]:
+    with DB_COMMIT.de("alertas").medir(), engine.begin() as conn:
+        return [conn.execute(insert(_alertas).values(
+                    timestamp=a.timestamp, paciente_id=a.paciente_id, tipo=a.tipo,
+                    mensaje=a.mensaje, valor=a.valor, activa=True)).inserted_primary_key[0]
+                for a in alertas]
+
+
+async def guardar():
+    """Tarea del lifespan: inserta las alertas emitidas en orden, fuera del event loop. Con la BD
+    caída las conserva y reintenta con backoff. Ya con id, programa su escalado."""
+    global _hay_por_guardar
+    _hay_por_guardar = asyncio.Event()
+    espera, bd_ok = ESPERA_MIN, True
+    while True:
+        if not _por_guardar:
+            _hay_por_guardar.clear()
+            await _hay_por_guardar.wait()
+            continue
+        lote = list(_por_guardar)
+        try:
+            ids = await asyncio.to_thread(_insertar, [a for a, _ in lote])
+        except Exception as e:
+            if bd_ok:
+                log.error("❌ BD no disponible — %s alertas esperan en memoria: %s", len(lote), e)
+            bd_ok = False
+            await asyncio.sleep(espera)
+            espera = min(espera * 2, ESPERA_MAX)
+            continue
+        if not bd_ok:
+            log.info("✅ BD recuperada — %s alertas guardadas", len(lote))
+        espera, bd_ok = ESPERA_MIN, True
+        del _por_guardar[:len(lote)]
+        for (alerta, creada), alerta_id in zip(lote, ids):
+            alerta.id = alerta_id
+            escalado.programar([alerta], creada)
+
+
+def _descontar(contador: Counter, paciente_id: int | None):
+    contador[paciente_id] -= 1
+    if contador[paciente_id] <= 0:
+        del contador[paciente_id]
+
+
+def activas(paciente_id: int | None = None) -> int:
+    if paciente_id is None:
+        return sum(_activas.values())
+    return _activas.get(paciente_id, 0)
+
+
+def nivel(paciente_id: int | None) -> str | None:
+    """Nivel de alerta del paciente: "critica", "alerta" o None si no tiene activas."""
+    if _criticas.get(paciente_id):
+        return "critica"
+    return "alerta" if _activas.get(paciente_id) else None
+
+
+# ── Reconocimiento ───────────────────────────────────────────
+async def reconocer(db: AsyncSession, ids: list[int] | None = None,
+                    paciente_id: int | None = None) -> list[dict]:
+    """Marca como reconocidas las alertas activas indicadas (por id, por paciente o todas si no se
+    indica nada). Devuelve [{id, paciente_id}] de las que efectivamente cambiaron."""
+    global version
+    filtro = [_alertas.c.activa == True]                                    # noqa: E712
+    if ids is not None:
+        filtro.append(_alertas.c.id.in_(ids))
+    if paciente_id is not None:
+        filtro.append(_alertas.c.paciente_id == paciente_id)
+
+    columnas = (_alertas.c.id, _alertas.c.paciente_id, _alertas.c.tipo)
+    if engine.dialect.update_returning:
+        afectadas = (await db.execute(update(_alertas).where(*filtro)
+                                      .values(activa=False, reconocida_en=_ahora())
+                                      .returning(*columnas))).all()
+    else:
+        # Bloquea las activas hasta el commit: otro reconocimiento concurrente espera y ya no las ve
+        afectadas = (await db.execute(select(*columnas).where(*filtro).with_for_update())).all()
+        if afectadas:
+            await db.execute(update(_alertas).where(_alertas.c.id.in_([a.id for a in afectadas]))
+                             .values(activa=False, reconocida_en=_ahora()))
+    await db.commit()
+    if not afectadas:
+        return []
+
+    escalado.escalador.cancelar(a.id for a in afectadas)
+    for a in afectadas:
+        _descontar(_activas, a.paciente_id)
+        if a.tipo in ALERTAS_CRITICAS:
+            _descontar(_criticas, a.paciente_id)
+    version += 1
+    return [{"id": a.id, "paciente_id": a.paciente_id} for a in afectadas]
+
+
+# ── Historial: tabla caliente + archivo ──────────────────────
+async def listar(db: AsyncSession, limit: int, paciente_id: int | None = None,
+                 solo_activas: bool = False) -> list[dict]:
+    tablas = (_alertas,) if solo_activas else (_alertas, _archivo)
+    filas  = []
+    for tabla in tablas:
+        q = select(tabla).order_by(tabla.c.id.desc()).limit(limit)
+        if solo_activas:
+            q = q.where(tabla.c.activa == True)                             # noqa: E712
+        if paciente_id:
+            q = q.where(tabla.c.paciente_id == paciente_id)
+        filas += (await db.execute(q)).all()
+    filas.sort(key=lambda f: f.id, reverse=True)
+    return [Alerta.to_dict(f) for f in filas[:limit]]
+
+
+# ── Archivador ───────────────────────────────────────────────
+def _archivar_lote() -> int:
+    limite = _ahora() - timedelta(seconds=ALERTAS_ARCHIVO_RETRASO)
+    with engine.begin() as conn:
+        ids = conn.execute(
+            select(_alertas.c.id)
+            .where(_alertas.c.activa == False,                             # noqa: E712
+                   or_(_alertas.c.reconocida_en < limite, _alertas.c.reconocida_en.is_(None)))
+            .order_by(_alertas.c.id)
+            .limit(ALERTAS_ARCHIVO_LOTE)
+        ).scalars().all()
+        if not ids:
+            return 0
+        columnas = [c.name for c in _archivo.columns]
+        conn.execute(insert(_archivo).from_select(
+            columnas, select(*(_alertas.c[c] for c in columnas)).where(_alertas.c.id.in_(ids))))
+        conn.execute(delete(_alertas).where(_alertas.c.id.in_(ids)))
+    ARCHIVADAS.inc(len(ids))
+    return len(ids)
+
+
+async def archivar():
+    while True:
+        try:
+            total = 0
+            while True:
+                n = await asyncio.to_thread(_archivar_lote)
+                total += n
+                if n < ALERTAS_ARCHIVO_LOTE:
+                    break
+            if total:
+                log.info("🗄️ %s alertas reconocidas archivadas", total)
+        except OperationalError as e:
+            log.warning("⚠️ Archivador de alertas sin BD: %s", e)
+        await asyncio.sleep(ALERTAS_ARCHIVO_INTERVALO)
+
+
+Medidor("alertas_activas", "Alertas activas (conteo en memoria)", funcion=lambda: activas())
+Medidor("alertas_por_guardar", "Alertas emitidas que aún no llegaron a la BD", funcion=lambda: len(_por_guardar))
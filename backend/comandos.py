@@ -0,0 +1,131 @@
+"""
+comandos.py
+- Cola de salida hacia los ESP32: una por dispositivo, con prioridad
+    · bomba_on / bomba_off primero, luego reset / tare, al final la config
+    · dentro de una misma prioridad, orden de llegada (secuencia): el orden por dispositivo se respeta
+- Coalescencia (gana la última escritura): un comando reemplaza al de su mismo grupo que siga sin
+  publicar — toggles de bomba contradictorios, ráfagas de config; el reemplazado se resuelve
+  como tal (ok=False) y un reintento suyo posterior ya no vuelve a la cola
+- Un comando que no llegó a publicarse (conexión caída) se devuelve con su secuencia original
+- Sólo se reenvían sin ack los comandos idempotentes (fijan un estado: bomba_on / bomba_off);
+  reset y tare se publican una vez, porque repetirlos vuelve a tarar la balanza
+- Métrica: espera en cola por tipo de comando
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+
+from idempotencia import DISPOSITIVO_DEFECTO
+from metricas import Histograma
+
+COMANDOS_EN_VUELO = int(os.environ.get("COMANDOS_EN_VUELO", "8"))   # publish QoS1 sin PUBACK por dispositivo
+
+PRIORIDADES = {"bomba_on": 0, "bomba_off": 0, "reset": 1, "tare": 1, "config": 2}
+GRUPOS      = {"bomba_on": "bomba", "bomba_off": "bomba", "config": "config"}
+IDEMPOTENTES = {"bomba_on", "bomba_off"}
+
+ESPERA_COLA = Histograma("mqtt_comando_espera_segundos", "Espera en la cola de salida hasta el publish", ("cmd",))
+for _cmd in PRIORIDADES:
+    ESPERA_COLA.de(_cmd)
+
+
+class Comando:
+    __slots__ = ("id", "cmd", "topic", "payload", "dispositivo", "prioridad", "grupo",
+                 "secuencia", "encolado", "enviado", "futuro", "en_cola", "reemplazado")
+
+    def __init__(self, topic: str, payload: dict, cmd: str, futuro: asyncio.Future | None = None,
+                 dispositivo: str | None = None):
+        self.id          = os.urandom(6).hex()
+        self.cmd         = cmd
+        self.topic       = topic
+        self.payload     = json.dumps({**payload, "id": self.id})
+        self.dispositivo = dispositivo or DISPOSITIVO_DEFECTO
+        self.prioridad   = PRIORIDADES.get(cmd, 1)
+        self.grupo       = GRUPOS.get(cmd)
+        self.secuencia   = 0            # asignada al encolarlo por primera vez
+        self.encolado    = 0.0          # perf_counter
+        self.enviado     = 0.0          # perf_counter del último publish
+        self.futuro      = futuro       # se resuelve con el ack; None = sin espera (config)
+        self.en_cola     = False
+        self.reemplazado = False
+
+    def reemplazar(self, por: "Comando"):
+        self.reemplazado = True
+        if self.futuro is not None and not self.futuro.done():
+            self.futuro.set_result({"id": self.id, "ok": False, "rtt_ms": None, "reemplazado_por": por.id})
+
+
+class _ColaDispositivo:
+    def __init__(self, dispositivo: str):
+        self.dispositivo = dispositivo
+        self._heap: list = []
+        self._por_grupo: dict[str, Comando] = {}     # pendiente (sin publicar) de cada grupo
+        self._ultimo: dict[str, Comando] = {}        # el más nuevo encolado de cada grupo
+        self._hay = asyncio.Event()
+
+    def agregar(self, comando: Comando):
+        if comando.en_cola:
+            return                                   # reintento de algo que sigue esperando turno
+        if comando.grupo:
+            ultimo = self._ultimo.get(comando.grupo)
+            if ultimo is not None and ultimo.secuencia > comando.secuencia:
+                # ya se encoló algo más nuevo del mismo grupo: éste quedó obsoleto
+                comando.reemplazar(ultimo)
+                return
+            anterior = self._por_grupo.get(comando.grupo)
+            if anterior is not None and anterior is not comando:
+                anterior.reemplazar(comando)
+                anterior.en_cola = False
+            self._por_grupo[comando.grupo] = comando
+            self._ultimo[comando.grupo]    = comando
+        comando.en_cola = True
+        heapq.heappush(self._heap, (comando.prioridad, comando.secuencia, comando))
+        self._hay.set()
+
+    async def siguiente(self) -> Comando:
+        while True:
+            while self._heap:
+                _, _, comando = heapq.heappop(self._heap)
+                if comando.reemplazado or not comando.en_cola:
+                    continue
+                comando.en_cola = False
+                if comando.grupo and self._por_grupo.get(comando.grupo) is comando:
+                    del self._por_grupo[comando.grupo]
+                ESPERA_COLA.de(comando.cmd).observe(time.perf_counter() - comando.encolado)
+                return comando
+            self._hay.clear()
+            await self._hay.wait()
+
+    def __len__(self) -> int:
+        return sum(1 for _, _, c in self._heap if c.en_cola and not c.reemplazado)
+
+
+class ColaComandos:
+    def __init__(self):
+        self._colas: dict[str, _ColaDispositivo] = {}
+        self._secuencia = itertools.count(1)
+        self.nueva      = asyncio.Event()          # apareció un dispositivo (necesita emisor)
+
+    def agregar(self, comando: Comando):
+        if not comando.secuencia:
+            comando.secuencia = next(self._secuencia)
+        comando.encolado = time.perf_counter()
+        cola = self._colas.get(comando.dispositivo)
+        if cola is None:
+            cola = self._colas[comando.dispositivo] = _ColaDispositivo(comando.dispositivo)
+            self.nueva.set()
+        cola.agregar(comando)
+
+    def devolver(self, comando: Comando):
+        """Comando que no llegó a publicarse: vuelve con su secuencia original (salvo que ya esté obsoleto)."""
+        self._colas[comando.dispositivo].agregar(comando)
+
+    def colas(self) -> list[_ColaDispositivo]:
+        return list(self._colas.values())
+
+    def pendientes(self) -> dict[str, int]:
+        return {d: len(c) for d, c in self._colas.items()}
@@ -5,25 +5,19 @@ email_service.py
 - Usa Resend API (HTTP) — funciona en Railway gratuito
 - Datos del paciente tomados dinámicamente de la BD
 - Alertas: solo clínicas (FC_ALTA, FC_BAJA, SPO2_BAJA, SPO2_CRITICA)
+- ReportLab y Resend se importan en el primer envío, no al arrancar el backend
 """
 
 import os
 import asyncio
+import time
 from datetime import datetime
 from io import BytesIO
 
-import resend
+from logs import obtener
+from metricas import NOTIFICACION, NOTIFICACION_FALLOS
 
-try:
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.styles    import ParagraphStyle
-    from reportlab.lib.units     import inch
-    from reportlab.lib           import colors
-    from reportlab.platypus      import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable
-    REPORTLAB_OK = True
-except ImportError:
-    REPORTLAB_OK = False
-    print("⚠️ reportlab no instalado — PDF desactivado")
+log = obtener("email")
 
 RESEND_API_KEY  = os.environ.get("RESEND_API_KEY",  "")
 EMAIL_REMITENTE = os.environ.get("EMAIL_REMITENTE", "onboarding@resend.dev")
@@ -292,8 +286,14 @@ def _construir_html(payload: dict, alertas: list, hora: str, paciente: dict | No
 #  PDF
 # ══════════════════════════════════════════════════════════════
 def _generar_pdf(payload: dict, alertas: list, paciente: dict | None = None) -> bytes | None:
-    if not REPORTLAB_OK:
-        print("⚠️ PDF no generado — reportlab no disponible")
+    try:
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.styles    import ParagraphStyle
+        from reportlab.lib.units     import inch
+        from reportlab.lib           import colors
+        from reportlab.platypus      import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, HRFlowable
+    except ImportError:
+        log.warning("⚠️ PDF no generado — reportlab no instalado")
         return None
 
     # Solo alertas clínicas en el PDF
@@ -469,12 +469,14 @@ async def enviar_email_familiar(
     paciente:     dict | None = None,
 ):
     if not destinatario:
-        print("⚠️ Sin destinatario — email no enviado")
+        log.warning("⚠️ Sin destinatario — email no enviado")
         return
     if not RESEND_API_KEY:
-        print("❌ RESEND_API_KEY no configurada en Railway")
+        log.error("❌ RESEND_API_KEY no configurada en Railway")
         return
 
+    import resend
+
     resend.api_key = RESEND_API_KEY
     hora   = datetime.now().strftime("%d/%m/%Y %H:%M:%S")
     html   = _construir_html(payload, alertas, hora, paciente)
@@ -489,8 +491,9 @@ async def enviar_email_familiar(
     if pdf_bytes:
         nombre_pdf = f"reporte_posta_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf"
         attachments.append({"filename": nombre_pdf, "content": list(pdf_bytes)})
-        print(f"📎 PDF adjunto: {nombre_pdf}")
+        log.info("📎 PDF adjunto: %s", nombre_pdf)
 
+    inicio = time.perf_counter()
     try:
         params = {
             "from":    f"Monitor IoT Posta Médica <{EMAIL_REMITENTE}>",
@@ -506,8 +509,11 @@ async def enviar_email_familiar(
 
         loop     = asyncio.get_event_loop()
         response = await loop.run_in_executor(None, lambda: resend.Emails.send(params))
-        print(f"📧 Email enviado a {destinatario} — id: {response.get('id', '?')}")
+        log.info("📧 Email enviado a %s — id: %s", destinatario, response.get("id", "?"))
 
     except Exception as e:
-        print(f"❌ Error Resend: {e}")
-        raise
\ No newline at end of file
+        NOTIFICACION_FALLOS.de("email").inc()
+        log.error("❌ Error Resend: %s", e)
+        raise
+    finally:
+        NOTIFICACION.de("email").observe(time.perf_counter() - inicio)
\ No newline at end of file
@@ -0,0 +1,255 @@
+"""
+escalado.py
+- Escalado de alertas sin reconocer: un temporizador por episodio abierto (paciente_id, tipo) de los
+  tipos de ESCALADO_TIPOS; cada paso de ESCALADO_PASOS ("segundos:canal", contados desde la alerta)
+  vuelve a notificar por ese canal mientras nadie la reconozca
+    · las alertas repetidas del mismo episodio (un SpO2 que oscila alrededor del umbral) se suman
+      a él sin temporizador propio; si se reconoce la que escala y quedan otras, escala la siguiente
+    · el episodio se cierra cuando todas sus alertas están reconocidas
+    · los envíos pasan por el anti-spam de Telegram (telegram_bot.esperar_turno): esperan turno
+    · telegram   → el chat de siempre (TELEGRAM_CHAT_ID)
+    · supervisor → otro chat (ESCALADO_TELEGRAM_SUPERVISOR), p. ej. el de la jefa de guardia
+- Heap por vencimiento: programar O(log n); cancelar O(1) (se marca y el heap la descarta al
+  llegar a la cima, compactándose si las canceladas pasan de la mitad)
+- Una sola tarea duerme hasta el próximo vencimiento; no consulta la BD. El estado se
+  reconstruye al arrancar con las activas de la tabla alertas (una consulta)
+- programar / cancelar se pueden llamar también desde otros hilos (lock + call_soon_threadsafe)
+- Métricas: desfase real del disparo respecto a lo programado, temporizadores pendientes,
+  escalados enviados por canal
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+
+from logs import obtener
+from metricas import Contador, Histograma, Medidor
+
+ESCALADO_TIPOS = {t.strip() for t in os.environ.get(
+    "ESCALADO_TIPOS", "SUERO_CRITICO,SPO2_BAJA,FC_ALTA,FC_BAJA").split(",") if t.strip()}
+ESCALADO_PASOS = os.environ.get("ESCALADO_PASOS", "300:telegram,600:supervisor")
+ESCALADO_TELEGRAM_SUPERVISOR = os.environ.get("ESCALADO_TELEGRAM_SUPERVISOR", "")
+
+log = obtener("escalado")
+
+DESFASE   = Histograma("escalado_desfase_segundos", "Retraso del disparo de un temporizador respecto a lo programado",
+                       buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+ENVIADOS  = Contador("escalado_enviados_total", "Re-notificaciones de alertas sin reconocer", ("canal",))
+
+
+def _parsear_pasos(texto: str) -> list[tuple[float, str]]:
+    pasos = []
+    for par in texto.split(","):
+        segundos, _, canal = par.partition(":")
+        try:
+            pasos.append((float(segundos), canal.strip() or "telegram"))
+        except ValueError:
+            continue
+    return sorted(pasos)
+
+
+PASOS = _parsear_pasos(ESCALADO_PASOS)
+for _, _canal in PASOS:
+    ENVIADOS.de(_canal)
+
+
+class Temporizador:
+    __slots__ = ("alerta", "paso", "creada", "vence", "cancelado")
+
+    def __init__(self, alerta: dict, paso: int, creada: float, vence: float):
+        self.alerta    = alerta          # {id, tipo, mensaje, valor, paciente_id}
+        self.paso      = paso            # índice en PASOS del próximo disparo
+        self.creada    = creada          # monotonic del alta de la alerta
+        self.vence     = vence           # monotonic
+        self.cancelado = False
+
+
+class Escalador:
+    def __init__(self, notificar, pasos: list[tuple[float, str]] = PASOS):
+        self.notificar  = notificar     # async (alerta: dict, paso: int, canal: str) -> bool (enviada)
+        self.pasos      = pasos
+        self._heap: list = []
+        self._activos: dict[int, Temporizador] = {}
+        self._episodios: dict[tuple, list[int]] = {}            # (paciente_id, tipo) → ids, el 1º escala
+        self._miembros: dict[int, tuple[tuple, dict, float]] = {}   # id → (episodio, alerta, creada)
+        self._cancelados = 0            # entradas del heap marcadas como canceladas
+        self._orden      = itertools.count()
+        self._lock       = threading.Lock()
+        self._loop       = None
+        self._despertar  = None
+        self._en_vuelo: set[asyncio.Task] = set()
+
+    # ── Operaciones ──────────────────────────────────────────
+    def programar(self, alerta: dict, creada: float | None = None):
+        """Primer paso pendiente de la alerta; creada = monotonic de su alta (ahora si se omite).
+        Si su episodio ya tiene quien escale, sólo se anota en él."""
+        if not self.pasos or alerta.get("tipo") not in ESCALADO_TIPOS:
+            return
+        creada   = time.monotonic() if creada is None else creada
+        episodio = (alerta.get("paciente_id"), alerta["tipo"])
+        with self._lock:
+            if alerta["id"] in self._miembros:
+                return
+            ids = self._episodios.setdefault(episodio, [])
+            ids.append(alerta["id"])
+            self._miembros[alerta["id"]] = (episodio, alerta, creada)
+            if len(ids) == 1:
+                self._agendar(alerta, creada)
+            else:
+                log.debug("🔁 Alerta %s sumada al episodio %s (escala la %s)", alerta["id"], episodio, ids[0])
+
+    def cancelar(self, ids):
+        with self._lock:
+            for alerta_id in ids:
+                miembro = self._miembros.pop(alerta_id, None)
+                if miembro is None:
+                    continue
+                episodio  = miembro[0]
+                restantes = self._episodios[episodio]
+                escalaba  = restantes[0] == alerta_id
+                restantes.remove(alerta_id)
+                temporizador = self._activos.pop(alerta_id, None)
+                if temporizador is not None:
+                    temporizador.cancelado = True
+                    self._cancelados += 1
+                if not restantes:
+                    del self._episodios[episodio]
+                elif escalaba:
+                    _, alerta, creada = self._miembros[restantes[0]]
+                    self._agendar(alerta, creada)
+            if self._cancelados > len(self._heap) // 2:
+                self._heap = [e for e in self._heap if not e[2].cancelado]
+                heapq.heapify(self._heap)
+                self._cancelados = 0
+
+    def activa(self, alerta_id: int) -> bool:
+        """La alerta sigue sin reconocer (con o sin pasos pendientes)."""
+        return alerta_id in self._miembros
+
+    def _agendar(self, alerta: dict, creada: float):
+        """Con el lock tomado. Al reconstruir, los pasos que vencieron con el backend caído se
+        colapsan en el último."""
+        ahora = time.monotonic()
+        paso  = 0
+        while paso + 1 < len(self.pasos) and creada + self.pasos[paso + 1][0] <= ahora:
+            paso += 1
+        self._empujar(Temporizador(alerta, paso, creada, max(creada + self.pasos[paso][0], ahora)))
+
+    def _empujar(self, temporizador: Temporizador):
+        """Con el lock tomado."""
+        self._activos[temporizador.alerta["id"]] = temporizador
+        heapq.heappush(self._heap, (temporizador.vence, next(self._orden), temporizador))
+        if self._heap[0][2] is temporizador and self._despertar is not None:
+            self._loop.call_soon_threadsafe(self._despertar.set)
+
+    def pendientes(self) -> int:
+        return len(self._activos)
+
+    # ── Tarea ────────────────────────────────────────────────
+    def _vencidos(self, ahora: float) -> list[Temporizador]:
+        """Saca del heap los vencidos y programa el paso siguiente de cada uno (con el lock tomado)."""
+        listos = []
+        while self._heap and (self._heap[0][2].cancelado or self._heap[0][0] <= ahora):
+            _, _, temporizador = heapq.heappop(self._heap)
+            if temporizador.cancelado:
+                self._cancelados = max(0, self._cancelados - 1)
+                continue
+            listos.append(temporizador)
+            paso = temporizador.paso + 1
+            if paso < len(self.pasos):
+                self._empujar(Temporizador(temporizador.alerta, paso, temporizador.creada,
+                                           max(temporizador.creada + self.pasos[paso][0], ahora)))
+            else:
+                del self._activos[temporizador.alerta["id"]]
+        return listos
+
+    async def correr(self):
+        self._loop      = asyncio.get_running_loop()
+        self._despertar = asyncio.Event()
+        while True:
+            ahora = time.monotonic()
+            with self._lock:
+                listos  = self._vencidos(ahora)
+                proximo = self._heap[0][0] if self._heap else None
+            for temporizador in listos:
+                DESFASE.observe(ahora - temporizador.vence)
+                canal = self.pasos[temporizador.paso][1]
+                tarea = asyncio.create_task(self._notificar(temporizador.alerta, temporizador.paso, canal))
+                self._en_vuelo.add(tarea)
+                tarea.add_done_callback(self._en_vuelo.discard)
+            self._despertar.clear()
+            try:
+                espera = None if proximo is None else max(0.0, proximo - time.monotonic())
+                await asyncio.wait_for(self._despertar.wait(), espera)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _notificar(self, alerta: dict, paso: int, canal: str):
+        try:
+            if await self.notificar(alerta, paso, canal):
+                ENVIADOS.de(canal).inc()
+        except Exception:
+            log.exception("❌ Error escalando alerta %s por %s", alerta["id"], canal)
+
+
+# ── Canales ──────────────────────────────────────────────────
+async def notificar(alerta: dict, paso: int, canal: str) -> bool:
+    from telegram_bot import TELEGRAM_CHAT_ID, enviar_alerta, esperar_turno
+
+    chat_id = ESCALADO_TELEGRAM_SUPERVISOR if canal == "supervisor" else TELEGRAM_CHAT_ID
+    if not chat_id:
+        log.warning("⚠️ Escalado sin destino para el canal %s", canal)
+        return False
+    await esperar_turno(chat_id)
+    if not escalador.activa(alerta["id"]):
+        return False                    # reconocida mientras esperaba turno
+    minutos = PASOS[paso][0] / 60
+    mensaje = (f"🔁 <b>ALERTA SIN RECONOCER</b> (+{minutos:.0f} min)\n"
+               f"{alerta['mensaje']}\n"
+               f"Paciente id: <code>{alerta.get('paciente_id') or '—'}</code> · alerta #{alerta['id']}")
+    await enviar_alerta(mensaje, {alerta["tipo"]}, chat_id=chat_id)
+    log.info("🔁 Alerta %s escalada (paso %s → %s)", alerta["id"], paso + 1, canal)
+    return True
+
+
+escalador = Escalador(notificar)
+
+
+def _fila(alerta) -> dict:
+    return {c: (alerta[c] if isinstance(alerta, dict) else getattr(alerta, c))
+            for c in ("id", "tipo", "mensaje", "valor", "paciente_id")}
+
+
+def programar(alertas: list, creada: float | None = None):
+    """creada = monotonic del alta (ahora si se omite): una alerta guardada tarde no corre sus pasos."""
+    for a in alertas:
+        escalador.programar(_fila(a), creada)
+
+
+def reconstruir():
+    """Al arrancar: un temporizador por alerta activa escalable, según la hora en que se creó."""
+    from database import engine
+    from models import Alerta
+
+    tabla = Alerta.__table__
+    with engine.connect() as conn:
+        filas = conn.execute(select(tabla.c.id, tabla.c.tipo, tabla.c.mensaje, tabla.c.valor,
+                                    tabla.c.paciente_id, tabla.c.timestamp)
+                             .where(tabla.c.activa == True,                # noqa: E712
+                                    tabla.c.tipo.in_(ESCALADO_TIPOS))
+                             .order_by(tabla.c.id)).all()
+    ahora_utc, ahora = datetime.utcnow(), time.monotonic()
+    for f in filas:
+        edad = (ahora_utc - f.timestamp).total_seconds() if f.timestamp else 0.0
+        escalador.programar(_fila(f._asdict()), creada=ahora - max(0.0, edad))
+    if filas:
+        log.info("🔁 %s temporizadores de escalado reconstruidos", len(filas))
+
+
+Medidor("escalado_pendientes", "Episodios con un escalado programado", funcion=lambda: escalador.pendientes())
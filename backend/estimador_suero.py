@@ -0,0 +1,110 @@
+"""
+estimador_suero.py
+- Estimador en línea del goteo de la bolsa IV (un estado por cama)
+- Filtro de Kalman de 2 estados: [peso, pendiente] con modelo de velocidad constante
+- O(1) por lectura — sin historial, sin consultas a BD
+- Se reinicia solo cuando la bomba recarga la bolsa (salto de peso o bomba activa)
+"""
+
+import os
+
+# Ruido del modelo (g²/s³) y de la celda de carga (g²)
+RUIDO_PROCESO = float(os.environ.get("ESTIMADOR_RUIDO_PROCESO", "0.00001"))
+RUIDO_MEDIDA  = float(os.environ.get("ESTIMADOR_RUIDO_MEDIDA",  "4.0"))
+
+# Subida de peso (g) respecto a la predicción que se interpreta como recarga
+SALTO_RECARGA = float(os.environ.get("ESTIMADOR_SALTO_RECARGA", "15.0"))
+
+# Lecturas mínimas desde el último reinicio antes de publicar tiempos
+MUESTRAS_MINIMAS = int(os.environ.get("ESTIMADOR_MUESTRAS_MINIMAS", "30"))
+
+# Goteo mínimo (ml/h) para considerar que la bolsa realmente se vacía
+GOTEO_MINIMO = 1.0
+
+VARIANZA_INICIAL_PESO      = 100.0
+VARIANZA_INICIAL_PENDIENTE = 0.01
+
+
+class EstimadorSuero:
+    """Kalman [peso, pendiente] sobre el stream de peso de una cama."""
+
+    __slots__ = ("peso", "pendiente", "p00", "p01", "p11", "t", "muestras", "recargas")
+
+    def __init__(self):
+        self.recargas = 0
+        self.reiniciar()
+
+    def reiniciar(self, peso: float | None = None, t: float | None = None):
+        self.peso      = peso
+        self.pendiente = 0.0
+        self.p00       = VARIANZA_INICIAL_PESO
+        self.p01       = 0.0
+        self.p11       = VARIANZA_INICIAL_PENDIENTE
+        self.t         = t
+        self.muestras  = 0 if peso is None else 1
+
+    # ── Actualización por lectura ────────────────────────────
+    def actualizar(self, peso: float, t: float, bomba: bool = False) -> None:
+        # Bomba activa o primera lectura → el modelo de goteo no aplica
+        if bomba or self.peso is None:
+            self.reiniciar(peso, t)
+            return
+
+        dt = t - self.t
+        if dt <= 0:
+            return
+
+        # Predicción
+        peso_pred = self.peso + self.pendiente * dt
+        q   = RUIDO_PROCESO
+        p00 = self.p00 + dt * (2 * self.p01 + dt * self.p11) + q * dt ** 3 / 3
+        p01 = self.p01 + dt * self.p11 + q * dt ** 2 / 2
+        p11 = self.p11 + q * dt
+
+        # Recarga detectada → reiniciar en el nuevo nivel
+        innovacion = peso - peso_pred
+        if innovacion > SALTO_RECARGA:
+            self.recargas += 1
+            self.reiniciar(peso, t)
+            return
+
+        # Corrección
+        s  = p00 + RUIDO_MEDIDA
+        k0 = p00 / s
+        k1 = p01 / s
+        self.peso      = peso_pred + k0 * innovacion
+        self.pendiente = self.pendiente + k1 * innovacion
+        self.p00 = (1 - k0) * p00
+        self.p01 = (1 - k0) * p01
+        self.p11 = p11 - k1 * p01
+        self.t   = t
+        self.muestras += 1
+
+    # ── Lectura del estado ───────────────────────────────────
+    @property
+    def goteo_ml_h(self) -> float:
+        """Goteo estimado en ml/h (1 g ≈ 1 ml de suero)."""
+        return max(0.0, -self.pendiente * 3600)
+
+    def _minutos_hasta(self, umbral: float) -> float | None:
+        goteo = self.goteo_ml_h
+        if self.peso is None or goteo < GOTEO_MINIMO:
+            return None
+        if self.peso <= umbral:
+            return 0.0
+        return (self.peso - umbral) / goteo * 60
+
+    def estimacion(self, peso_alerta: float, peso_critico: float) -> dict:
+        lista = self.peso is not None and self.muestras >= MUESTRAS_MINIMAS
+        return {
+            "peso_filtrado":     round(self.peso, 1) if self.peso is not None else None,
+            "goteo_ml_h":        round(self.goteo_ml_h, 1) if lista else None,
+            "min_hasta_alerta":  _redondear(self._minutos_hasta(peso_alerta))  if lista else None,
+            "min_hasta_critico": _redondear(self._minutos_hasta(peso_critico)) if lista else None,
+            "muestras":          self.muestras,
+            "recargas":          self.recargas,
+        }
+
+
+def _redondear(valor: float | None) -> float | None:
+    return round(valor, 1) if valor is not None else None
@@ -0,0 +1,108 @@
+"""
+filtros.py
+- Filtrado de señales por cama antes de persistir y evaluar alertas
+- Hampel (mediana móvil + MAD) para picos aislados: ceros/basura del MAX30102, golpes en la celda.
+  En vitales (una muestra cada ~10 s) la ventana es de 3: ante un cambio real en escalón sólo la
+  primera muestra se reemplaza por la mediana (≤ 1 muestra de retraso en la alerta). Es la única
+  capa que descarta picos antes de los umbrales clínicos (anomalias.py sólo protege la tendencia)
+- EMA con constante de tiempo para el jitter del peso (se reinicia ante recargas)
+- Rangos físicos para descartar lecturas imposibles antes de tocar la BD
+"""
+
+import math
+import os
+from collections import deque
+
+HAMPEL_VENTANA         = int(os.environ.get("FILTRO_HAMPEL_VENTANA", "5"))           # peso; 0 = desactivado
+HAMPEL_VENTANA_VITALES = int(os.environ.get("FILTRO_HAMPEL_VENTANA_VITALES", "3"))   # FC/SpO2; 0 = desactivado
+HAMPEL_SIGMAS          = float(os.environ.get("FILTRO_HAMPEL_SIGMAS", "3.0"))
+PESO_TAU               = float(os.environ.get("FILTRO_PESO_TAU", "5.0"))       # s; 0 = sin EMA
+PESO_SALTO             = float(os.environ.get("FILTRO_PESO_SALTO", "15.0"))    # g; reinicia la EMA
+
+# MAD mínima para no marcar como pico el ruido de cuantización de señales planas
+PISO_MAD = {"peso": 1.0, "fc": 2.0, "spo2": 1.0}
+
+# Rangos físicamente posibles — fuera de ellos la lectura se descarta
+RANGO_PESO = (-50.0, 2000.0)
+RANGO_FC   = (0, 250)
+RANGO_SPO2 = (0, 100)
+
+FACTOR_MAD = 1.4826  # MAD → desviación estándar (gaussiana)
+
+
+def en_rango(valor, rango: tuple) -> bool:
+    """True si valor es numérico, finito y está dentro de rango."""
+    if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+        return False
+    return math.isfinite(valor) and rango[0] <= valor <= rango[1]
+
+
+class FiltroHampel:
+    """Reemplaza por la mediana las muestras a más de N·σ (MAD) de la ventana."""
+
+    __slots__ = ("ventana", "piso")
+
+    def __init__(self, tamano: int, piso: float):
+        self.ventana = deque(maxlen=tamano)
+        self.piso    = piso
+
+    def filtrar(self, x: float) -> float:
+        v = self.ventana
+        v.append(x)
+        n = len(v)
+        if n < 3:
+            return x
+        orden   = sorted(v)
+        mediana = orden[n // 2]
+        mad     = sorted(abs(e - mediana) for e in orden)[n // 2]
+        if abs(x - mediana) > HAMPEL_SIGMAS * max(FACTOR_MAD * mad, self.piso):
+            return mediana
+        return x
+
+
+class FiltroEMA:
+    """Media exponencial con constante de tiempo TAU, robusta a dt variable."""
+
+    __slots__ = ("tau", "valor", "t")
+
+    def __init__(self, tau: float):
+        self.tau   = tau
+        self.valor = None
+        self.t     = None
+
+    def filtrar(self, x: float, t: float) -> float:
+        if self.valor is None or abs(x - self.valor) > PESO_SALTO:
+            self.valor, self.t = x, t
+            return x
+        dt = t - self.t
+        if dt > 0:
+            self.valor += (1 - math.exp(-dt / self.tau)) * (x - self.valor)
+            self.t = t
+        return self.valor
+
+
+class FiltrosCama:
+    """Cadena de filtros de una cama: peso (Hampel → EMA), FC y SpO2 (Hampel)."""
+
+    __slots__ = ("peso_hampel", "peso_ema", "fc_hampel", "spo2_hampel")
+
+    def __init__(self):
+        hampel, vitales = HAMPEL_VENTANA >= 3, HAMPEL_VENTANA_VITALES >= 3
+        self.peso_hampel = FiltroHampel(HAMPEL_VENTANA, PISO_MAD["peso"])         if hampel  else None
+        self.fc_hampel   = FiltroHampel(HAMPEL_VENTANA_VITALES, PISO_MAD["fc"])   if vitales else None
+        self.spo2_hampel = FiltroHampel(HAMPEL_VENTANA_VITALES, PISO_MAD["spo2"]) if vitales else None
+        self.peso_ema    = FiltroEMA(PESO_TAU) if PESO_TAU > 0 else None
+
+    def peso(self, peso: float, t: float) -> float:
+        if self.peso_hampel:
+            peso = self.peso_hampel.filtrar(peso)
+        if self.peso_ema:
+            peso = self.peso_ema.filtrar(peso, t)
+        return peso
+
+    def vitales(self, fc: int, spo2: int) -> tuple[int, int]:
+        if self.fc_hampel:
+            fc = int(round(self.fc_hampel.filtrar(fc)))
+        if self.spo2_hampel:
+            spo2 = int(round(self.spo2_hampel.filtrar(spo2)))
+        return fc, spo2
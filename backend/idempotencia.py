@@ -0,0 +1,77 @@
+"""
+idempotencia.py
+- Ingesta exactly-once ante redeliveries QoS1: cada mensaje trae una clave del dispositivo
+    · "ts" epoch en ms (o s) si el ESP32 tiene reloj (NTP) — única aunque reinicie
+    · si no, "seq" (contador del firmware); con "boot" (id aleatorio por arranque) no choca tras un reinicio
+- Por (topic, dispositivo) se guarda en memoria la marca de agua (clave más alta vista) y las
+  últimas VENTANA claves: decidir NUEVO / TARDIO / DUPLICADO es O(1) y ocurre antes de tocar la BD
+- Lo que escape a la ventana (reinicio del backend, clave muy vieja) lo frena el índice único
+  (dispositivo, seq) de la BD: el reenvío del spool inserta con IGNORE
+"""
+
+import os
+from collections import deque
+
+VENTANA             = int(os.environ.get("DEDUP_VENTANA", "4096"))    # claves recientes por dispositivo
+DISPOSITIVO_DEFECTO = os.environ.get("DEDUP_DISPOSITIVO", "consultorio")
+
+NUEVO, TARDIO, DUPLICADO = "nuevo", "tardio", "duplicado"
+
+
+def clave(payload: dict) -> tuple[str, int | None]:
+    """(dispositivo, clave de idempotencia) del mensaje; clave None = el dispositivo no manda ninguna."""
+    dispositivo = str(payload.get("dispositivo") or DISPOSITIVO_DEFECTO)
+    ts = payload.get("ts")
+    if isinstance(ts, (int, float)) and not isinstance(ts, bool) and ts > 1e9:
+        return dispositivo, int(ts if ts > 1e12 else ts * 1000)
+    seq = payload.get("seq")
+    if isinstance(seq, int) and not isinstance(seq, bool):
+        boot = payload.get("boot")
+        return (f"{dispositivo}#{boot}" if boot is not None else dispositivo), seq
+    return dispositivo, None
+
+
+class _Marca:
+    __slots__ = ("maxima", "vistas", "orden")
+
+    def __init__(self):
+        self.maxima = -1
+        self.vistas: set[int] = set()
+        self.orden  = deque()
+
+    def recordar(self, k: int):
+        self.vistas.add(k)
+        self.orden.append(k)
+        if len(self.orden) > VENTANA:
+            self.vistas.discard(self.orden.popleft())
+
+
+class Deduplicador:
+    def __init__(self):
+        self._marcas: dict[tuple[str, str], _Marca] = {}
+
+    def clasificar(self, topic: str, dispositivo: str, k: int | None) -> str:
+        if k is None:
+            return NUEVO
+        marca = self._marcas.get((topic, dispositivo))
+        if marca is None:
+            marca = self._marcas[(topic, dispositivo)] = _Marca()
+
+        if k > marca.maxima:
+            marca.maxima = k
+            marca.recordar(k)
+            return NUEVO
+        if k in marca.vistas:
+            return DUPLICADO
+        if marca.orden and k < marca.orden[0] and marca.maxima - k > VENTANA and k < VENTANA:
+            # contador que volvió a empezar (reinicio del ESP32 sin "boot"): nueva secuencia
+            marca.maxima = k
+            marca.vistas.clear()
+            marca.orden.clear()
+            marca.recordar(k)
+            return NUEVO
+        marca.recordar(k)
+        return TARDIO
+
+    def marcas(self) -> dict:
+        return {f"{t}|{d}": m.maxima for (t, d), m in self._marcas.items()}
@@ -0,0 +1,133 @@
+"""
+logs.py
+- Logging estructurado con niveles: una línea JSON por evento (o texto con LOG_FORMATO=texto)
+- QueueHandler no bloqueante: el event loop arma el mensaje y encola; un hilo aparte serializa
+  (JSON) y escribe
+- Muestreo por tipo de mensaje: LOG_MUESTREO="mqtt_mensaje=100,vitales=10" → 1 de cada N
+- Camino caliente: se decide ANTES de construir el LogRecord, así el debug desactivado casi no cuesta
+      if muestrear(log, "mqtt_mensaje"):
+          log.debug("📨 %s → %s", topic, payload, extra={"tipo": "mqtt_mensaje"})
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+
+LOG_NIVEL    = os.environ.get("LOG_NIVEL",    "INFO").upper()
+LOG_FORMATO  = os.environ.get("LOG_FORMATO",  "json")
+LOG_MUESTREO = os.environ.get("LOG_MUESTREO", "mqtt_mensaje=100,vitales=10")
+
+RAIZ = "monitor"
+
+# Atributos estándar de LogRecord — el resto viene de extra={...}
+_ATRIBUTOS_RECORD = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "tipo"}
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def _parsear_muestreo(texto: str) -> dict[str, int]:
+    tasas = {}
+    for par in texto.split(","):
+        tipo, _, n = par.partition("=")
+        if tipo.strip() and n.strip().isdigit():
+            tasas[tipo.strip()] = max(1, int(n))
+    return tasas
+
+
+class Muestreo:
+    """Deja pasar 1 de cada N eventos por tipo (determinista, sin random)."""
+
+    def __init__(self, tasas: dict[str, int]):
+        self.configurar(tasas)
+
+    def configurar(self, tasas: dict[str, int]):
+        self.tasas   = tasas
+        self.cuentas = dict.fromkeys(tasas, 0)
+
+    def pasa(self, tipo: str) -> bool:
+        n = self.tasas.get(tipo)
+        if n is None or n == 1:
+            return True
+        c = self.cuentas[tipo] = self.cuentas[tipo] + 1
+        return c % n == 1
+
+
+_muestreo = Muestreo(_parsear_muestreo(LOG_MUESTREO))
+
+
+def muestrear(log: logging.Logger, tipo: str, nivel: int = logging.DEBUG) -> bool:
+    """True si el evento `tipo` debe registrarse: nivel activo y dentro de la tasa de muestreo."""
+    return log.isEnabledFor(nivel) and _muestreo.pasa(tipo)
+
+
+class FormatoJSON(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        evento = {
+            "ts":     datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "nivel":  record.levelname,
+            "logger": record.name,
+            "msg":    record.getMessage(),
+        }
+        tipo = getattr(record, "tipo", None)
+        if tipo:
+            evento["tipo"] = tipo
+        for clave, valor in record.__dict__.items():
+            if clave not in _ATRIBUTOS_RECORD:
+                evento[clave] = valor
+        if record.exc_info:
+            evento["exc"] = self.formatException(record.exc_info)
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+class _ColaSinFormato(logging.handlers.QueueHandler):
+    """QueueHandler que congela el mensaje al encolar y difiere JSON + stdout al hilo del listener."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Los args suelen ser dicts vivos (payloads) que el handler sigue mutando: interpolar ahora
+        record.msg  = record.getMessage()
+        record.args = None
+        return record
+
+
+def configurar(nivel: str = LOG_NIVEL, formato: str = LOG_FORMATO, muestreo: str | None = None):
+    """Instala cola + listener en el logger raíz del backend. Idempotente."""
+    global _listener
+    if muestreo is not None:
+        _muestreo.configurar(_parsear_muestreo(muestreo))
+    if _listener is not None:
+        return
+
+    salida = logging.StreamHandler(sys.stdout)
+    if formato == "json":
+        salida.setFormatter(FormatoJSON())
+    else:
+        salida.setFormatter(logging.Formatter("%(asctime)s %(levelname)-7s %(name)s — %(message)s"))
+
+    cola = queue.SimpleQueue()
+    encolar = _ColaSinFormato(cola)
+
+    raiz = logging.getLogger(RAIZ)
+    raiz.setLevel(nivel)
+    raiz.handlers[:] = [encolar]
+    raiz.propagate = False
+
+    _listener = logging.handlers.QueueListener(cola, salida, respect_handler_level=True)
+    _listener.start()
+    atexit.register(detener)
+
+
+def detener():
+    """Vacía la cola y detiene el hilo escritor."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def obtener(nombre: str) -> logging.Logger:
+    return logging.getLogger(f"{RAIZ}.{nombre}")
@@ -5,35 +5,55 @@
 """
 
 import asyncio
-import json
 import os
+import threading
+import time
 from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Query
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Query, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, PlainTextResponse
+import orjson
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-
-from database import SessionLocal, init_db
-from models import Suero, Vitales, Alerta, Config, Usuario, Paciente
-from mqtt_client import MQTTManager
+from sqlalchemy import Integer, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+import cache_respuestas
+import ciclo_alertas
+import escalado
+import logs
+logs.configurar()
+
+from database import (AsyncSessionLocal, get_db, get_db_estado, get_db_lectura, init_db, minuto,
+                      leer_config, escribir_config, recargar_config, vigilar_retraso, cerrar_async)
+from models import Suero, Vitales, Usuario, Paciente
+from idempotencia import DISPOSITIVO_DEFECTO
+from mqtt_client import COMANDO_PLAZO, MQTTManager, ComandoSinAck
 from telegram_bot import polling
-from email_service import enviar_email_familiar
+import metricas
+import perfilado
+import sala
+import spool
+import trazas
 
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
 
-mqtt_manager = MQTTManager()
+COMPRESION_MIN_BYTES = int(os.environ.get("COMPRESION_MIN_BYTES", "1024"))
+COMPRESION_NIVEL     = int(os.environ.get("COMPRESION_NIVEL", "5"))     # gzip 1-9 (9 ≈ 10× más lento que 5)
 
 
-# ═══════════════════════════════════════════════════════════════
-#  DEPENDENCY — DB SESSION
-# ═══════════════════════════════════════════════════════════════
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def json_texto(data) -> str:
+    """JSON compacto con orjson (frames de texto del WebSocket); lo no serializable → str."""
+    return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+mqtt_manager = MQTTManager()
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -52,7 +72,8 @@ class ConnectionManager:
             self.active.remove(ws)
 
     async def broadcast(self, data: dict):
-        msg  = json.dumps(data, default=str)
+        inicio = time.perf_counter()
+        msg  = json_texto(data)
         dead = []
         for ws in self.active:
             try:
@@ -61,9 +82,13 @@ class ConnectionManager:
                 dead.append(ws)
         for ws in dead:
             self.disconnect(ws)
+        metricas.WS_BROADCAST.observe(time.perf_counter() - inicio)
 
 
 ws_manager = ConnectionManager()
+ws_sala    = ConnectionManager()        # vista de sala: sólo deltas por tick (sala.py)
+metricas.Medidor("ws_clientes", "Clientes WebSocket conectados", funcion=lambda: len(ws_manager.active))
+metricas.Medidor("ws_sala_clientes", "Clientes WebSocket de la vista de sala", funcion=lambda: len(ws_sala.active))
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -72,16 +97,44 @@ ws_manager = ConnectionManager()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     init_db()
+    ciclo_alertas.cargar_activas()
+    escalado.reconstruir()
     task_mqtt     = asyncio.create_task(mqtt_manager.start(ws_manager))
     task_telegram = asyncio.create_task(polling())
+    task_lag      = asyncio.create_task(metricas.monitorear_event_loop())
+    task_spool    = asyncio.create_task(spool.reenviar())
+    task_archivo  = asyncio.create_task(ciclo_alertas.archivar())
+    task_escalado = asyncio.create_task(escalado.escalador.correr())
+    task_replica  = asyncio.create_task(vigilar_retraso())
+    task_sala     = asyncio.create_task(sala.transmitir(ws_sala.broadcast))
+    task_alertas  = asyncio.create_task(ciclo_alertas.guardar())
+    task_config   = asyncio.create_task(recargar_config())
     yield
     task_mqtt.cancel()
     task_telegram.cancel()
+    task_lag.cancel()
+    task_spool.cancel()
+    task_archivo.cancel()
+    task_escalado.cancel()
+    task_replica.cancel()
+    task_sala.cancel()
+    task_alertas.cancel()
+    task_config.cancel()
     try:
         await task_mqtt
         await task_telegram
+        await task_lag
+        await task_spool
+        await task_archivo
+        await task_escalado
+        await task_replica
+        await task_sala
+        await task_alertas
+        await task_config
     except asyncio.CancelledError:
         pass
+    spool.obtener_spool().cerrar()
+    await cerrar_async()
 
 
 app = FastAPI(
@@ -89,6 +142,7 @@ app = FastAPI(
     description="UNMSM FISI 2026 — Consultorio General",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -99,6 +153,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Comprime respuestas de más de COMPRESION_MIN_BYTES: Brotli si está brotli-asgi y el cliente lo
+# acepta (con gzip de respaldo), si no gzip
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESION_MIN_BYTES, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESION_MIN_BYTES, compresslevel=COMPRESION_NIVEL)
+
+
+# ═══════════════════════════════════════════════════════════════
+#  PERFILADO POR PETICIÓN (header X-Perfil: 1 + X-Perfil-Token)
+# ═══════════════════════════════════════════════════════════════
+@app.middleware("http")
+async def perfilar_peticion(request: Request, call_next):
+    if request.headers.get("x-perfil") != "1" or not perfilado.autorizado(request.headers.get("x-perfil-token")):
+        return await call_next(request)
+
+    # Todos los hilos: el trabajo bloqueante de la petición (to_thread, endpoints `def`) corre fuera del loop
+    muestreador = perfilado.Muestreador(omitir_ociosos=True).iniciar()
+    inicio      = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        await asyncio.to_thread(muestreador.detener)
+    perfil_id = perfilado.guardar_perfil_peticion(request.url.path, time.perf_counter() - inicio, muestreador)
+    response.headers["X-Perfil-Id"] = perfil_id
+    return response
+
 
 # ═══════════════════════════════════════════════════════════════
 #  ESTADO GLOBAL — PACIENTE ACTIVO
@@ -113,28 +194,40 @@ _paciente_activo_id: int | None = None
 async def websocket_endpoint(websocket: WebSocket):
     await ws_manager.connect(websocket)
     try:
-        db = SessionLocal()
-        try:
-            # Solo mandar paciente_activo, sin lectura ni vitales iniciales
-            if _paciente_activo_id:
-                p = db.query(Paciente).filter(Paciente.id == _paciente_activo_id).first()
-                if p:
-                    await websocket.send_text(json.dumps({
-                        "type":     "paciente_activo",
-                        "paciente": p.to_dict(),
-                    }, default=str))
-        finally:
-            db.close()
+        # Solo mandar paciente_activo, sin lectura ni vitales iniciales
+        if _paciente_activo_id:
+            async with AsyncSessionLocal() as db:       # sesión corta: no se retiene durante la conexión
+                p = await db.get(Paciente, _paciente_activo_id)
+            if p:
+                await websocket.send_text(json_texto({
+                    "type":     "paciente_activo",
+                    "paciente": p.to_dict(),
+                }))
 
         while True:
             await asyncio.sleep(30)
-            await websocket.send_text(json.dumps({"type": "ping"}))
+            await websocket.send_text(json_texto({"type": "ping"}))
 
     except WebSocketDisconnect:
         ws_manager.disconnect(websocket)
     except Exception:
         ws_manager.disconnect(websocket)
 
+@app.websocket("/ws/sala")
+async def websocket_sala(websocket: WebSocket):
+    await ws_sala.connect(websocket)
+    try:
+        # Instantánea y alta en el mismo paso del loop: los deltas siguientes traen v mayor
+        await websocket.send_text(json_texto(sala.tablero.instantanea()))
+        while True:
+            await asyncio.sleep(30)
+            await websocket.send_text(json_texto({"type": "ping"}))
+
+    except WebSocketDisconnect:
+        ws_sala.disconnect(websocket)
+    except Exception:
+        ws_sala.disconnect(websocket)
+
 # ═══════════════════════════════════════════════════════════════
 #  REST — GENERAL
 # ═══════════════════════════════════════════════════════════════
@@ -142,58 +235,100 @@ async def websocket_endpoint(websocket: WebSocket):
 def root():
     return {"status": "ok", "service": "Monitor IoT Posta Médica — Consultorio General"}
 
+@app.get("/sala")
+async def get_sala():
+    """Estado actual de todas las camas (filas en el orden de "campos"), desde memoria."""
+    return ORJSONResponse(sala.tablero.instantanea())
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(metricas.exportar(), media_type="text/plain; version=0.0.4")
 
 # ═══════════════════════════════════════════════════════════════
-#  REST — SUERO
+#  ADMIN — PERFILADO (requiere PERFIL_TOKEN)
 # ═══════════════════════════════════════════════════════════════
-@app.get("/suero")
-def get_suero(limit: int = 60):
-    db = SessionLocal()
+def verificar_perfil(x_perfil_token: str | None = Header(None)):
+    if not perfilado.autorizado(x_perfil_token):
+        raise HTTPException(status_code=403, detail="Perfilado deshabilitado o token inválido")
+
+@app.post("/admin/perfil/loop", response_class=PlainTextResponse, dependencies=[Depends(verificar_perfil)])
+async def perfilar_loop(segundos: float = Query(10, gt=0, le=perfilado.DURACION_MAXIMA),
+                        intervalo_ms: float = Query(5, ge=1, le=100)):
+    """Captura del event loop durante N segundos → pilas folded (flame graph)."""
+    muestreador = perfilado.Muestreador({threading.get_ident()}, intervalo_ms / 1000).iniciar()
     try:
-        rows = db.query(Suero).order_by(Suero.id.desc()).limit(limit).all()
-        return [r.to_dict() for r in reversed(rows)]
+        await asyncio.sleep(segundos)
     finally:
-        db.close()
+        await asyncio.to_thread(muestreador.detener)
+    return PlainTextResponse(muestreador.folded())
+
+@app.get("/admin/perfil/peticiones/{perfil_id}", response_class=PlainTextResponse,
+         dependencies=[Depends(verificar_perfil)])
+def get_perfil_peticion(perfil_id: str):
+    perfil = perfilado.perfil_peticion(perfil_id)
+    if not perfil:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return PlainTextResponse(perfil["folded"], headers={
+        "X-Perfil-Ruta":     perfil["ruta"],
+        "X-Perfil-Duracion": str(perfil["duracion_ms"]),
+    })
+
+@app.post("/admin/perfil/ingesta", dependencies=[Depends(verificar_perfil)])
+async def activar_perfil_ingesta(segundos: float = Query(60, gt=0, le=perfilado.DURACION_MAXIMA),
+                                 top: int = Query(10, ge=1, le=100)):
+    """Registra las llamadas más lentas de los handlers MQTT durante N segundos."""
+    perfilado.activar_ingesta(segundos, top, threading.get_ident())
+    return {"ok": True, "segundos": segundos, "top": top}
+
+@app.get("/admin/perfil/ingesta", dependencies=[Depends(verificar_perfil)])
+def get_perfil_ingesta():
+    return perfilado.ingesta_lentas()
+
+@app.get("/trazas/lentas")
+def get_trazas_lentas(limit: int = Query(20, ge=1, le=500), nombre: str | None = None):
+    """Trazas recientes más lentas por etapa (nombre: mqtt.lecturas | mqtt.vitales)."""
+    return trazas.lentas(limit, nombre)
+
+
+# ═══════════════════════════════════════════════════════════════
+#  REST — SUERO
+# ═══════════════════════════════════════════════════════════════
+# Listas de lecturas: tuplas Core (select_lista / dicts_lista, sin objetos ORM) y ORJSONResponse
+# devuelta directamente, que se salta el jsonable_encoder de FastAPI
+@app.get("/suero")
+async def get_suero(limit: int = 60, db: AsyncSession = Depends(get_db_lectura)):
+    rows = (await db.execute(Suero.select_lista().order_by(Suero.id.desc()).limit(limit))).all()
+    return ORJSONResponse(Suero.dicts_lista(reversed(rows)))
 
 @app.get("/suero/ultimo")
-def get_ultimo_suero():
-    db = SessionLocal()
-    try:
-        row = db.query(Suero).order_by(Suero.id.desc()).first()
-        if not row:
-            raise HTTPException(status_code=404, detail="Sin lecturas de suero aún")
-        return row.to_dict()
-    finally:
-        db.close()
+async def get_ultimo_suero(db: AsyncSession = Depends(get_db_estado)):
+    row = await db.scalar(select(Suero).order_by(Suero.id.desc()).limit(1))
+    if not row:
+        raise HTTPException(status_code=404, detail="Sin lecturas de suero aún")
+    return {**row.to_dict(), "estimacion": mqtt_manager.estimacion_suero(row.paciente_id)}
 
 @app.get("/suero/rango")
-def get_suero_rango(desde: str, hasta: str):
-    db = SessionLocal()
-    try:
-        rows = (
-            db.query(Suero)
-            .filter(Suero.timestamp >= desde, Suero.timestamp <= hasta)
-            .order_by(Suero.timestamp).all()
-        )
-        return [r.to_dict() for r in rows]
-    finally:
-        db.close()
-
-from sqlalchemy import Integer, func
+async def get_suero_rango(desde: str, hasta: str, db: AsyncSession = Depends(get_db_lectura)):
+    rows = (await db.execute(
+        Suero.select_lista()
+        .where(Suero.timestamp >= desde, Suero.timestamp <= hasta)
+        .order_by(Suero.timestamp)
+    )).all()
+    return ORJSONResponse(Suero.dicts_lista(rows))
 
 @app.get("/suero/por-minuto")
-def get_suero_por_minuto(limit: int = 60, paciente_id: int | None = None, db: Session = Depends(get_db)):
+async def get_suero_por_minuto(limit: int = 60, paciente_id: int | None = None, db: AsyncSession = Depends(get_db_lectura)):
     pid = paciente_id or _paciente_activo_id  # ← usa el del frontend si viene, si no el global
-    q = db.query(
-        func.date_format(Suero.timestamp, "%Y-%m-%d %H:%i").label("minuto"),
+    q = select(
+        minuto(Suero.timestamp).label("minuto"),
         func.avg(Suero.peso).label("peso"),
         func.max(Suero.bomba.cast(Integer)).label("bomba"),
         func.max(Suero.estado_suero).label("estado_suero"),
     )
     if pid:
-        q = q.filter(Suero.paciente_id == pid)
-    rows = q.group_by("minuto").order_by("minuto").limit(limit).all()
-    return [
+        q = q.where(Suero.paciente_id == pid)
+    rows = (await db.execute(q.group_by("minuto").order_by("minuto").limit(limit))).all()
+    return ORJSONResponse([
         {
             "time":         row.minuto[-5:],
             "timestamp":    row.minuto,
@@ -202,21 +337,21 @@ def get_suero_por_minuto(limit: int = 60, paciente_id: int | None = None, db: Se
             "estado_suero": row.estado_suero or "NORMAL",
         }
         for row in rows
-    ]
+    ])
 
 @app.get("/vitales/por-minuto")
-def get_vitales_por_minuto(limit: int = 60, paciente_id: int | None = None, db: Session = Depends(get_db)):
+async def get_vitales_por_minuto(limit: int = 60, paciente_id: int | None = None, db: AsyncSession = Depends(get_db_lectura)):
     pid = paciente_id or _paciente_activo_id
-    q = db.query(
-        func.date_format(Vitales.timestamp, "%Y-%m-%d %H:%i").label("minuto"),
+    q = select(
+        minuto(Vitales.timestamp).label("minuto"),
         func.avg(Vitales.fc).label("fc"),
         func.avg(Vitales.spo2).label("spo2"),
         func.max(Vitales.estado_vitales).label("estado_vitales"),
-    ).filter(Vitales.fc > 0, Vitales.spo2 > 0)
+    ).where(Vitales.fc > 0, Vitales.spo2 > 0)
     if pid:
-        q = q.filter(Vitales.paciente_id == pid)
-    rows = q.group_by("minuto").order_by("minuto").limit(limit).all()
-    return [
+        q = q.where(Vitales.paciente_id == pid)
+    rows = (await db.execute(q.group_by("minuto").order_by("minuto").limit(limit))).all()
+    return ORJSONResponse([
         {
             "time":           row.minuto[-5:],
             "timestamp":      row.minuto,
@@ -225,71 +360,64 @@ def get_vitales_por_minuto(limit: int = 60, paciente_id: int | None = None, db:
             "estado_vitales": row.estado_vitales or "NORMAL",
         }
         for row in rows
-    ]
+    ])
 
 # ═══════════════════════════════════════════════════════════════
 #  REST — VITALES
 # ═══════════════════════════════════════════════════════════════
 @app.get("/vitales")
-def get_vitales(limit: int = 60):
-    db = SessionLocal()
-    try:
-        rows = db.query(Vitales).order_by(Vitales.id.desc()).limit(limit).all()
-        return [r.to_dict() for r in reversed(rows)]
-    finally:
-        db.close()
+async def get_vitales(limit: int = 60, db: AsyncSession = Depends(get_db_lectura)):
+    rows = (await db.execute(Vitales.select_lista().order_by(Vitales.id.desc()).limit(limit))).all()
+    return ORJSONResponse(Vitales.dicts_lista(reversed(rows)))
 
 @app.get("/vitales/ultimo")
-def get_ultimos_vitales():
-    db = SessionLocal()
-    try:
-        row = db.query(Vitales).order_by(Vitales.id.desc()).first()
-        if not row:
-            raise HTTPException(status_code=404, detail="Sin lecturas de vitales aún")
-        return row.to_dict()
-    finally:
-        db.close()
+async def get_ultimos_vitales(db: AsyncSession = Depends(get_db_estado)):
+    row = await db.scalar(select(Vitales).order_by(Vitales.id.desc()).limit(1))
+    if not row:
+        raise HTTPException(status_code=404, detail="Sin lecturas de vitales aún")
+    return row.to_dict()
 
 @app.get("/vitales/rango")
-def get_vitales_rango(desde: str, hasta: str):
-    db = SessionLocal()
-    try:
-        rows = (
-            db.query(Vitales)
-            .filter(Vitales.timestamp >= desde, Vitales.timestamp <= hasta)
-            .order_by(Vitales.timestamp).all()
-        )
-        return [r.to_dict() for r in rows]
-    finally:
-        db.close()
+async def get_vitales_rango(desde: str, hasta: str, db: AsyncSession = Depends(get_db_lectura)):
+    rows = (await db.execute(
+        Vitales.select_lista()
+        .where(Vitales.timestamp >= desde, Vitales.timestamp <= hasta)
+        .order_by(Vitales.timestamp)
+    )).all()
+    return ORJSONResponse(Vitales.dicts_lista(rows))
 
 
 # ═══════════════════════════════════════════════════════════════
 #  REST — ALERTAS
 # ═══════════════════════════════════════════════════════════════
 @app.get("/alertas")
-def get_alertas(limit: int = 20, solo_activas: bool = False, paciente_id: int | None = None):
-    db = SessionLocal()
+async def get_alertas(limit: int = 20, solo_activas: bool = False, paciente_id: int | None = None,
+                      db: AsyncSession = Depends(get_db_estado)):
+    # Sin solo_activas también se leen las ya archivadas (alertas_archivo)
     pid = paciente_id or _paciente_activo_id
-    try:
-        q = db.query(Alerta).order_by(Alerta.id.desc())
-        if solo_activas:
-            q = q.filter(Alerta.activa == True)
-        if pid:
-            q = q.filter(Alerta.paciente_id == pid)
-        return [r.to_dict() for r in q.limit(limit).all()]
-    finally:
-        db.close()
+    return ORJSONResponse(await ciclo_alertas.listar(db, limit, pid, solo_activas))
+
+async def _reconocer(db: AsyncSession, ids: list[int] | None = None, paciente_id: int | None = None) -> list[dict]:
+    reconocidas = await ciclo_alertas.reconocer(db, ids, paciente_id)
+    if reconocidas:
+        await ws_manager.broadcast({"type": "alertas_reconocidas", "data": reconocidas})
+    return reconocidas
+
+@app.post("/alertas/{alerta_id}/reconocer")
+async def reconocer_alerta(alerta_id: int, db: AsyncSession = Depends(get_db)):
+    reconocidas = await _reconocer(db, ids=[alerta_id])
+    return {"ok": True, "reconocidas": [a["id"] for a in reconocidas]}
+
+@app.post("/pacientes/{paciente_id}/alertas/reconocer")
+async def reconocer_alertas_paciente(paciente_id: int, db: AsyncSession = Depends(get_db)):
+    reconocidas = await _reconocer(db, paciente_id=paciente_id)
+    return {"ok": True, "reconocidas": [a["id"] for a in reconocidas]}
 
 @app.delete("/alertas")
-def limpiar_alertas():
-    db = SessionLocal()
-    try:
-        db.query(Alerta).update({"activa": False})
-        db.commit()
-        return {"ok": True, "mensaje": "Alertas desactivadas"}
-    finally:
-        db.close()
+async def limpiar_alertas(paciente_id: int | None = None, db: AsyncSession = Depends(get_db)):
+    # Sólo toca las activas (del paciente indicado, o todas)
+    reconocidas = await _reconocer(db, paciente_id=paciente_id)
+    return {"ok": True, "mensaje": f"{len(reconocidas)} alertas desactivadas"}
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -309,8 +437,15 @@ async def enviar_comando(body: ComandoRequest):
             detail=f"Comando inválido. Válidos: {COMANDOS_VALIDOS}"
         )
     mqtt_manager.ultimo_origen = body.origen
-    await mqtt_manager.publicar_comando(body.cmd)
-    return {"ok": True, "cmd": body.cmd, "timestamp": datetime.utcnow().isoformat()}
+    try:
+        ack = await mqtt_manager.ejecutar_comando(body.cmd, plazo=COMANDO_PLAZO)
+    except ComandoSinAck:
+        raise HTTPException(status_code=504, detail=f"El ESP32 no confirmó '{body.cmd}'")
+    respuesta = {"ok": ack["ok"], "cmd": body.cmd, "id": ack["id"], "rtt_ms": ack.get("rtt_ms"),
+                 "timestamp": datetime.utcnow().isoformat()}
+    if "reemplazado_por" in ack:
+        respuesta["reemplazado_por"] = ack["reemplazado_por"]
+    return respuesta
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -323,19 +458,16 @@ class EmailRequest(BaseModel):
     paciente_id:  int | None = None
 
 @app.post("/enviar-email")
-async def enviar_email_endpoint(body: EmailRequest):
+async def enviar_email_endpoint(body: EmailRequest, db: AsyncSession = Depends(get_db)):
     from email_service import enviar_email_familiar
-    
-    db = SessionLocal()
-    try:
-        paciente = None
-        if _paciente_activo_id:  # ← usa la variable global, no cfg
-            p = db.query(Paciente).filter(Paciente.id == _paciente_activo_id).first()
-            if p:
-                paciente = p.to_dict()
-    finally:
-        db.close()
-    
+
+    paciente = None
+    if _paciente_activo_id:  # ← usa la variable global, no cfg
+        p = await db.get(Paciente, _paciente_activo_id)
+        if p:
+            paciente = p.to_dict()
+    await db.close()         # la sesión no se retiene mientras se arma y envía el correo
+
     await enviar_email_familiar(
         payload      = body.payload,
         alertas      = body.alertas,
@@ -353,70 +485,46 @@ class ConfigRequest(BaseModel):
     peso_critico: float
 
 @app.get("/config")
-def get_configuracion():
-    db = SessionLocal()
-    try:
-        q = db.query(Config).order_by(Config.id.desc())
-        if _paciente_activo_id:
-            # Busca config específica del paciente, si no existe usa la global
-            cfg = q.filter(Config.paciente_id == _paciente_activo_id).first()
-            if not cfg:
-                cfg = q.filter(Config.paciente_id == None).first()
-        else:
-            cfg = q.first()
-        if cfg:
-            return cfg.to_dict()
-        return {"peso_alerta": 150.0, "peso_critico": 100.0}
-    finally:
-        db.close()
+async def get_configuracion(request: Request, db: AsyncSession = Depends(get_db)):
+    # Config específica del paciente activo; si no existe, la global
+    paciente_id = _paciente_activo_id
+    return await cache_respuestas.responder(request, "config", paciente_id,
+                                            lambda: leer_config(db, paciente_id=paciente_id))
 
 @app.post("/config")
-async def guardar_configuracion(body: ConfigRequest):
+async def guardar_configuracion(body: ConfigRequest, db: AsyncSession = Depends(get_db)):
     if body.peso_critico >= body.peso_alerta:
         raise HTTPException(status_code=400, detail="El umbral crítico debe ser menor que el de alerta")
     if body.peso_critico < 10 or body.peso_alerta > 490:
         raise HTTPException(status_code=400, detail="Umbrales fuera de rango (10–490g)")
 
-    db = SessionLocal()
-    try:
-        cfg = Config(
-            paciente_id  = _paciente_activo_id,  # ← vincula al paciente activo
-            peso_alerta  = body.peso_alerta,
-            peso_critico = body.peso_critico,
-            updated_at   = datetime.utcnow() - timedelta(hours=5),
-        )
-        db.add(cfg)
-        db.commit()
-        db.refresh(cfg)
-        result = cfg.to_dict()
-    finally:
-        db.close()
+    # ← vincula al paciente activo (o global sin paciente)
+    result = await escribir_config(db, _paciente_activo_id, body.peso_alerta, body.peso_critico)
+    cache_respuestas.invalidar("config")
 
-    await mqtt_manager.publicar_config(body.peso_alerta, body.peso_critico)
+    await mqtt_manager.publicar_config(body.peso_alerta, body.peso_critico, result["version"])
     return {"ok": True, "config": result}
 
 # ═══════════════════════════════════════════════════════════════
 #  REST — STATS
 # ═══════════════════════════════════════════════════════════════
 @app.get("/stats")
-def get_stats():
-    db = SessionLocal()
-    try:
-        total_suero     = db.query(Suero).count()
-        total_vitales   = db.query(Vitales).count()
-        alertas_activas = db.query(Alerta).filter(Alerta.activa == True).count()
-        ultimo_suero    = db.query(Suero).order_by(Suero.id.desc()).first()
-        ultimos_vitales = db.query(Vitales).order_by(Vitales.id.desc()).first()
-        return {
-            "total_suero":     total_suero,
-            "total_vitales":   total_vitales,
-            "alertas_activas": alertas_activas,
-            "ultimo_suero":    ultimo_suero.to_dict()    if ultimo_suero    else None,
-            "ultimos_vitales": ultimos_vitales.to_dict() if ultimos_vitales else None,
-            "clientes_ws":     len(ws_manager.active),
-        }
-    finally:
-        db.close()
+async def get_stats(db: AsyncSession = Depends(get_db_estado)):
+    total_suero     = await db.scalar(select(func.count()).select_from(Suero))
+    total_vitales   = await db.scalar(select(func.count()).select_from(Vitales))
+    ultimo_suero    = await db.scalar(select(Suero).order_by(Suero.id.desc()).limit(1))
+    ultimos_vitales = await db.scalar(select(Vitales).order_by(Vitales.id.desc()).limit(1))
+    return {
+        "total_suero":     total_suero,
+        "total_vitales":   total_vitales,
+        "alertas_activas": ciclo_alertas.activas(),
+        "ultimo_suero":    ultimo_suero.to_dict()    if ultimo_suero    else None,
+        "ultimos_vitales": ultimos_vitales.to_dict() if ultimos_vitales else None,
+        "clientes_ws":     len(ws_manager.active),
+        "estimacion_suero": mqtt_manager.estimacion_suero(),
+        "ultimo_crudo":     mqtt_manager.ultimo_crudo(),
+        "spool":            spool.obtener_spool().estado(),
+    }
 
 
 # ═══════════════════════════════════════════════════════════════
@@ -427,19 +535,15 @@ class LoginRequest(BaseModel):
     password: str
 
 @app.post("/login")
-def login(body: LoginRequest):
-    db = SessionLocal()
-    try:
-        user = db.query(Usuario).filter(
-            Usuario.usuario  == body.usuario,
-            Usuario.password == body.password,
-            Usuario.activo   == True,
-        ).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="Usuario o contraseña incorrectos")
-        return user.to_dict()
-    finally:
-        db.close()
+async def login(body: LoginRequest, db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(Usuario).where(
+        Usuario.usuario  == body.usuario,
+        Usuario.password == body.password,
+        Usuario.activo   == True,
+    ))
+    if not user:
+        raise HTTPException(status_code=401, detail="Usuario o contraseña incorrectos")
+    return user.to_dict()
 
 @app.post("/logout")
 async def logout():
@@ -456,7 +560,7 @@ class PacienteRequest(BaseModel):
     nombre:            str
     apellido:          str
     codigo:            str | None = None
-    doctor_id:         int | None = None          
+    doctor_id:         int | None = None
     grupo_sanguineo:   str = ""
     fecha_nacimiento:  str = ""
     fecha_ingreso:     str = ""
@@ -465,167 +569,165 @@ class PacienteRequest(BaseModel):
     contacto_telefono: str = ""
     contacto_relacion: str = ""
 
+async def _paciente_o_404(db: AsyncSession, paciente_id: int) -> Paciente:
+    p = await db.get(Paciente, paciente_id)
+    if not p:
+        raise HTTPException(status_code=404, detail="Paciente no encontrado")
+    return p
+
 @app.get("/pacientes")
-def get_pacientes(solo_activos: bool = True, doctor_id: int | None = Query(None)):
-    db = SessionLocal()
-    try:
-        q = db.query(Paciente)
+async def get_pacientes(request: Request, solo_activos: bool = True, doctor_id: int | None = Query(None),
+                        db: AsyncSession = Depends(get_db)):
+    async def producir():
+        # Doctor en el mismo SELECT (LEFT OUTER JOIN): una sola consulta en frío
+        q = select(Paciente).options(joinedload(Paciente.doctor))
         if solo_activos:
-            q = q.filter(Paciente.activo == True)
+            q = q.where(Paciente.activo == True)
         if doctor_id:
-            q = q.filter(Paciente.doctor_id == doctor_id)
-        return [p.to_dict() for p in q.order_by(Paciente.id.desc()).all()]
-    finally:
-        db.close()
+            q = q.where(Paciente.doctor_id == doctor_id)
+        return [p.to_dict() for p in (await db.scalars(q.order_by(Paciente.id.desc()))).all()]
+
+    return await cache_respuestas.responder(request, "pacientes", ("lista", solo_activos, doctor_id), producir)
 
 @app.get("/pacientes/{paciente_id}")
-def get_paciente(paciente_id: int):
-    db = SessionLocal()
-    try:
-        p = db.query(Paciente).filter(Paciente.id == paciente_id).first()
-        if not p:
-            raise HTTPException(status_code=404, detail="Paciente no encontrado")
-        return p.to_dict()
-    finally:
-        db.close()
+async def get_paciente(request: Request, paciente_id: int, db: AsyncSession = Depends(get_db)):
+    async def producir():
+        return (await _paciente_o_404(db, paciente_id)).to_dict()
 
-@app.post("/pacientes")
-def crear_paciente(body: PacienteRequest):
-    db = SessionLocal()
-    try:
-        p = Paciente(
-            nombre            = body.nombre,
-            apellido          = body.apellido,
-            codigo            = body.codigo,
-            doctor_id         = body.doctor_id,
-            grupo_sanguineo   = body.grupo_sanguineo,
-            fecha_nacimiento  = body.fecha_nacimiento,
-            fecha_ingreso     = body.fecha_ingreso,
-            direccion         = body.direccion,
-            contacto_nombre   = body.contacto_nombre,
-            contacto_telefono = body.contacto_telefono,
-            contacto_relacion = body.contacto_relacion,
-            activo            = True,
-        )
-        db.add(p)
-        db.commit()
-        db.refresh(p)
+    return await cache_respuestas.responder(request, "pacientes", ("uno", paciente_id), producir)
 
-        # Generar código si no vino del frontend
-        if not p.codigo:
-            p.codigo = f"PCT-{datetime.now().year}-{str(p.id).zfill(4)}"
-            db.commit()
+@app.post("/pacientes")
+async def crear_paciente(body: PacienteRequest, db: AsyncSession = Depends(get_db)):
+    p = Paciente(
+        nombre            = body.nombre,
+        apellido          = body.apellido,
+        codigo            = body.codigo,
+        doctor_id         = body.doctor_id,
+        grupo_sanguineo   = body.grupo_sanguineo,
+        fecha_nacimiento  = body.fecha_nacimiento,
+        fecha_ingreso     = body.fecha_ingreso,
+        direccion         = body.direccion,
+        contacto_nombre   = body.contacto_nombre,
+        contacto_telefono = body.contacto_telefono,
+        contacto_relacion = body.contacto_relacion,
+        activo            = True,
+    )
+    db.add(p)
+    await db.flush()
 
-        return p.to_dict()
-    finally:
-        db.close()
+    # Generar código si no vino del frontend
+    if not p.codigo:
+        p.codigo = f"PCT-{datetime.now().year}-{str(p.id).zfill(4)}"
+    await db.commit()
+    cache_respuestas.invalidar("pacientes")
+    await db.refresh(p)     # carga el doctor (relación joined) para to_dict
+    return p.to_dict()
 
 @app.put("/pacientes/{paciente_id}")
-def actualizar_paciente(paciente_id: int, body: PacienteRequest):
-    db = SessionLocal()
-    try:
-        p = db.query(Paciente).filter(Paciente.id == paciente_id).first()
-        if not p:
-            raise HTTPException(status_code=404, detail="Paciente no encontrado")
-        p.nombre            = body.nombre
-        p.apellido          = body.apellido
-        p.codigo            = body.codigo
-        p.doctor_id         = body.doctor_id    # ← cambio
-        p.grupo_sanguineo   = body.grupo_sanguineo
-        p.fecha_nacimiento  = body.fecha_nacimiento
-        p.fecha_ingreso     = body.fecha_ingreso
-        p.direccion         = body.direccion
-        p.contacto_nombre   = body.contacto_nombre
-        p.contacto_telefono = body.contacto_telefono
-        p.contacto_relacion = body.contacto_relacion
-        db.commit()
-        db.refresh(p)
-        return p.to_dict()
-    finally:
-        db.close()
+async def actualizar_paciente(paciente_id: int, body: PacienteRequest, db: AsyncSession = Depends(get_db)):
+    p = await _paciente_o_404(db, paciente_id)
+    p.nombre            = body.nombre
+    p.apellido          = body.apellido
+    p.codigo            = body.codigo
+    p.doctor_id         = body.doctor_id    # ← cambio
+    p.grupo_sanguineo   = body.grupo_sanguineo
+    p.fecha_nacimiento  = body.fecha_nacimiento
+    p.fecha_ingreso     = body.fecha_ingreso
+    p.direccion         = body.direccion
+    p.contacto_nombre   = body.contacto_nombre
+    p.contacto_telefono = body.contacto_telefono
+    p.contacto_relacion = body.contacto_relacion
+    await db.commit()
+    cache_respuestas.invalidar("pacientes")
+    await db.refresh(p)
+    return p.to_dict()
 
 @app.delete("/pacientes/{paciente_id}")
-def desactivar_paciente(paciente_id: int):
-    db = SessionLocal()
-    try:
-        p = db.query(Paciente).filter(Paciente.id == paciente_id).first()
-        if not p:
-            raise HTTPException(status_code=404, detail="Paciente no encontrado")
-        p.activo = False
-        db.commit()
-        return {"ok": True, "mensaje": f"Paciente desactivado"}
-    finally:
-        db.close()
+async def desactivar_paciente(paciente_id: int, db: AsyncSession = Depends(get_db)):
+    p = await _paciente_o_404(db, paciente_id)
+    p.activo = False
+    await db.commit()
+    cache_respuestas.invalidar("pacientes")
+    return {"ok": True, "mensaje": f"Paciente desactivado"}
 
 
 # ═══════════════════════════════════════════════════════════════
 #  REST — PACIENTE ACTIVO + RESET
 # ═══════════════════════════════════════════════════════════════
 @app.get("/paciente-activo")
-def get_paciente_activo():
-    if _paciente_activo_id is None:
-        return {"paciente": None}
-    db = SessionLocal()
-    try:
-        p = db.query(Paciente).filter(Paciente.id == _paciente_activo_id).first()
+async def get_paciente_activo(request: Request, db: AsyncSession = Depends(get_db)):
+    paciente_id = _paciente_activo_id
+
+    async def producir():
+        p = await db.get(Paciente, paciente_id) if paciente_id is not None else None
         return {"paciente": p.to_dict() if p else None}
-    finally:
-        db.close()
+
+    return await cache_respuestas.responder(request, "pacientes", ("activo", paciente_id), producir)
 
 class SeleccionarPacienteRequest(BaseModel):
     paciente_id: int
+    dispositivo: str | None = None      # cama (ESP32); por defecto la del dashboard
 
 @app.post("/paciente-activo")
-async def seleccionar_paciente(body: SeleccionarPacienteRequest):
+async def seleccionar_paciente(body: SeleccionarPacienteRequest, db: AsyncSession = Depends(get_db)):
     global _paciente_activo_id
-    db = SessionLocal()
-    try:
-        p = db.query(Paciente).filter(
-            Paciente.id     == body.paciente_id,
-            Paciente.activo == True,
-        ).first()
-        if not p:
-            raise HTTPException(status_code=404, detail="Paciente no encontrado")
-
+    p = await db.scalar(select(Paciente).where(
+        Paciente.id     == body.paciente_id,
+        Paciente.activo == True,
+    ))
+    if not p:
+        raise HTTPException(status_code=404, detail="Paciente no encontrado")
+
+    cama      = body.dispositivo or DISPOSITIVO_DEFECTO
+    del_panel = cama == DISPOSITIVO_DEFECTO      # la cama que muestra el dashboard
+    if del_panel:
         _paciente_activo_id = p.id
-        p.fecha_ingreso = datetime.now().strftime("%d-%m-%Y")
-        db.commit()
+    p.fecha_ingreso = datetime.now().strftime("%d-%m-%Y")
+    await db.commit()
+    cache_respuestas.invalidar("pacientes")
 
-        mqtt_manager.set_paciente_activo(p.to_dict())
-        await mqtt_manager.publicar_comando("reset")
-        await asyncio.sleep(0.5)  # ← dar tiempo al MQTT de procesar
+    mqtt_manager.set_paciente_activo(p.to_dict(), cama)
+    # Un solo plazo para reset + bomba_on: la petición no espera más de COMANDO_PLAZO s en total
+    limite = time.monotonic() + COMANDO_PLAZO
+    reset  = asyncio.create_task(mqtt_manager.ejecutar_comando("reset", dispositivo=cama, plazo=COMANDO_PLAZO))
 
-        # ← NUEVO: revisar peso actual y activar bomba si es necesario
-        cfg = db.query(Config).filter(
-            Config.paciente_id == p.id
-        ).first() or db.query(Config).filter(Config.paciente_id == None).first()
-        
-        peso_critico = cfg.peso_critico if cfg else 100.0
+    # ← NUEVO: revisar peso actual y activar bomba si es necesario (mientras llega el ack del reset)
+    peso_critico = (await leer_config(db, paciente_id=p.id))["peso_critico"]
 
-        ultimo_suero = db.query(Suero).filter(
-            Suero.paciente_id == p.id
-        ).order_by(Suero.id.desc()).first()
+    ultimo_suero = await db.scalar(
+        select(Suero).where(Suero.paciente_id == p.id).order_by(Suero.id.desc()).limit(1)
+    )
+    await db.close()        # no retener la conexión mientras se esperan los acks del ESP32
 
-        if ultimo_suero and ultimo_suero.peso <= peso_critico:
-            await asyncio.sleep(1)  # espera que el ESP32 termine el reset
-            await mqtt_manager.publicar_comando("bomba_on")
+    # El ack del reset llega cuando el ESP32 terminó de reiniciar la balanza
+    comandos = {}
+    try:
+        comandos["reset"] = await reset
+    except ComandoSinAck:
+        comandos["reset"] = None
+    if ultimo_suero and ultimo_suero.peso <= peso_critico:
+        try:
+            comandos["bomba_on"] = await mqtt_manager.ejecutar_comando(
+                "bomba_on", dispositivo=cama, plazo=max(0.0, limite - time.monotonic()))
+        except ComandoSinAck:
+            comandos["bomba_on"] = None
 
+    if del_panel:
         await ws_manager.broadcast({
             "type":     "paciente_activo",
             "paciente": p.to_dict(),
         })
 
-        return {"ok": True, "paciente": p.to_dict()}
-    finally:
-        db.close()
+    return {"ok": True, "paciente": p.to_dict(), "comandos": comandos}
 
 @app.get("/usuarios/medicos")
-def get_usuarios_medicos():
-    db = SessionLocal()
-    try:
-        return [u.to_dict() for u in db.query(Usuario)
-                .filter(Usuario.activo == True, Usuario.rol != "Administrador")
-                .order_by(Usuario.nombre).all()]
-    finally:
-        db.close()
+async def get_usuarios_medicos(request: Request, db: AsyncSession = Depends(get_db)):
+    async def producir():
+        return [u.to_dict() for u in (await db.scalars(
+            select(Usuario)
+            .where(Usuario.activo == True, Usuario.rol != "Administrador")
+            .order_by(Usuario.nombre)
+        )).all()]
+
+    return await cache_respuestas.responder(request, "medicos", None, producir)
 
@@ -0,0 +1,226 @@
+"""
+metricas.py
+- Métricas en memoria con exposición en formato texto de Prometheus (GET /metrics)
+- Contadores, medidores e histogramas con buckets pre-asignados
+- Sin locks en el camino caliente: todo corre en el event loop; los hilos del
+  threadpool sólo hacen incrementos simples (una pérdida ocasional es aceptable)
+"""
+
+import asyncio
+import time
+from bisect import bisect_left
+
+# Buckets (segundos) para operaciones del camino caliente: 100 µs … 10 s
+BUCKETS_LATENCIA = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metricas: list = []
+
+
+def _formatear_etiquetas(nombres: tuple, valores: tuple, extra: str = "") -> str:
+    pares = [f'{n}="{v}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre    = nombre
+        self.ayuda     = ayuda
+        self.etiquetas = etiquetas
+        self._hijos: dict = {}
+        _metricas.append(self)
+
+    def de(self, *valores):
+        """Serie hija para un juego de etiquetas (se crea una vez y se reutiliza)."""
+        hijo = self._hijos.get(valores)
+        if hijo is None:
+            hijo = self._hijos[valores] = self._nuevo_hijo()
+        return hijo
+
+    def _nuevo_hijo(self):
+        raise NotImplementedError
+
+    def _muestras(self):
+        if not self.etiquetas and not self._hijos:
+            self.de()
+        return self._hijos.items()
+
+    def exportar(self) -> list[str]:
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        for valores, hijo in self._muestras():
+            lineas += hijo.exportar(self.nombre, _formatear_etiquetas(self.etiquetas, valores),
+                                    self.etiquetas, valores)
+        return lineas
+
+
+class _Valor:
+    __slots__ = ("valor",)
+
+    def __init__(self):
+        self.valor = 0.0
+
+    def inc(self, n: float = 1.0):
+        self.valor += n
+
+    def set(self, v: float):
+        self.valor = v
+
+    def exportar(self, nombre, etiquetas, _nombres, _valores):
+        return [f"{nombre}{etiquetas} {self.valor}"]
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def _nuevo_hijo(self):
+        return _Valor()
+
+    def inc(self, n: float = 1.0):
+        self.de().inc(n)
+
+
+class Medidor(_Metrica):
+    """Gauge; si recibe `funcion`, el valor se calcula al momento del scrape.
+    Con etiquetas, `funcion` devuelve {(valores de etiquetas): valor}."""
+
+    tipo = "gauge"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), funcion=None):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.funcion = funcion
+
+    def _nuevo_hijo(self):
+        return _Valor()
+
+    def set(self, v: float):
+        self.de().set(v)
+
+    def _muestras(self):
+        if self.funcion is not None:
+            if self.etiquetas:
+                for valores, v in self.funcion().items():
+                    self.de(*valores).set(v)
+            else:
+                self.de().set(self.funcion())
+        return super()._muestras()
+
+
+class _Cronometro:
+    __slots__ = ("hist", "inicio")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.inicio)
+        return False
+
+
+class _Serie:
+    __slots__ = ("limites", "cuentas", "suma", "total")
+
+    def __init__(self, limites: tuple):
+        self.limites = limites
+        self.cuentas = [0] * (len(limites) + 1)   # último = +Inf
+        self.suma    = 0.0
+        self.total   = 0
+
+    def observe(self, v: float):
+        self.cuentas[bisect_left(self.limites, v)] += 1
+        self.suma  += v
+        self.total += 1
+
+    def medir(self) -> _Cronometro:
+        return _Cronometro(self)
+
+    def exportar(self, nombre, etiquetas, nombres, valores):
+        lineas, acumulado = [], 0
+        for limite, cuenta in zip(self.limites, self.cuentas):
+            acumulado += cuenta
+            le = _formatear_etiquetas(nombres, valores, f'le="{limite}"')
+            lineas.append(f"{nombre}_bucket{le} {acumulado}")
+        le = _formatear_etiquetas(nombres, valores, 'le="+Inf"')
+        lineas.append(f"{nombre}_bucket{le} {self.total}")
+        lineas.append(f"{nombre}_sum{etiquetas} {self.suma}")
+        lineas.append(f"{nombre}_count{etiquetas} {self.total}")
+        return lineas
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), buckets: tuple = BUCKETS_LATENCIA):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(nombre, ayuda, etiquetas)
+
+    def _nuevo_hijo(self):
+        return _Serie(self.buckets)
+
+    def observe(self, v: float):
+        self.de().observe(v)
+
+    def medir(self) -> _Cronometro:
+        return self.de().medir()
+
+
+def exportar() -> str:
+    lineas = []
+    for m in _metricas:
+        lineas += m.exportar()
+    return "\n".join(lineas) + "\n"
+
+
+# ══════════════════════════════════════════════════════════════
+#  MÉTRICAS DEL BACKEND
+# ══════════════════════════════════════════════════════════════
+MQTT_MENSAJES = Contador("mqtt_mensajes_total", "Mensajes MQTT recibidos por topic", ("topic",))
+MQTT_DECODE   = Histograma("mqtt_decode_segundos", "Tiempo de decodificación JSON por mensaje")
+MQTT_DUPLICADOS = Contador("mqtt_duplicados_total", "Mensajes descartados por clave (dispositivo, seq) repetida", ("topic",))
+MQTT_TARDIOS    = Contador("mqtt_tardios_total", "Mensajes genuinos llegados detrás de la marca de agua del buffer de reorden", ("topic",))
+MQTT_RECONEXIONES = Contador("mqtt_reconexiones_total", "Conexiones MQTT perdidas o fallidas (cada una reintenta con backoff)")
+MQTT_RECUPERACION = Histograma("mqtt_recuperacion_segundos", "Tiempo desde la caída de MQTT hasta volver a estar suscrito",
+                               buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+
+MQTT_COMANDO_RTT        = Histograma("mqtt_comando_rtt_segundos", "Ida y vuelta publish → ack del ESP32 por comando", ("cmd",))
+MQTT_COMANDO_REINTENTOS = Contador("mqtt_comando_reintentos_total", "Comandos reenviados por falta de ack", ("cmd",))
+MQTT_COMANDO_SIN_ACK    = Contador("mqtt_comando_sin_ack_total", "Comandos que agotaron los reintentos sin ack", ("cmd",))
+
+DB_COMMIT = Histograma("db_commit_segundos", "Latencia de escritura + commit en BD", ("operacion",))
+DB_POOL_ESPERA = Histograma("db_pool_espera_segundos", "Espera para obtener una conexión del pool", ("pool",))
+
+ALERTAS_EVALUACION = Histograma("alertas_evaluacion_segundos", "Tiempo de evaluación de alertas", ("tipo",))
+
+WS_BROADCAST = Histograma("ws_broadcast_segundos", "Latencia de fan-out de un broadcast WebSocket")
+
+NOTIFICACION    = Histograma("notificacion_segundos", "Latencia de envío de notificaciones", ("canal",))
+NOTIFICACION_FALLOS = Contador("notificacion_fallos_total", "Notificaciones fallidas", ("canal",))
+
+LOOP_LAG = Histograma("event_loop_lag_segundos", "Retraso del event loop respecto al tick esperado")
+
+# Series conocidas creadas al importar: el camino caliente nunca asigna buckets
+for _op in ("spool_lote", "alertas"):
+    DB_COMMIT.de(_op)
+for _tipo in ("suero", "vitales"):
+    ALERTAS_EVALUACION.de(_tipo)
+for _canal in ("telegram", "email"):
+    NOTIFICACION.de(_canal)
+    NOTIFICACION_FALLOS.de(_canal)
+
+INTERVALO_LAG = 0.5
+
+
+async def monitorear_event_loop():
+    """Mide cuánto se atrasa un sleep de INTERVALO_LAG: ese retraso es el lag del loop."""
+    loop = asyncio.get_running_loop()
+    while True:
+        inicio = loop.time()
+        await asyncio.sleep(INTERVALO_LAG)
+        LOOP_LAG.observe(max(0.0, loop.time() - inicio - INTERVALO_LAG))
@@ -2,11 +2,19 @@
 Modelos SQLAlchemy → tablas MySQL
 """
 from datetime import datetime
-from sqlalchemy import Column, Integer, Float, Boolean, String, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, Float, Boolean, String, DateTime, Text, ForeignKey, Index, select
 from sqlalchemy.orm import relationship
 from database import Base
 
 
+def _marca(ts: datetime | None) -> tuple[str | None, str]:
+    """(isoformat, HH:MM:SS) con un solo formateo: la hora sale del mismo string."""
+    if ts is None:
+        return None, "--"
+    iso = ts.isoformat()
+    return iso, iso[11:19]
+
+
 class Usuario(Base):
     __tablename__ = "usuarios"
 
@@ -75,12 +83,17 @@ class Suero(Base):
     bomba          = Column(Boolean, default=False)
     estado_suero   = Column(String(20), nullable=True)
     origen_comando = Column(String(20), nullable=True)
+    dispositivo    = Column(String(60), nullable=True)
+    seq            = Column(BigInteger, nullable=True)    # clave de idempotencia del ESP32 (ts ms o seq)
+
+    __table_args__ = (Index("uq_suero_dispositivo_seq", "dispositivo", "seq", unique=True),)
 
     def to_dict(self):
+        iso, hora = _marca(self.timestamp)
         return {
             "id":             self.id,
-            "timestamp":      self.timestamp.isoformat() if self.timestamp else None,
-            "time":           self.timestamp.strftime("%H:%M:%S") if self.timestamp else "--",
+            "timestamp":      iso,
+            "time":           hora,
             "paciente_id":    self.paciente_id,
             "peso":           round(self.peso, 1) if self.peso is not None else 0,
             "bomba":          self.bomba or False,
@@ -88,6 +101,30 @@ class Suero(Base):
             "origen_comando": self.origen_comando,
         }
 
+    # Camino rápido de listas grandes: tuplas Core (sin objetos ORM) desempaquetadas en el orden
+    # del SELECT; mismo dict que to_dict
+    @staticmethod
+    def select_lista():
+        c = Suero.__table__.c
+        return select(c.id, c.timestamp, c.paciente_id, c.peso, c.bomba, c.estado_suero, c.origen_comando)
+
+    @staticmethod
+    def dicts_lista(filas) -> list[dict]:
+        lista = []
+        for id_, ts, paciente_id, peso, bomba, estado, origen in filas:
+            iso, hora = _marca(ts)
+            lista.append({
+                "id":             id_,
+                "timestamp":      iso,
+                "time":           hora,
+                "paciente_id":    paciente_id,
+                "peso":           round(peso, 1) if peso is not None else 0,
+                "bomba":          bomba or False,
+                "estado_suero":   estado or "NORMAL",
+                "origen_comando": origen,
+            })
+        return lista
+
 
 class Vitales(Base):
     __tablename__ = "vitales"
@@ -98,50 +135,123 @@ class Vitales(Base):
     fc             = Column(Integer, nullable=False)
     spo2           = Column(Integer, nullable=False)
     estado_vitales = Column(String(20), nullable=True)
+    dispositivo    = Column(String(60), nullable=True)
+    seq            = Column(BigInteger, nullable=True)
+
+    __table_args__ = (Index("uq_vitales_dispositivo_seq", "dispositivo", "seq", unique=True),)
 
     def to_dict(self):
+        iso, hora = _marca(self.timestamp)
         return {
             "id":             self.id,
-            "timestamp":      self.timestamp.isoformat() if self.timestamp else None,
-            "time":           self.timestamp.strftime("%H:%M:%S") if self.timestamp else "--",
+            "timestamp":      iso,
+            "time":           hora,
             "paciente_id":    self.paciente_id,
             "fc":             self.fc   or 0,
             "spo2":           self.spo2 or 0,
             "estado_vitales": self.estado_vitales or "MIDIENDO",
         }
 
+    @staticmethod
+    def select_lista():
+        c = Vitales.__table__.c
+        return select(c.id, c.timestamp, c.paciente_id, c.fc, c.spo2, c.estado_vitales)
+
+    @staticmethod
+    def dicts_lista(filas) -> list[dict]:
+        lista = []
+        for id_, ts, paciente_id, fc, spo2, estado in filas:
+            iso, hora = _marca(ts)
+            lista.append({
+                "id":             id_,
+                "timestamp":      iso,
+                "time":           hora,
+                "paciente_id":    paciente_id,
+                "fc":             fc   or 0,
+                "spo2":           spo2 or 0,
+                "estado_vitales": estado or "MIDIENDO",
+            })
+        return lista
+
 
 class Alerta(Base):
     __tablename__ = "alertas"
+    __table_args__ = (
+        # Activas de un paciente / reconocer por paciente: sólo recorre sus filas activas
+        Index("ix_alertas_paciente_activa_id", "paciente_id", "activa", "id"),
+        # Archivador y conteo inicial: reconocidas / activas sin tocar el resto
+        Index("ix_alertas_activa_id", "activa", "id"),
+    )
 
-    id          = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    timestamp   = Column(DateTime, default=datetime.utcnow, index=True)
-    paciente_id = Column(Integer, ForeignKey("pacientes.id"), nullable=True, index=True)
-    tipo        = Column(String(30))
-    mensaje     = Column(Text)
-    valor       = Column(Float, nullable=True)
-    activa      = Column(Boolean, default=True)
+    id            = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    timestamp     = Column(DateTime, default=datetime.utcnow, index=True)
+    paciente_id   = Column(Integer, ForeignKey("pacientes.id"), nullable=True, index=True)
+    tipo          = Column(String(30))
+    mensaje       = Column(Text)
+    valor         = Column(Float, nullable=True)
+    activa        = Column(Boolean, default=True)
+    reconocida_en = Column(DateTime, nullable=True)
 
     def to_dict(self):
+        iso, hora = _marca(self.timestamp)
         return {
-            "id":          self.id,
-            "timestamp":   self.timestamp.isoformat() if self.timestamp else None,
-            "time":        self.timestamp.strftime("%H:%M:%S") if self.timestamp else "--",
-            "paciente_id": self.paciente_id,
-            "tipo":        self.tipo,
-            "mensaje":     self.mensaje,
-            "valor":       self.valor,
-            "activa":      self.activa,
+            "id":            self.id,
+            "timestamp":     iso,
+            "time":          hora,
+            "paciente_id":   self.paciente_id,
+            "tipo":          self.tipo,
+            "mensaje":       self.mensaje,
+            "valor":         self.valor,
+            "activa":        self.activa,
+            "reconocida_en": self.reconocida_en.isoformat() if self.reconocida_en else None,
+        }
+
+
+class AlertaArchivada(Base):
+    """Alertas reconocidas movidas fuera de la tabla caliente (mismo id que tenían en alertas)."""
+    __tablename__ = "alertas_archivo"
+
+    id            = Column(Integer, primary_key=True, autoincrement=False)
+    timestamp     = Column(DateTime, index=True)
+    paciente_id   = Column(Integer, ForeignKey("pacientes.id"), nullable=True, index=True)
+    tipo          = Column(String(30))
+    mensaje       = Column(Text)
+    valor         = Column(Float, nullable=True)
+    activa        = Column(Boolean, default=False)
+    reconocida_en = Column(DateTime, nullable=True)
+
+    to_dict = Alerta.to_dict
+
+
+class ConfigActual(Base):
+    """Umbrales vigentes: una fila por ámbito (0 = global, si no paciente_id), upsert con versión."""
+    __tablename__ = "config_actual"
+
+    paciente_id  = Column(Integer, primary_key=True, autoincrement=False)   # 0 = global
+    peso_alerta  = Column(Float, nullable=False)
+    peso_critico = Column(Float, nullable=False)
+    version      = Column(Integer, nullable=False, default=1)
+    updated_at   = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            "paciente_id":  self.paciente_id or None,
+            "peso_alerta":  self.peso_alerta,
+            "peso_critico": self.peso_critico,
+            "version":      self.version,
+            "updated_at":   self.updated_at.isoformat() if self.updated_at else None,
         }
 
 
-class Config(Base):
+class ConfigHistorial(Base):
+    """Auditoría append-only de cambios de umbrales (la tabla "config" de versiones anteriores)."""
     __tablename__ = "config"
 
     id           = Column(Integer, primary_key=True, autoincrement=True)
     paciente_id  = Column(Integer, ForeignKey("pacientes.id"), nullable=True, index=True)  # ← nuevo
     peso_alerta  = Column(Float, default=150.0)
     peso_critico = Column(Float, default=100.0)
+    version      = Column(Integer, nullable=True)
     updated_at   = Column(DateTime, default=datetime.utcnow)
 
     def to_dict(self):
@@ -150,5 +260,6 @@ class Config(Base):
             "paciente_id":  self.paciente_id,
             "peso_alerta":  self.peso_alerta,
             "peso_critico": self.peso_critico,
+            "version":      self.version,
             "updated_at":   self.updated_at.isoformat() if self.updated_at else None,
         }
\ No newline at end of file
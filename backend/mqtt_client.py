@@ -2,40 +2,95 @@
 MQTTManager — Posta Médica / Consultorio General
   - posta/consultorio/lecturas  → peso + bomba + estado_suero  (cada 1s)  → tabla suero
   - posta/consultorio/vitales   → fc + spo2 + estado_vitales   (cada 10s) → tabla vitales
-  - posta/consultorio/comandos  → publica comandos al ESP32
+  - posta/consultorio/comandos  → publica comandos al ESP32 ({"cmd", "id"})
+  - posta/consultorio/ack       → confirmación del ESP32 ({"id", "ok"}) por id de correlación
 """
 
 import asyncio
 import json
 import os
+import random
 import ssl
+import time
 from datetime import datetime, timedelta
 
 import aiomqtt
 
-from database import SessionLocal
 from models import Suero, Vitales, Alerta
-from telegram_bot import enviar_alerta, construir_mensaje
+from telegram_bot import enviar_alerta, construir_mensaje, ocupar_turno, turno_restante
 from database import get_config
+from estimador_suero import EstimadorSuero
+from anomalias import DetectorVitales, EVENTO_ATIPICO, EVENTO_BAJA, EVENTO_SUBE
+from logs import obtener, muestrear
+from metricas import (MQTT_MENSAJES, MQTT_DECODE, MQTT_DUPLICADOS, MQTT_RECONEXIONES, MQTT_RECUPERACION,
+                      MQTT_COMANDO_RTT, MQTT_COMANDO_REINTENTOS, MQTT_COMANDO_SIN_ACK,
+                      ALERTAS_EVALUACION)
+import ciclo_alertas
+import idempotencia
+import perfilado
+import reorden
+import sala
+import spool
+import trazas
+from reorden import Mensaje
+from comandos import COMANDOS_EN_VUELO, IDEMPOTENTES, ColaComandos, Comando
+from filtros import FiltrosCama, en_rango, RANGO_PESO, RANGO_FC, RANGO_SPO2
 
 MQTT_HOST   = os.environ.get("MQTT_HOST",   "fd3a3baad98a46c3a2a0caabe973c4b3.s1.eu.hivemq.cloud")
 MQTT_PORT   = int(os.environ.get("MQTT_PORT", "8883"))
 MQTT_USER   = os.environ.get("MQTT_USER",   "esp32_cama04")
 MQTT_PASS   = os.environ.get("MQTT_PASS",   "Hospital123")
 MQTT_CLIENT = os.environ.get("MQTT_CLIENT", "FastAPI_Backend")
+MQTT_TLS    = os.environ.get("MQTT_TLS",    "1") == "1"       # 0 = broker local sin TLS (benchmarks)
+
+# Sesión persistente: el broker guarda suscripciones y encola los QoS1 mientras reconectamos
+MQTT_SESION_PERSISTENTE = os.environ.get("MQTT_SESION_PERSISTENTE", "1") == "1"
+MQTT_RECONEXION_MIN     = float(os.environ.get("MQTT_RECONEXION_MIN", "0.5"))   # s
+MQTT_RECONEXION_MAX     = float(os.environ.get("MQTT_RECONEXION_MAX", "30"))    # s
+
+# Espera del ack del ESP32 por intento; sólo los comandos idempotentes (comandos.IDEMPOTENTES) se
+# reenvían, con el mismo id. COMANDO_PLAZO acota la espera total de una petición REST
+COMANDO_TIMEOUT    = float(os.environ.get("COMANDO_TIMEOUT", "2"))     # s
+COMANDO_REINTENTOS = int(os.environ.get("COMANDO_REINTENTOS", "2"))
+COMANDO_PLAZO      = float(os.environ.get("COMANDO_PLAZO", "3"))       # s
+# Publish que falló (sin PUBACK / socket caído): espera antes de devolverlo a la cola
+COMANDO_REENVIO    = float(os.environ.get("COMANDO_REENVIO", "1"))     # s
 
 TOPIC_LECTURAS = "posta/consultorio/lecturas"
 TOPIC_VITALES  = "posta/consultorio/vitales"
 TOPIC_COMANDOS = "posta/consultorio/comandos"
 TOPIC_CONFIG   = "posta/consultorio/config"
+TOPIC_ACK      = "posta/consultorio/ack"
+
+# (filtro, qos) — se restauran en cada reconexión; QoS1 para que el broker encole en la caída
+SUSCRIPCIONES = (("posta/consultorio/#", 1),)
 
 UMBRAL_FC_ALTA = 100
 UMBRAL_FC_BAJA = 60
 UMBRAL_SPO2    = 95
 
-INTERVALO_TELEGRAM = 5
+# Minutos de anticipación para la alerta predictiva SUERO_PREDICTIVO
+ANTICIPACION_CRITICO = float(os.environ.get("ANTICIPACION_CRITICO", "10"))
 ESTADOS_INACTIVOS  = {"INICIANDO", "ESPERANDO"}
 
+log = obtener("mqtt")
+
+# Margen (g) sobre peso_alerta para considerar el suero recuperado
+HISTERESIS_RECUPERACION = float(os.environ.get("HISTERESIS_RECUPERACION", "5"))
+
+
+# ── Backoff exponencial con jitter completo ─────────────────
+def espera_reconexion(intento: int) -> float:
+    """Segundos antes del reintento `intento` (0, 1, 2…): réplicas caídas a la vez no reconectan en bloque."""
+    techo = min(MQTT_RECONEXION_MAX, MQTT_RECONEXION_MIN * 2 ** intento)
+    return random.uniform(0, techo)
+
+
+# ── Comando sin confirmación ─────────────────────────────────
+class ComandoSinAck(TimeoutError):
+    """El ESP32 no confirmó el comando tras todos los reintentos."""
+
+
 
 # ── FIX P3: Calcular estado_vitales en backend ──────────────
 def calcular_estado_vitales(fc: int, spo2: int) -> str:
@@ -59,375 +114,704 @@ def calcular_estado_vitales(fc: int, spo2: int) -> str:
     return " + ".join(problemas)  # ej: "TAQUICARDIA + HIPOXIA"
 
 
-class MQTTManager:
-    def __init__(self):
-        self._client          = None
-        self._cola_comandos   = asyncio.Queue()
-        self._ultimo_telegram = datetime.min
+class EstadoCama:
+    """Estado en memoria de una cama (un dispositivo): su paciente, filtros, estimador de goteo,
+    detector de tendencias, últimos valores y alertas ya enviadas."""
+
+    __slots__ = ("paciente", "filtros", "estimador", "estimacion", "detector", "nivel_alerta",
+                 "predictiva_enviada", "suero", "vitales", "vitales_validos", "crudo")
 
-        self._ultimo_suero: dict = {
+    def __init__(self):
+        self.suero: dict = {
             "peso":         999.0,
             "bomba":        False,
             "estado_suero": "ESPERANDO",
         }
-        self._ultimos_vitales: dict = {
+        self.vitales: dict = {
             "fc":             0,
             "spo2":           0,
             "estado_vitales": "MIDIENDO",
         }
-        self.ultimo_origen: str      = "automatico"
-        self._paciente_activo: dict | None = None
+        self.vitales_validos: dict = {}         # últimos fc / spo2 > 0 (mensaje de Telegram)
+        self.crudo: dict = {}                   # últimos valores sin filtrar
+        self.asignar(None)
+
+    def asignar(self, paciente: dict | None):
+        """Paciente nuevo en la cama: filtros, estimador, detector y alertas enviadas desde cero."""
+        self.paciente   = paciente
+        self.filtros    = FiltrosCama()
+        self.estimador  = EstimadorSuero()
+        self.estimacion: dict | None = None
+        self.detector   = DetectorVitales()
+        # None → sin alerta de suero; "BAJO" / "CRITICO" → ya se envió esa alerta
+        self.nivel_alerta: str | None = None
+        self.predictiva_enviada = False
+
+    @property
+    def paciente_id(self) -> int | None:
+        return self.paciente.get("id") if self.paciente else None
 
-        # ── FIX: reemplaza el bool por un nivel string ──────
-        # None → sin alerta activa
-        # "BAJO"    → ya se envió alerta SUERO_BAJO
-        # "CRITICO" → ya se envió alerta SUERO_CRITICO
-        self._nivel_alerta_enviado: str | None = None
 
-    # ── Helper: obtener paciente_id activo ───────────────────
-    def _get_paciente_id(self) -> int | None:
-        if self._paciente_activo:
-            return self._paciente_activo.get("id")
-        return None
+class MQTTManager:
+    def __init__(self):
+        self._client          = None
+        self._cola_comandos   = ColaComandos()
+        self._esperando_ack: dict[str, Comando] = {}
+        self._en_segundo_plano: set[asyncio.Task] = set()
+        self.ultimo_origen: str = "automatico"
+
+        # Estado por cama (clave: dispositivo, sala.cama_de); el paciente activo del dashboard es
+        # el de la cama por defecto (idempotencia.DISPOSITIVO_DEFECTO)
+        self._camas: dict[str, EstadoCama] = {}
+
+        self._dedup      = idempotencia.Deduplicador()
+        self._reorden    = reorden.registrar(reorden.Reordenador(self._procesar_lote))
+        self._ws_manager = None
+        self._handlers = {
+            TOPIC_LECTURAS: self._procesar_lecturas,
+            TOPIC_VITALES:  self._procesar_vitales,
+        }
 
-    # ── Guardar en tabla suero ────────────────────────────────
-    def _guardar_suero(self, peso: float, bomba: bool, estado_suero: str) -> Suero:
-        db = SessionLocal()
-        try:
-            origen = self.ultimo_origen if bomba else None
-
-            registro = Suero(
-                timestamp      = datetime.utcnow() - timedelta(hours=5),
-                paciente_id    = self._get_paciente_id(),
-                peso           = peso,
-                bomba          = bomba,
-                estado_suero   = estado_suero,
-                origen_comando = origen,
-            )
-            db.add(registro)
-            db.commit()
-            db.refresh(registro)
-            return registro
-        finally:
-            db.close()
+    # ── Estado en memoria por cama (clave: dispositivo) ─────
+    def _cama(self, cama: str = idempotencia.DISPOSITIVO_DEFECTO) -> EstadoCama:
+        estado = self._camas.get(cama)
+        if estado is None:
+            estado = self._camas[cama] = EstadoCama()
+        return estado
 
-    # ── Guardar en tabla vitales ──────────────────────────────
-    def _guardar_vitales(self, fc: int, spo2: int, estado_vitales: str) -> Vitales:
-        db = SessionLocal()
-        try:
-            registro = Vitales(
-                timestamp      = datetime.utcnow() - timedelta(hours=5),
-                paciente_id    = self._get_paciente_id(),
-                fc             = fc,
-                spo2           = spo2,
-                estado_vitales = estado_vitales,
-            )
-            db.add(registro)
-            db.commit()
-            db.refresh(registro)
-            return registro
-        finally:
-            db.close()
+    # ── Helper: paciente_id activo (el de la cama por defecto) ──
+    def _get_paciente_id(self) -> int | None:
+        return self._cama().paciente_id
+
+    # ── Guardar en tabla suero (vía spool: primero disco, luego BD en lote) ──
+    def _guardar_suero(self, cama: EstadoCama, peso: float, bomba: bool, estado_suero: str,
+                       origen: tuple = (None, None), timestamp: datetime | None = None) -> Suero:
+        fila = {
+            "timestamp":      timestamp or datetime.utcnow() - timedelta(hours=5),
+            "paciente_id":    cama.paciente_id,
+            "peso":           peso,
+            "bomba":          bomba,
+            "estado_suero":   estado_suero,
+            "origen_comando": self.ultimo_origen if bomba else None,
+            "dispositivo":    origen[0],
+            "seq":            origen[1],
+        }
+        spool.agregar("suero", fila)
+        return Suero(**fila)
+
+    # ── Guardar en tabla vitales (vía spool) ──────────────────
+    def _guardar_vitales(self, cama: EstadoCama, fc: int, spo2: int, estado_vitales: str,
+                         origen: tuple = (None, None), timestamp: datetime | None = None) -> Vitales:
+        fila = {
+            "timestamp":      timestamp or datetime.utcnow() - timedelta(hours=5),
+            "paciente_id":    cama.paciente_id,
+            "fc":             fc,
+            "spo2":           spo2,
+            "estado_vitales": estado_vitales,
+            "dispositivo":    origen[0],
+            "seq":            origen[1],
+        }
+        spool.agregar("vitales", fila)
+        return Vitales(**fila)
 
     # ── Alertas de suero ──────────────────────────────────────
-    def _alertas_suero(self, peso: float, bomba: bool, estado_suero: str) -> list:
+    def _alertas_suero(self, cama: EstadoCama, peso: float, bomba: bool, estado_suero: str) -> list:
         if estado_suero in ESTADOS_INACTIVOS:
             return []
 
-        cfg            = get_config(paciente_id=self._get_paciente_id())
+        cfg            = get_config(paciente_id=cama.paciente_id)
         umbral_alerta  = cfg["peso_alerta"]
         umbral_critico = cfg["peso_critico"]
 
-        # Suero recuperado → resetear todo
+        # Suero recuperado → resetear todo (con margen para no oscilar en el umbral)
         if peso > umbral_alerta:
-            if self._nivel_alerta_enviado:
-                print(f"✅ Suero recuperado ({peso:.1f}g) — alertas reseteadas")
-                self._nivel_alerta_enviado = None
+            if cama.nivel_alerta and peso > umbral_alerta + HISTERESIS_RECUPERACION:
+                log.info("✅ Suero recuperado (%.1fg) — alertas reseteadas", peso)
+                cama.nivel_alerta = None
             return []
 
         # ── Lógica de escalado ───────────────────────────────
         # Si ya enviamos CRITICO → no repetir
-        if self._nivel_alerta_enviado == "CRITICO":
+        if cama.nivel_alerta == "CRITICO":
             return []
 
         # Si ya enviamos BAJO pero ahora llegó a CRITICO → escalar, resetear bandera
-        if self._nivel_alerta_enviado == "BAJO" and peso <= umbral_critico:
-            print(f"🚨 Escalando BAJO → CRITICO ({peso:.1f}g) — permitiendo nueva alerta")
-            self._nivel_alerta_enviado = None
+        if cama.nivel_alerta == "BAJO" and peso <= umbral_critico:
+            log.info("🚨 Escalando BAJO → CRITICO (%.1fg) — permitiendo nueva alerta", peso)
+            cama.nivel_alerta = None
 
         # Si ya enviamos BAJO y sigue siendo BAJO (no crítico) → no repetir
-        if self._nivel_alerta_enviado == "BAJO":
+        if cama.nivel_alerta == "BAJO":
             return []
 
-        # ── Generar alertas ──────────────────────────────────
-        paciente_id = self._get_paciente_id()
-        db = SessionLocal()
-        try:
-            alertas = []
-            if peso <= umbral_critico:
-                alertas.append(Alerta(
-                    tipo        = "SUERO_CRITICO",
-                    mensaje     = f"Nivel crítico de suero: {peso:.1f} ml — bomba activada (umbral: {umbral_critico} ml)",
-                    valor       = peso,
-                    paciente_id = paciente_id,
-                ))
-            elif peso <= umbral_alerta:
-                alertas.append(Alerta(
-                    tipo        = "SUERO_BAJO",
-                    mensaje     = f"Nivel bajo de suero: {peso:.1f} ml (umbral alerta: {umbral_alerta} ml)",
-                    valor       = peso,
-                    paciente_id = paciente_id,
-                ))
-            if bomba:
-                alertas.append(Alerta(
-                    tipo        = "BOMBA_ON",
-                    mensaje     = "Bomba peristáltica activada — recargando suero",
-                    valor       = None,
-                    paciente_id = paciente_id,
-                ))
-            for a in alertas:
-                db.add(a)
-            if alertas:
-                db.commit()
-                # Guardar el nivel más grave de las alertas generadas
-                if any(a.tipo == "SUERO_CRITICO" for a in alertas):
-                    self._nivel_alerta_enviado = "CRITICO"
-                else:
-                    self._nivel_alerta_enviado = "BAJO"
-                print(f"🔔 Nivel alerta guardado: {self._nivel_alerta_enviado}")
-            return [a.to_dict() for a in alertas]
-        finally:
-            db.close()
+        # ── Generar alertas (la fila va a la BD después, fuera del loop: ciclo_alertas.guardar) ──
+        paciente_id = cama.paciente_id
+        alertas = []
+        if peso <= umbral_critico:
+            alertas.append(Alerta(
+                tipo        = "SUERO_CRITICO",
+                mensaje     = f"Nivel crítico de suero: {peso:.1f} ml — bomba activada (umbral: {umbral_critico} ml)",
+                valor       = peso,
+                paciente_id = paciente_id,
+            ))
+        elif peso <= umbral_alerta:
+            alertas.append(Alerta(
+                tipo        = "SUERO_BAJO",
+                mensaje     = f"Nivel bajo de suero: {peso:.1f} ml (umbral alerta: {umbral_alerta} ml)",
+                valor       = peso,
+                paciente_id = paciente_id,
+            ))
+        if bomba:
+            alertas.append(Alerta(
+                tipo        = "BOMBA_ON",
+                mensaje     = "Bomba peristáltica activada — recargando suero",
+                valor       = None,
+                paciente_id = paciente_id,
+            ))
+        if alertas:
+            # Guardar el nivel más grave de las alertas generadas
+            if any(a.tipo == "SUERO_CRITICO" for a in alertas):
+                cama.nivel_alerta = "CRITICO"
+            else:
+                cama.nivel_alerta = "BAJO"
+            log.info("🔔 Nivel alerta guardado: %s", cama.nivel_alerta)
+        return ciclo_alertas.emitir(alertas)
+
+    # ── Estimación de goteo / tiempo hasta vaciado ───────────
+    def _estimar_suero(self, cama: EstadoCama, peso: float, bomba: bool, cfg: dict, t: float) -> dict:
+        estimador = cama.estimador
+
+        recargas_previas = estimador.recargas
+        estimador.actualizar(peso, t, bomba)
+        if bomba or estimador.recargas != recargas_previas:
+            cama.predictiva_enviada = False
+
+        cama.estimacion = estimador.estimacion(cfg["peso_alerta"], cfg["peso_critico"])
+        return cama.estimacion
+
+    def ultimo_crudo(self) -> dict:
+        """Últimos valores sin filtrar (peso, fc, spo2) recibidos del ESP32 de la cama por defecto."""
+        return dict(self._cama().crudo)
+
+    def estimacion_suero(self, paciente_id: int | None = None) -> dict | None:
+        """Última estimación de goteo de la cama del paciente (la cama por defecto si se omite)."""
+        if paciente_id is None:
+            return self._cama().estimacion
+        for cama in self._camas.values():
+            if cama.paciente_id == paciente_id:
+                return cama.estimacion
+        return None
+
+    # ── Alerta predictiva: N minutos antes del nivel crítico ──
+    def _alerta_predictiva(self, cama: EstadoCama, peso: float, estado_suero: str, estimacion: dict,
+                           cfg: dict) -> list:
+        if estado_suero in ESTADOS_INACTIVOS or cama.predictiva_enviada:
+            return []
+        minutos = estimacion.get("min_hasta_critico")
+        if minutos is None or peso <= cfg["peso_critico"] or minutos > ANTICIPACION_CRITICO:
+            return []
+
+        alerta = Alerta(
+            tipo        = "SUERO_PREDICTIVO",
+            mensaje     = (f"Suero alcanzará nivel crítico en ~{minutos:.0f} min "
+                           f"(goteo {estimacion['goteo_ml_h']:.0f} ml/h, actual {peso:.1f} ml)"),
+            valor       = minutos,
+            paciente_id = cama.paciente_id,
+        )
+        cama.predictiva_enviada = True
+        log.info("🔮 Alerta predictiva — crítico en ~%.0f min", minutos)
+        return ciclo_alertas.emitir([alerta])
+
+    # ── Tendencias de vitales (EWMA rápida vs. lenta) ────────
+    def _alertas_tendencia(self, cama: EstadoCama, eventos: dict, fc: int, spo2: int) -> list:
+        detector, paciente_id = cama.detector, cama.paciente_id
+        alertas = []
+        if eventos["spo2"] == EVENTO_BAJA:
+            caida = -detector.spo2.delta
+            alertas.append(Alerta(
+                tipo        = "SPO2_TENDENCIA",
+                mensaje     = f"SpO2 descendiendo {caida:.1f}% en ~10 min (actual {spo2}%)",
+                valor       = spo2,
+                paciente_id = paciente_id,
+            ))
+        if eventos["fc"] in (EVENTO_BAJA, EVENTO_SUBE):
+            sentido = "subiendo" if eventos["fc"] == EVENTO_SUBE else "bajando"
+            alertas.append(Alerta(
+                tipo        = "FC_TENDENCIA",
+                mensaje     = f"FC {sentido} {abs(detector.fc.delta):.0f} lpm en ~10 min (actual {fc} lpm)",
+                valor       = fc,
+                paciente_id = paciente_id,
+            ))
+        return alertas
 
     # ── Alertas de vitales ────────────────────────────────────
-    def _alertas_vitales(self, fc: int, spo2: int) -> list:
-        if self._ultimo_suero.get("estado_suero") in ESTADOS_INACTIVOS:
+    def _alertas_vitales(self, cama: EstadoCama, fc: int, spo2: int, t: float) -> list:
+        eventos = cama.detector.actualizar(fc, spo2, t)
+
+        if cama.suero.get("estado_suero") in ESTADOS_INACTIVOS:
             return []
         if fc == 0 and spo2 == 0:
             return []
 
-        paciente_id = self._get_paciente_id()
-
-        db = SessionLocal()
-        try:
-            alertas = []
-            if fc and fc > UMBRAL_FC_ALTA:
-                alertas.append(Alerta(
-                    tipo        = "FC_ALTA",
-                    mensaje     = f"Taquicardia: {fc} bpm (normal: 60-100)",
-                    valor       = fc,
-                    paciente_id = paciente_id,
-                ))
-            elif fc and 0 < fc < UMBRAL_FC_BAJA:
-                alertas.append(Alerta(
-                    tipo        = "FC_BAJA",
-                    mensaje     = f"Bradicardia: {fc} bpm (normal: 60-100)",
-                    valor       = fc,
-                    paciente_id = paciente_id,
-                ))
-            if spo2 and 0 < spo2 < UMBRAL_SPO2:
-                alertas.append(Alerta(
-                    tipo        = "SPO2_BAJA",
-                    mensaje     = f"Saturación O2 baja: {spo2}% (normal: ≥95%)",
-                    valor       = spo2,
-                    paciente_id = paciente_id,
-                ))
-            for a in alertas:
-                db.add(a)
-            if alertas:
-                db.commit()
-            return [a.to_dict() for a in alertas]
-        finally:
-            db.close()
+        # Muestra atípica: sólo queda fuera de la tendencia (no contamina las EWMA). Los umbrales
+        # fijos se evalúan igual — una caída brusca real (SpO2 97 → 82) también es "atípica"
+        if eventos["fc"] == EVENTO_ATIPICO:
+            log.warning("⚠️ FC atípica excluida de la tendencia: %s", fc)
+        if eventos["spo2"] == EVENTO_ATIPICO:
+            log.warning("⚠️ SpO2 atípica excluida de la tendencia: %s", spo2)
+
+        paciente_id = cama.paciente_id
+
+        alertas = self._alertas_tendencia(cama, eventos, fc, spo2)
+        if fc and fc > UMBRAL_FC_ALTA:
+            alertas.append(Alerta(
+                tipo        = "FC_ALTA",
+                mensaje     = f"Taquicardia: {fc} bpm (normal: 60-100)",
+                valor       = fc,
+                paciente_id = paciente_id,
+            ))
+        elif fc and 0 < fc < UMBRAL_FC_BAJA:
+            alertas.append(Alerta(
+                tipo        = "FC_BAJA",
+                mensaje     = f"Bradicardia: {fc} bpm (normal: 60-100)",
+                valor       = fc,
+                paciente_id = paciente_id,
+            ))
+        if spo2 and 0 < spo2 < UMBRAL_SPO2:
+            alertas.append(Alerta(
+                tipo        = "SPO2_BAJA",
+                mensaje     = f"Saturación O2 baja: {spo2}% (normal: ≥95%)",
+                valor       = spo2,
+                paciente_id = paciente_id,
+            ))
+        return ciclo_alertas.emitir(alertas)
 
     # ── Setear paciente activo ────────────────────────────────
-    def set_paciente_activo(self, paciente: dict | None):
-        self._paciente_activo = paciente
-        self._nivel_alerta_enviado = None  # FIX: era _alerta_suero_activa = False
-        print(f"👤 Paciente activo: {paciente.get('nombre') if paciente else 'None'} (id={self._get_paciente_id()})")
+    def set_paciente_activo(self, paciente: dict | None, cama: str = idempotencia.DISPOSITIVO_DEFECTO):
+        """Asigna el paciente a la cama (por defecto la del dashboard); None la deja libre."""
+        self._cama(cama).asignar(paciente)
+        log.info("👤 Paciente activo en %s: %s (id=%s)", cama, paciente.get("nombre") if paciente else None,
+                 paciente.get("id") if paciente else None)
 
     # ── Publicar configuración al ESP32 ──────────────────────
-    async def publicar_config(self, peso_alerta: float, peso_critico: float):
-        payload = json.dumps({
+    async def publicar_config(self, peso_alerta: float, peso_critico: float, version: int | None = None):
+        # "version" permite al ESP32 ignorar una config más vieja que la que ya aplicó
+        payload = {
             "peso_alerta":  peso_alerta,
             "peso_critico": peso_critico,
-        })
-        await self._cola_comandos.put(f"__config__{payload}")
-        print(f"📤 Config enviada → alerta:{peso_alerta}g crítico:{peso_critico}g")
+            "version":      version,
+        }
+        self._cola_comandos.agregar(Comando(TOPIC_CONFIG, payload, "config"))
+        log.info("📤 Config enviada → alerta:%sg crítico:%sg (v%s)", peso_alerta, peso_critico, version)
 
     # ── Telegram anti-spam ────────────────────────────────────
-    async def _enviar_telegram_si_aplica(self, payload_completo: dict, alertas: list):
+    async def _enviar_telegram_si_aplica(self, cama: EstadoCama, payload_completo: dict, alertas: list,
+                                         forzar: bool = False):
+        """Límite compartido con los escalados (telegram_bot.INTERVALO_TELEGRAM); forzar = la bomba auto."""
         if not alertas:
             return
-        ahora = datetime.utcnow()
-        if (ahora - self._ultimo_telegram).total_seconds() < INTERVALO_TELEGRAM:
-            restante = int(INTERVALO_TELEGRAM - (ahora - self._ultimo_telegram).total_seconds())
-            print(f"📱 Telegram anti-spam ({restante}s restantes)")
+        restante = turno_restante()
+        if restante and not forzar:
+            log.debug("📱 Telegram anti-spam (%.0fs restantes)", restante)
             return
 
+        # Sin medición en esta lectura → los últimos vitales válidos en memoria (sin consultar la BD)
         payload_enriquecido = dict(payload_completo)
-        if payload_enriquecido.get("fc", 0) == 0 or payload_enriquecido.get("spo2", 0) == 0:
-            db = SessionLocal()
-            try:
-                from models import Vitales
-                ultimo = db.query(Vitales).filter(
-                    Vitales.fc > 0,
-                    Vitales.spo2 > 0,
-                ).order_by(Vitales.id.desc()).first()
-                if ultimo:
-                    if payload_enriquecido.get("fc", 0) == 0:
-                        payload_enriquecido["fc"] = ultimo.fc
-                    if payload_enriquecido.get("spo2", 0) == 0:
-                        payload_enriquecido["spo2"] = ultimo.spo2
-                    print(f"📱 Vitales enriquecidos desde BD → FC:{ultimo.fc} SpO2:{ultimo.spo2}")
-            finally:
-                db.close()
+        for clave in ("fc", "spo2"):
+            if payload_enriquecido.get(clave, 0) == 0 and cama.vitales_validos.get(clave):
+                payload_enriquecido[clave] = cama.vitales_validos[clave]
 
-        mensaje, tipos = construir_mensaje(payload_enriquecido, alertas, self._paciente_activo)
+        mensaje, tipos = construir_mensaje(payload_enriquecido, alertas, cama.paciente)
         if mensaje:
+            ocupar_turno()
             await enviar_alerta(mensaje, tipos)
-            self._ultimo_telegram = ahora
-            print("📱 Notificación Telegram enviada")
+            log.info("📱 Notificación Telegram enviada")
 
     # ── Handler: lecturas → tabla suero ──────────────────────
-    async def _procesar_lecturas(self, payload: dict, ws_manager):
-        peso         = payload.get("peso",   999.0)
+    async def _procesar_lecturas(self, msg: Mensaje, ws_manager):
+        payload      = msg.payload
+        peso_crudo   = payload.get("peso",   999.0)
         bomba        = payload.get("bomba",  False)
         estado_suero = payload.get("estado", "ESPERANDO")
 
-        bomba_anterior = self._ultimo_suero.get("bomba", False)
+        if not en_rango(peso_crudo, RANGO_PESO):
+            log.warning("⚠️ Peso fuera de rango descartado: %s", peso_crudo)
+            return
+        id_cama = sala.cama_de(payload)
+        cama    = self._cama(id_cama)
+        if msg.tardio:
+            # Llegó detrás de la marca de agua: sólo se guarda, con su hora de evento (no altera filtros ni alertas)
+            with trazas.span("persistir"):
+                self._guardar_suero(cama, peso_crudo, bomba, estado_suero, msg.origen, msg.evento)
+            return
+        with trazas.span("filtro"):
+            peso = round(cama.filtros.peso(peso_crudo, msg.t), 1)
+        cama.crudo["peso"] = peso_crudo
+
+        bomba_anterior = cama.suero.get("bomba", False)
         if bomba_anterior and not bomba:
             self.ultimo_origen = "automatico"
-            print("🔄 Bomba apagada — origen reseteado a 'automatico'")
+            log.info("🔄 Bomba apagada — origen reseteado a 'automatico'")
 
-        self._ultimo_suero = {
+        cama.suero = {
             "peso":         peso,
             "bomba":        bomba,
             "estado_suero": estado_suero,
         }
 
-        registro         = self._guardar_suero(peso, bomba, estado_suero)
-        payload_completo = {**self._ultimo_suero, **self._ultimos_vitales}
-
-        await ws_manager.broadcast({
-            "type":   "lectura",
-            "data":   registro.to_dict(),
-            "estado": payload_completo,
-        })
-
-        alertas = self._alertas_suero(peso, bomba, estado_suero)
+        with trazas.span("persistir"):
+            registro = self._guardar_suero(cama, peso, bomba, estado_suero, msg.origen, msg.evento)
+        payload_completo = {**cama.suero, **cama.vitales}
+
+        cfg        = get_config(paciente_id=cama.paciente_id)
+        estimacion = self._estimar_suero(cama, peso, bomba, cfg, msg.t)
+        sala.tablero.suero(id_cama, cama.paciente_id, peso, bomba, estado_suero,
+                           estimacion.get("min_hasta_critico"))
+
+        with trazas.span(trazas.SPAN_BROADCAST):
+            await ws_manager.broadcast({
+                "type":       "lectura",
+                "data":       registro.to_dict(),
+                "estado":     payload_completo,
+                "estimacion": estimacion,
+                "crudo":      {"peso": peso_crudo},
+                "ts":         payload.get("ts"),
+            })
+
+        with trazas.span("alertas"), ALERTAS_EVALUACION.de("suero").medir():
+            alertas = self._alertas_suero(cama, peso, bomba, estado_suero)
+            alertas += self._alerta_predictiva(cama, peso, estado_suero, estimacion, cfg)
         if alertas:
             await ws_manager.broadcast({"type": "alertas", "data": alertas})
-            await self._enviar_telegram_si_aplica(payload_completo, alertas)
+            with trazas.span("telegram"):
+                await self._enviar_telegram_si_aplica(cama, payload_completo, alertas)
 
         # Activar bomba automáticamente si peso <= crítico y bomba aún no activa
         if estado_suero not in ESTADOS_INACTIVOS and not bomba:
-            cfg = get_config(paciente_id=self._get_paciente_id())
             if peso <= cfg["peso_critico"]:
-                await self.publicar_comando("bomba_on")
-                print(f"🚨 Bomba AUTO — {peso:.1f}ml <= crítico {cfg['peso_critico']}ml")
+                await self.publicar_comando("bomba_on", dispositivo=id_cama)
+                log.warning("🚨 Bomba AUTO — %.1fml <= crítico %sml", peso, cfg["peso_critico"])
 
                 alerta_bomba = [{
                     "tipo":    "SUERO_CRITICO",
                     "mensaje": f"Nivel crítico: {peso:.1f}ml — bomba activada automáticamente",
                     "valor":   peso,
                 }]
-                self._ultimo_telegram = datetime.min
-                await self._enviar_telegram_si_aplica(payload_completo, alerta_bomba)
+                await self._enviar_telegram_si_aplica(cama, payload_completo, alerta_bomba, forzar=True)
 
     # ── Handler: vitales → tabla vitales ─────────────────────
-    async def _procesar_vitales(self, payload: dict, ws_manager):
-        fc   = payload.get("fc",   0)
-        spo2 = payload.get("spo2", 0)
+    async def _procesar_vitales(self, msg: Mensaje, ws_manager):
+        payload    = msg.payload
+        fc_crudo   = payload.get("fc",   0)
+        spo2_crudo = payload.get("spo2", 0)
+
+        if not (en_rango(fc_crudo, RANGO_FC) and en_rango(spo2_crudo, RANGO_SPO2)):
+            log.warning("⚠️ Vitales fuera de rango descartados: FC:%s SpO2:%s", fc_crudo, spo2_crudo)
+            return
+        id_cama = sala.cama_de(payload)
+        cama    = self._cama(id_cama)
+        if msg.tardio:
+            with trazas.span("persistir"):
+                self._guardar_vitales(cama, fc_crudo, spo2_crudo, calcular_estado_vitales(fc_crudo, spo2_crudo),
+                                      msg.origen, msg.evento)
+            return
+        with trazas.span("filtro"):
+            fc, spo2 = cama.filtros.vitales(fc_crudo, spo2_crudo)
+        cama.crudo.update(fc=fc_crudo, spo2=spo2_crudo)
 
         estado_vitales = calcular_estado_vitales(fc, spo2)
+        sala.tablero.vitales(id_cama, cama.paciente_id, fc, spo2, estado_vitales)
 
-        print(f"💓 Vitales → FC:{fc} SpO2:{spo2} → {estado_vitales}")
+        if muestrear(log, "vitales"):
+            log.debug("💓 Vitales → FC:%s SpO2:%s (crudo %s/%s) → %s", fc, spo2, fc_crudo, spo2_crudo,
+                      estado_vitales, extra={"tipo": "vitales"})
 
-        self._ultimos_vitales = {
+        cama.vitales = {
             "fc":             fc,
             "spo2":           spo2,
             "estado_vitales": estado_vitales,
         }
-
-        registro         = self._guardar_vitales(fc, spo2, estado_vitales)
-        payload_completo = {**self._ultimo_suero, **self._ultimos_vitales}
-
-        await ws_manager.broadcast({
-            "type":   "vitales",
-            "data":   registro.to_dict(),
-            "estado": payload_completo,
-        })
-
-        alertas = self._alertas_vitales(fc, spo2)
+        if fc > 0 and spo2 > 0:
+            cama.vitales_validos = {"fc": fc, "spo2": spo2}
+
+        with trazas.span("persistir"):
+            registro = self._guardar_vitales(cama, fc, spo2, estado_vitales, msg.origen, msg.evento)
+        payload_completo = {**cama.suero, **cama.vitales}
+
+        with trazas.span(trazas.SPAN_BROADCAST):
+            await ws_manager.broadcast({
+                "type":   "vitales",
+                "data":   registro.to_dict(),
+                "estado": payload_completo,
+                "crudo":  {"fc": fc_crudo, "spo2": spo2_crudo},
+                "ts":     payload.get("ts"),
+            })
+
+        with trazas.span("alertas"), ALERTAS_EVALUACION.de("vitales").medir():
+            alertas = self._alertas_vitales(cama, fc, spo2, msg.t)
         if alertas:
             await ws_manager.broadcast({"type": "alertas", "data": alertas})
-            await self._enviar_telegram_si_aplica(payload_completo, alertas)
+            with trazas.span("telegram"):
+                await self._enviar_telegram_si_aplica(cama, payload_completo, alertas)
 
     # ── Publicar comando al ESP32 ─────────────────────────────
-    async def publicar_comando(self, cmd: str):
-        await self._cola_comandos.put(cmd)
+    async def publicar_comando(self, cmd: str, dispositivo: str | None = None):
+        """Sin esperar: el ack y los reintentos corren en segundo plano (no frena la ingesta)."""
+        tarea = asyncio.create_task(self._comando_en_segundo_plano(cmd, dispositivo))
+        self._en_segundo_plano.add(tarea)
+        tarea.add_done_callback(self._en_segundo_plano.discard)
+
+    async def _comando_en_segundo_plano(self, cmd: str, dispositivo: str | None):
+        try:
+            await self.ejecutar_comando(cmd, dispositivo=dispositivo)
+        except ComandoSinAck:
+            log.error("❌ El ESP32 no confirmó '%s'", cmd)
+
+    async def ejecutar_comando(self, cmd: str, timeout: float = COMANDO_TIMEOUT,
+                               reintentos: int = COMANDO_REINTENTOS, dispositivo: str | None = None,
+                               plazo: float | None = None) -> dict:
+        """Publica `cmd` y espera el ack del ESP32; devuelve {"id", "ok", "rtt_ms", ...} o lanza ComandoSinAck.
+        Si otro comando del mismo grupo lo reemplaza antes de publicarse devuelve ok=False + "reemplazado_por".
+        Los comandos no idempotentes no se reenvían; `plazo` (s) acota la espera total de todos los intentos."""
+        loop    = asyncio.get_running_loop()
+        limite  = loop.time() + plazo if plazo is not None else None
+        if cmd not in IDEMPOTENTES:
+            reintentos = 0
+        comando = Comando(TOPIC_COMANDOS, {"cmd": cmd}, cmd, loop.create_future(), dispositivo)
+        self._esperando_ack[comando.id] = comando
+        try:
+            intentos = 0
+            for intento in range(reintentos + 1):
+                # el primer envío sale siempre (aunque el plazo ya esté agotado); el plazo sólo acota la espera
+                espera = timeout if limite is None else min(timeout, limite - loop.time())
+                if intento:
+                    if espera <= 0:
+                        break
+                    MQTT_COMANDO_REINTENTOS.de(cmd).inc()
+                    log.warning("🔁 Sin ack de '%s' (id=%s) — reintento %s", cmd, comando.id, intento)
+                self._cola_comandos.agregar(comando)
+                intentos += 1
+                try:
+                    return await asyncio.wait_for(asyncio.shield(comando.futuro), max(espera, 0))
+                except asyncio.TimeoutError:
+                    continue
+            MQTT_COMANDO_SIN_ACK.de(cmd).inc()
+            raise ComandoSinAck(f"sin ack de '{cmd}' tras {intentos} intento(s)")
+        finally:
+            self._esperando_ack.pop(comando.id, None)
+
+    def _recibir_ack(self, payload: dict):
+        comando = self._esperando_ack.get(str(payload.get("id")))
+        if comando is None or comando.futuro.done():
+            return                    # ack repetido (reintento) o de un comando ya vencido
+        rtt = time.perf_counter() - comando.enviado
+        MQTT_COMANDO_RTT.de(comando.cmd).observe(rtt)
+        comando.futuro.set_result({**payload, "id": comando.id, "ok": payload.get("ok", True),
+                                   "rtt_ms": round(rtt * 1000, 1)})
 
     # ── Loop principal MQTT ───────────────────────────────────
     async def start(self, ws_manager):
+        self._ws_manager = ws_manager
+        tick = asyncio.create_task(self._reorden.correr())
+        try:
+            await self._conectar(ws_manager)
+        finally:
+            tick.cancel()
+
+    async def _conectar(self, ws_manager):
+        intento, caida = 0, None
         while True:
             try:
-                print(f"Conectando MQTT → {MQTT_HOST}:{MQTT_PORT}")
-                tls = ssl.create_default_context()
+                log.info("Conectando MQTT → %s:%s", MQTT_HOST, MQTT_PORT)
+                tls = ssl.create_default_context() if MQTT_TLS else None
 
                 async with aiomqtt.Client(
-                    hostname    = MQTT_HOST,
-                    port        = MQTT_PORT,
-                    username    = MQTT_USER,
-                    password    = MQTT_PASS,
-                    identifier  = MQTT_CLIENT,
-                    tls_context = tls,
-                    keepalive   = 30,
+                    hostname      = MQTT_HOST,
+                    port          = MQTT_PORT,
+                    username      = MQTT_USER,
+                    password      = MQTT_PASS,
+                    identifier    = MQTT_CLIENT,
+                    tls_context   = tls,
+                    keepalive     = 30,
+                    clean_session = not MQTT_SESION_PERSISTENTE,
                 ) as client:
                     self._client = client
-                    print("✅ MQTT conectado")
-                    await client.subscribe("posta/consultorio/#")
-                    print("📡 Suscrito: posta/consultorio/#")
+                    for filtro, qos in SUSCRIPCIONES:
+                        await client.subscribe(filtro, qos=qos)
+                    log.info("✅ MQTT conectado — suscrito: %s", ", ".join(f for f, _ in SUSCRIPCIONES))
+                    if caida is not None:
+                        MQTT_RECUPERACION.observe(time.monotonic() - caida)
+                    intento, caida = 0, None
 
-                    await asyncio.gather(
-                        self._recibir(client, ws_manager),
-                        self._enviar_comandos(client),
-                        return_exceptions=True,
-                    )
+                    await self._atender(client, ws_manager)
 
             except Exception as e:
-                print(f"❌ MQTT error: {e}")
-
-            print("🔄 Reconectando MQTT en 5s...")
-            await asyncio.sleep(5)
+                log.error("❌ MQTT error: %s", e)
+
+            self._client = None
+            if caida is None:
+                caida = time.monotonic()
+            MQTT_RECONEXIONES.inc()
+            espera  = espera_reconexion(intento)
+            intento += 1
+            log.info("🔄 Reconectando MQTT en %.1fs (intento %s)...", espera, intento)
+            await asyncio.sleep(espera)
+
+    # ── Recepción + envío sobre una conexión; la primera que cae corta la otra ──
+    async def _atender(self, client, ws_manager):
+        tareas = [
+            asyncio.create_task(self._recibir(client, ws_manager)),
+            asyncio.create_task(self._enviar_comandos(client)),
+        ]
+        try:
+            hechas, _ = await asyncio.wait(tareas, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+        for tarea in hechas:
+            if tarea.exception():
+                raise tarea.exception()
 
     # ── Recibir y rutear por topic ────────────────────────────
     async def _recibir(self, client, ws_manager):
         async for msg in client.messages:
             topic       = str(msg.topic)
-            payload_raw = msg.payload.decode("utf-8", errors="ignore")
+            MQTT_MENSAJES.de(topic).inc()
+
+            handler = self._handlers.get(topic)
+            traza   = trazas.iniciar(f"mqtt.{topic.rsplit('/', 1)[-1]}", topic=topic) if handler else None
 
+            inicio      = time.perf_counter()
+            payload_raw = msg.payload.decode("utf-8", errors="ignore")
             try:
-                payload = json.loads(payload_raw)
+                with trazas.span("decode"):
+                    payload = json.loads(payload_raw)
             except json.JSONDecodeError:
-                print(f"⚠️ JSON inválido en {topic}: {payload_raw}")
+                log.warning("⚠️ JSON inválido en %s: %s", topic, payload_raw)
+                if traza:
+                    traza.atributos["error"] = "json_invalido"
+                    trazas.finalizar()
                 continue
+            finally:
+                MQTT_DECODE.observe(time.perf_counter() - inicio)
+
+            if muestrear(log, "mqtt_mensaje"):
+                log.debug("📨 %s → %s", topic, payload, extra={"tipo": "mqtt_mensaje"})
 
-            print(f"📨 {topic} → {payload}")
+            if topic == TOPIC_ACK:
+                if isinstance(payload, dict):
+                    self._recibir_ack(payload)
+                continue
+
+            if not handler:
+                continue
+            if not isinstance(payload, dict):
+                log.warning("⚠️ Payload no es un objeto en %s: %s", topic, payload_raw)
+                if traza:
+                    traza.atributos["error"] = "payload_invalido"
+                    trazas.finalizar()
+                continue
+            if traza:
+                traza.fijar_ts_dispositivo(payload.get("ts"))
+
+            # Redelivery QoS1 / duplicado: se descarta acá, antes de cualquier trabajo en BD
+            origen = idempotencia.clave(payload)
+            if self._dedup.clasificar(topic, *origen) == idempotencia.DUPLICADO:
+                MQTT_DUPLICADOS.de(topic).inc()
+                if traza:
+                    traza.atributos["duplicado"] = True
+                    trazas.finalizar()
+                continue
 
-            # ← NUEVO: procesar en background para no bloquear el loop MQTT
-            if topic == TOPIC_LECTURAS:
-                asyncio.create_task(self._procesar_lecturas(payload, ws_manager))
-            elif topic == TOPIC_VITALES:
-                asyncio.create_task(self._procesar_vitales(payload, ws_manager))
+            # Al buffer de reorden: el worker del dispositivo lo procesa en orden de evento
+            # (la traza viaja en el mensaje y se retoma allá)
+            mensaje = Mensaje(topic, payload, origen[0], origen[1], traza)
+            if self._reorden.agregar(mensaje) == reorden.DESCARTADO:
+                log.warning("⚠️ Hora de evento inválida en %s (ts=%s) — descartado", topic, payload.get("ts"))
+                if traza:
+                    traza.atributos["descartado"] = True
+                    trazas.finalizar()
+                continue
+            trazas.soltar()
+
+    # ── Lote liberado por el buffer de reorden (en orden de evento) ──
+    async def _procesar_lote(self, lote: list[Mensaje]):
+        for msg in lote:
+            handler = self._handlers[msg.topic]
+            trazas.reanudar(msg.traza)
+            if msg.traza and msg.tardio:
+                msg.traza.atributos["tardio"] = True
+            llamada = perfilado.iniciar_llamada(handler.__name__)
+            try:
+                await handler(msg, self._ws_manager)
+            except Exception:
+                log.exception("❌ Error procesando %s", msg.topic)
+            finally:
+                trazas.finalizar()
+                if llamada:
+                    perfilado.terminar_llamada(llamada, msg.traza.a_dict() if msg.traza else None)
 
-    # ── Enviar comandos encolados ─────────────────────────────
+    # ── Enviar comandos encolados: un emisor por dispositivo ──
     async def _enviar_comandos(self, client):
-        while True:
-            cmd = await self._cola_comandos.get()
-            if cmd.startswith("__config__"):
-                payload = cmd.replace("__config__", "")
-                await client.publish(TOPIC_CONFIG, payload, qos=1)
+        emisores: dict[str, asyncio.Task] = {}
+        try:
+            while True:
+                self._cola_comandos.nueva.clear()
+                for cola in self._cola_comandos.colas():
+                    if cola.dispositivo not in emisores:
+                        emisores[cola.dispositivo] = asyncio.create_task(self._emitir(client, cola))
+                await self._cola_comandos.nueva.wait()
+        finally:
+            for emisor in emisores.values():
+                emisor.cancel()
+            await asyncio.gather(*emisores.values(), return_exceptions=True)
+
+    async def _emitir(self, client, cola):
+        """Pipeline: hasta COMANDOS_EN_VUELO publish sin esperar cada PUBACK. paho escribe en el
+        socket en el orden de las llamadas, así que el dispositivo los recibe en el orden de la cola."""
+        ventana  = asyncio.Semaphore(COMANDOS_EN_VUELO)
+        en_vuelo: dict[asyncio.Task, Comando] = {}
+
+        def reencolar(comando: Comando):
+            if comando.futuro is None or not comando.futuro.done():     # nadie espera ya su ack
+                self._cola_comandos.devolver(comando)
+
+        def terminado(tarea: asyncio.Task):
+            ventana.release()
+            if tarea.cancelled():
+                return                      # reconexión: el finally de abajo lo devuelve a la cola
+            comando = en_vuelo.pop(tarea, None)
+            error   = tarea.exception()
+            if error is None or comando is None:
+                return
+            if comando.futuro is None or comando.cmd in IDEMPOTENTES:
+                # fija un estado: repetirlo es seguro — vuelve a la cola tras una pausa (sin girar en falso)
+                log.warning("⚠️ Publish de '%s' falló (%s) — se reintenta en %g s", comando.cmd, error, COMANDO_REENVIO)
+                asyncio.get_running_loop().call_later(COMANDO_REENVIO, reencolar, comando)
             else:
-                await client.publish(TOPIC_COMANDOS, json.dumps({"cmd": cmd}), qos=1)
-            print(f"📤 Enviado: {cmd}")
\ No newline at end of file
+                # reset / tare: puede haber llegado sin PUBACK, no se repite
+                log.warning("⚠️ Publish de '%s' falló (%s) — no se reenvía", comando.cmd, error)
+                MQTT_COMANDO_SIN_ACK.de(comando.cmd).inc()
+                if not comando.futuro.done():
+                    comando.futuro.set_exception(ComandoSinAck(f"publish de '{comando.cmd}' falló: {error}"))
+
+        try:
+            while True:
+                await ventana.acquire()
+                comando = await cola.siguiente()
+                tarea = asyncio.create_task(self._publicar(client, comando))
+                en_vuelo[tarea] = comando
+                tarea.add_done_callback(terminado)
+        finally:
+            for tarea in en_vuelo:
+                tarea.cancel()
+            await asyncio.gather(*en_vuelo, return_exceptions=True)
+            # Sin PUBACK (conexión caída / reconexión): vuelven a la cola con su secuencia original
+            for comando in en_vuelo.values():
+                self._cola_comandos.devolver(comando)
+
+    async def _publicar(self, client, comando: Comando):
+        comando.enviado = time.perf_counter()
+        await client.publish(comando.topic, comando.payload, qos=1)
+        log.info("📤 Enviado: %s (id=%s)", comando.cmd, comando.id)
@@ -0,0 +1,201 @@
+"""
+perfilado.py
+- Perfilado bajo demanda, seguro para producción: sin costo mientras no se active
+- Muestreador por hilo aparte (sys._current_frames) → pilas "folded" para flame graphs
+  (flamegraph.pl, speedscope, inferno)
+- Tres modos:
+    · loop:      captura del event loop durante N segundos
+    · petición:  header X-Perfil: 1 → pilas de todos los hilos mientras dura la petición
+    · ingesta:   top-N llamadas más lentas de los handlers MQTT, con sus pilas y etapas
+- Protegido por PERFIL_TOKEN (header X-Perfil-Token); sin token configurado queda deshabilitado
+"""
+
+import heapq
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+PERFIL_TOKEN         = os.environ.get("PERFIL_TOKEN", "")
+INTERVALO_DEFECTO    = 0.005      # s entre muestras
+DURACION_MAXIMA      = 120        # s por captura
+PERFILES_GUARDADOS   = 32         # capturas por petición retenidas
+
+# Hojas de pila que sólo indican un hilo ocioso (pool sin trabajo, colas vacías)
+_HOJAS_OCIOSAS = {"wait", "_wait_for_tstate_lock", "get", "dequeue", "_worker", "select"}
+
+
+def autorizado(token: str | None) -> bool:
+    return bool(PERFIL_TOKEN) and token == PERFIL_TOKEN
+
+
+def _pila_folded(frame) -> tuple[str, list]:
+    """Pila raíz→hoja en formato folded + lista de frames (para atribuir la muestra)."""
+    partes, frames = [], []
+    while frame is not None:
+        code = frame.f_code
+        partes.append(f"{os.path.basename(code.co_filename)}:{code.co_qualname}")
+        frames.append(frame)
+        frame = frame.f_back
+    partes.reverse()
+    return ";".join(partes), frames
+
+
+class Muestreador:
+    """Hilo que muestrea las pilas de `hilos` (None = todos) cada `intervalo` segundos."""
+
+    def __init__(self, hilos: set[int] | None = None, intervalo: float = INTERVALO_DEFECTO,
+                 omitir_ociosos: bool = False):
+        self.hilos          = hilos
+        self.intervalo      = intervalo
+        self.omitir_ociosos = omitir_ociosos
+        self.pilas          = Counter()
+        self.muestras       = 0
+        self._parar         = threading.Event()
+        self._hilo          = threading.Thread(target=self._bucle, name="perfilado", daemon=True)
+
+    def iniciar(self) -> "Muestreador":
+        self._hilo.start()
+        return self
+
+    def detener(self) -> "Muestreador":
+        """Detiene y espera al hilo (bloquea: desde el event loop, vía asyncio.to_thread)."""
+        self._parar.set()
+        self._hilo.join()
+        return self
+
+    def pedir_parada(self):
+        """Sin esperar: el hilo (daemon) termina en su próximo intervalo. Seguro desde el event loop."""
+        self._parar.set()
+
+    def _bucle(self):
+        propio = threading.get_ident()
+        while not self._parar.wait(self.intervalo):
+            self.muestras += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == propio or (self.hilos is not None and ident not in self.hilos):
+                    continue
+                if self.omitir_ociosos and frame.f_code.co_name in _HOJAS_OCIOSAS:
+                    continue
+                pila, frames = _pila_folded(frame)
+                self.pilas[pila] += 1
+                if _llamadas_en_curso:
+                    _atribuir_a_llamadas(pila, frames)
+
+    def folded(self) -> str:
+        return "\n".join(f"{pila} {n}" for pila, n in self.pilas.most_common()) + "\n"
+
+
+# ══════════════════════════════════════════════════════════════
+#  MODO PETICIÓN — resultados guardados por id
+# ══════════════════════════════════════════════════════════════
+_perfiles_peticion: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def guardar_perfil_peticion(ruta: str, duracion: float, muestreador: Muestreador) -> str:
+    perfil_id = uuid.uuid4().hex[:12]
+    _perfiles_peticion[perfil_id] = {
+        "ruta":        ruta,
+        "duracion_ms": round(duracion * 1000, 2),
+        "muestras":    muestreador.muestras,
+        "folded":      muestreador.folded(),
+    }
+    while len(_perfiles_peticion) > PERFILES_GUARDADOS:
+        _perfiles_peticion.popitem(last=False)
+    return perfil_id
+
+
+def perfil_peticion(perfil_id: str) -> dict | None:
+    return _perfiles_peticion.get(perfil_id)
+
+
+# ══════════════════════════════════════════════════════════════
+#  MODO INGESTA — top-N llamadas más lentas
+# ══════════════════════════════════════════════════════════════
+class _Llamada:
+    __slots__ = ("nombre", "frame_id", "inicio", "pilas")
+
+    def __init__(self, nombre: str, frame_id: int):
+        self.nombre   = nombre
+        self.frame_id = frame_id
+        self.inicio   = time.perf_counter()
+        self.pilas    = Counter()
+
+
+_ingesta_hasta: float        = 0.0     # monotonic; 0 = desactivado
+_ingesta_top: int            = 10
+_ingesta_lentas: list        = []      # heap (duracion, seq, dict)
+_ingesta_seq: int            = 0
+_ingesta_muestreador: Muestreador | None = None
+_llamadas_en_curso: dict[int, _Llamada] = {}
+
+
+def _atribuir_a_llamadas(pila: str, frames: list):
+    for frame in frames:
+        llamada = _llamadas_en_curso.get(id(frame))
+        if llamada is not None:
+            llamada.pilas[pila] += 1
+            return
+
+
+def activar_ingesta(segundos: float, top: int, hilo_loop: int, intervalo: float = INTERVALO_DEFECTO):
+    """Registra las `top` llamadas más lentas durante `segundos` (reinicia el ranking)."""
+    global _ingesta_hasta, _ingesta_top, _ingesta_muestreador
+    detener_ingesta()
+    _ingesta_lentas.clear()
+    _ingesta_top         = top
+    _ingesta_hasta       = time.monotonic() + min(segundos, DURACION_MAXIMA)
+    _ingesta_muestreador = Muestreador({hilo_loop}, intervalo).iniciar()
+
+
+def detener_ingesta():
+    global _ingesta_hasta, _ingesta_muestreador
+    _ingesta_hasta = 0.0
+    _llamadas_en_curso.clear()
+    if _ingesta_muestreador is not None:
+        _ingesta_muestreador.pedir_parada()
+        _ingesta_muestreador = None
+
+
+def iniciar_llamada(nombre: str) -> _Llamada | None:
+    """Llamar al inicio del wrapper del handler; None (sin costo extra) si el modo está apagado."""
+    if not _ingesta_hasta:
+        return None
+    if time.monotonic() > _ingesta_hasta:
+        detener_ingesta()
+        return None
+    frame   = sys._getframe(1)
+    llamada = _Llamada(nombre, id(frame))
+    _llamadas_en_curso[llamada.frame_id] = llamada
+    return llamada
+
+
+def terminar_llamada(llamada: _Llamada, etapas: dict | None = None):
+    global _ingesta_seq
+    _llamadas_en_curso.pop(llamada.frame_id, None)
+    duracion = time.perf_counter() - llamada.inicio
+    if len(_ingesta_lentas) >= _ingesta_top and duracion <= _ingesta_lentas[0][0]:
+        return
+    _ingesta_seq += 1
+    registro = {
+        "handler":     llamada.nombre,
+        "duracion_ms": round(duracion * 1000, 2),
+        "fin":         time.time(),
+        "traza":       etapas,
+        "pilas":       dict(llamada.pilas.most_common(20)),
+    }
+    if len(_ingesta_lentas) < _ingesta_top:
+        heapq.heappush(_ingesta_lentas, (duracion, _ingesta_seq, registro))
+    else:
+        heapq.heapreplace(_ingesta_lentas, (duracion, _ingesta_seq, registro))
+
+
+def ingesta_lentas() -> dict:
+    activo = bool(_ingesta_hasta) and time.monotonic() <= _ingesta_hasta
+    return {
+        "activo":   activo,
+        "restante": round(max(0.0, _ingesta_hasta - time.monotonic()), 1) if activo else 0,
+        "llamadas": [r for _d, _s, r in sorted(_ingesta_lentas, reverse=True)],
+    }
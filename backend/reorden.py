@@ -0,0 +1,200 @@
+"""
+reorden.py
+- Tiempo de evento: cada lectura se sella con el "ts" del ESP32 (+ offset configurable por
+  desfase de reloj), no con la hora de procesamiento; sin "ts" epoch se usa la hora de llegada
+- Buffer de reorden por (topic, dispositivo): heap por tiempo de evento + marca de agua
+    · se libera en orden todo lo que quede REORDEN_RETRASO_MS por detrás del evento más nuevo,
+      o que lleve ese mismo tiempo esperando (un dispositivo callado no frena su cola)
+    · lo liberado junto forma un lote que un worker por dispositivo procesa en serie:
+      persistencia y alertas ven la serie en orden, sin carreras entre tareas
+- Llegadas por detrás de la marca de agua → tardías (sólo se guardan, con su hora de evento)
+- Eventos del futuro o demasiado viejos → descartados
+- Métricas: tardíos, descartados por motivo, espera en el buffer y retraso de la marca de agua
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from datetime import datetime, timedelta
+
+from logs import obtener
+from metricas import Contador, Histograma, Medidor, MQTT_TARDIOS
+
+REORDEN_RETRASO_MS = int(os.environ.get("REORDEN_RETRASO_MS", "1000"))       # 0 = sin espera
+REORDEN_TICK       = float(os.environ.get("REORDEN_TICK", "0.25"))           # s
+REORDEN_MAX        = int(os.environ.get("REORDEN_MAX", "600"))               # pendientes por dispositivo
+REORDEN_FUTURO_MS  = int(os.environ.get("REORDEN_FUTURO_MS", "300000"))      # 5 min por delante del servidor
+REORDEN_VIEJO_MS   = int(os.environ.get("REORDEN_VIEJO_MS", "86400000"))     # 24 h por detrás
+
+EVENTO_OFFSET_MS   = int(os.environ.get("EVENTO_OFFSET_MS", "0"))
+# Desfase por dispositivo: "cama01=-1500,cama02=300" (ms que se suman a su "ts")
+EVENTO_OFFSET_DISPOSITIVOS = os.environ.get("EVENTO_OFFSET_DISPOSITIVOS", "")
+
+EN_ORDEN, TARDIO, DESCARTADO = "en_orden", "tardio", "descartado"
+
+log = obtener("reorden")
+
+DESCARTADOS = Contador("reorden_descartados_total", "Lecturas descartadas por tiempo de evento inválido",
+                       ("topic", "motivo"))
+ESPERA      = Histograma("reorden_espera_segundos", "Tiempo de una lectura en el buffer de reorden")
+LAG_MARCA   = Histograma("reorden_lag_marca_segundos", "Retraso de la marca de agua respecto al reloj al liberar",
+                         buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0))
+
+
+def _parsear_offsets(texto: str) -> dict[str, int]:
+    offsets = {}
+    for par in texto.split(","):
+        dispositivo, _, ms = par.partition("=")
+        try:
+            offsets[dispositivo.strip()] = int(ms)
+        except ValueError:
+            continue
+    return offsets
+
+
+_offsets = _parsear_offsets(EVENTO_OFFSET_DISPOSITIVOS)
+
+
+def ts_evento(payload: dict, dispositivo: str, llegada_ms: int) -> int:
+    """Tiempo de evento en ms epoch: "ts" del dispositivo corregido por su offset, o la llegada."""
+    ts = payload.get("ts")
+    if isinstance(ts, bool) or not isinstance(ts, (int, float)) or ts <= 1e9:
+        return llegada_ms
+    ms = int(ts if ts > 1e12 else ts * 1000)
+    return ms + _offsets.get(dispositivo, EVENTO_OFFSET_MS)
+
+
+def hora_local(ts_ms: int) -> datetime:
+    """datetime naive en UTC-5, como el resto de timestamps de la BD."""
+    return datetime.utcfromtimestamp(ts_ms / 1000) - timedelta(hours=5)
+
+
+class Mensaje:
+    __slots__ = ("topic", "payload", "dispositivo", "seq", "ts_ms", "llegada_ms", "tardio", "traza", "espera")
+
+    def __init__(self, topic: str, payload: dict, dispositivo: str, seq: int | None, traza=None):
+        self.topic       = topic
+        self.payload     = payload
+        self.dispositivo = dispositivo
+        self.seq         = seq
+        self.llegada_ms  = int(time.time() * 1000)
+        self.ts_ms       = ts_evento(payload, dispositivo, self.llegada_ms)
+        self.tardio      = False
+        self.traza       = traza
+        self.espera      = None
+
+    @property
+    def evento(self) -> datetime:
+        return hora_local(self.ts_ms)
+
+    @property
+    def t(self) -> float:
+        """Tiempo de evento en segundos (para filtros y estimadores)."""
+        return self.ts_ms / 1000
+
+    @property
+    def origen(self) -> tuple:
+        return self.dispositivo, self.seq
+
+
+class _Flujo:
+    __slots__ = ("heap", "maxima", "marca", "cola", "worker")
+
+    def __init__(self):
+        self.heap: list = []
+        self.maxima = 0          # evento más nuevo recibido
+        self.marca  = 0          # marca de agua: evento más nuevo ya liberado
+        self.cola   = asyncio.Queue()
+        self.worker = None
+
+
+class Reordenador:
+    def __init__(self, procesar, retraso_ms: int = REORDEN_RETRASO_MS):
+        self.procesar   = procesar        # async (lote: list[Mensaje]) -> None
+        self.retraso_ms = retraso_ms
+        self._flujos: dict[tuple[str, str], _Flujo] = {}
+        self._orden     = itertools.count()
+
+    def _flujo(self, msg: Mensaje) -> _Flujo:
+        flujo = self._flujos.get((msg.topic, msg.dispositivo))
+        if flujo is None:
+            flujo = self._flujos[(msg.topic, msg.dispositivo)] = _Flujo()
+            flujo.worker = asyncio.create_task(self._trabajar(flujo))
+        return flujo
+
+    def agregar(self, msg: Mensaje) -> str:
+        ahora_ms = int(time.time() * 1000)
+        if msg.ts_ms - ahora_ms > REORDEN_FUTURO_MS:
+            DESCARTADOS.de(msg.topic, "futuro").inc()
+            return DESCARTADO
+        if ahora_ms - msg.ts_ms > REORDEN_VIEJO_MS:
+            DESCARTADOS.de(msg.topic, "viejo").inc()
+            return DESCARTADO
+
+        flujo = self._flujo(msg)
+        if msg.ts_ms <= flujo.marca:
+            msg.tardio = True
+            MQTT_TARDIOS.de(msg.topic).inc()
+            flujo.cola.put_nowait([msg])
+            return TARDIO
+
+        msg.espera = msg.traza.span("reorden") if msg.traza else None
+        heapq.heappush(flujo.heap, (msg.ts_ms, next(self._orden), msg))
+        flujo.maxima = max(flujo.maxima, msg.ts_ms)
+        self._liberar(flujo, ahora_ms, forzar=len(flujo.heap) - REORDEN_MAX)
+        return EN_ORDEN
+
+    def _liberar(self, flujo: _Flujo, ahora_ms: int, forzar: int = 0):
+        limite = flujo.maxima - self.retraso_ms
+        lote = []
+        while flujo.heap:
+            ts_ms, _, msg = flujo.heap[0]
+            if not (forzar > 0 or ts_ms <= limite or ahora_ms - msg.llegada_ms >= self.retraso_ms):
+                break
+            heapq.heappop(flujo.heap)
+            forzar -= 1
+            flujo.marca = max(flujo.marca, ts_ms)
+            ESPERA.observe((ahora_ms - msg.llegada_ms) / 1000)
+            if msg.espera:
+                msg.espera.cerrar()
+            lote.append(msg)
+        if lote:
+            LAG_MARCA.observe(max(0, ahora_ms - flujo.marca) / 1000)
+            flujo.cola.put_nowait(lote)
+
+    async def correr(self):
+        """Tick: libera lo que ya esperó REORDEN_RETRASO_MS aunque no lleguen lecturas nuevas."""
+        while True:
+            await asyncio.sleep(REORDEN_TICK)
+            ahora_ms = int(time.time() * 1000)
+            for flujo in self._flujos.values():
+                if flujo.heap:
+                    self._liberar(flujo, ahora_ms)
+
+    async def _trabajar(self, flujo: _Flujo):
+        while True:
+            lote = await flujo.cola.get()
+            try:
+                await self.procesar(lote)
+            except Exception:
+                log.exception("❌ Error procesando lote de %s lecturas", len(lote))
+
+    def pendientes(self) -> int:
+        return sum(len(f.heap) + f.cola.qsize() for f in self._flujos.values())
+
+    def marcas(self) -> dict:
+        return {f"{t}|{d}": f.marca for (t, d), f in self._flujos.items()}
+
+
+_reordenadores: list[Reordenador] = []
+
+
+def registrar(reordenador: Reordenador) -> Reordenador:
+    _reordenadores.append(reordenador)
+    return reordenador
+
+
+Medidor("reorden_pendientes", "Lecturas en buffers de reorden o esperando a su worker",
+        funcion=lambda: sum(r.pendientes() for r in _reordenadores))
@@ -0,0 +1,134 @@
+"""
+sala.py
+- Vista de sala (central de enfermería): el estado actual de todas las camas monitoreadas en un
+  solo payload compacto, armado en memoria (sin BD) — GET /sala y WebSocket /ws/sala
+- Una cama = un dispositivo (ESP32); cada fila es una lista en el orden de CAMPOS:
+  peso (ml enteros), bomba, estado del suero, FC, SpO2, estado de vitales, nivel de alerta
+  (ciclo_alertas), minutos hasta el nivel crítico (estimador de goteo) y si sigue con señal
+- Los handlers MQTT actualizan la fila de su cama en O(1) y la marcan como cambiada sólo si algún
+  campo visible cambió (por eso peso y minutos van redondeados)
+- Cada SALA_TICK s una tarea junta las filas cambiadas en un único delta {v, camas: [...]},
+  serializado una vez para todos los clientes; sin cambios no se envía nada. El costo por
+  lectura no depende del número de camas, y el del tick, de las camas que cambiaron
+- v crece con cada delta: el cliente aplica los deltas con v mayor que el de su instantánea
+"""
+
+import asyncio
+import os
+import time
+
+import ciclo_alertas
+import idempotencia
+from logs import obtener
+from metricas import Histograma, Medidor
+
+SALA_TICK       = float(os.environ.get("SALA_TICK", "1"))           # s entre deltas
+SALA_SIN_SENAL  = float(os.environ.get("SALA_SIN_SENAL", "30"))     # s sin lecturas → cama sin señal
+
+CAMPOS = ("cama", "paciente_id", "peso", "bomba", "estado_suero", "fc", "spo2", "estado_vitales",
+          "alerta", "min_vacio", "senal")
+(_CAMA, _PACIENTE, _PESO, _BOMBA, _ESTADO_SUERO, _FC, _SPO2, _ESTADO_VITALES,
+ _ALERTA, _MIN_VACIO, _SENAL) = range(len(CAMPOS))
+
+log = obtener("sala")
+
+TICK = Histograma("sala_tick_segundos", "Armado y envío de un delta de la vista de sala")
+
+
+def cama_de(payload: dict) -> str:
+    """Identificador de la cama de un mensaje MQTT: el dispositivo que lo publicó."""
+    return str(payload.get("dispositivo") or idempotencia.DISPOSITIVO_DEFECTO)
+
+
+class _Cama:
+    __slots__ = ("fila", "visto")
+
+    def __init__(self, cama: str):
+        self.fila  = [cama, None, None, False, "ESPERANDO", 0, 0, "MIDIENDO", None, None, True]
+        self.visto = time.monotonic()
+
+
+class Tablero:
+    def __init__(self):
+        self._camas: dict[str, _Cama] = {}
+        self._cambiadas: set[str] = set()
+        self._version_alertas = -1
+        self.v = 0
+
+    def _cama(self, cama: str, paciente_id: int | None) -> _Cama:
+        estado = self._camas.get(cama)
+        if estado is None:
+            estado = self._camas[cama] = _Cama(cama)
+        estado.visto = time.monotonic()
+        fila = estado.fila
+        if fila[_PACIENTE] != paciente_id or not fila[_SENAL]:
+            fila[_PACIENTE] = paciente_id
+            fila[_ALERTA]   = ciclo_alertas.nivel(paciente_id)
+            fila[_SENAL]    = True
+            self._cambiadas.add(cama)
+        return estado
+
+    def _fijar(self, cama: str, fila: list, indice: int, valor):
+        if fila[indice] != valor:
+            fila[indice] = valor
+            self._cambiadas.add(cama)
+
+    # ── Actualizaciones (handlers MQTT) ──────────────────────
+    def suero(self, cama: str, paciente_id: int | None, peso: float, bomba: bool, estado: str,
+              min_hasta_critico: float | None):
+        fila = self._cama(cama, paciente_id).fila
+        self._fijar(cama, fila, _PESO, round(peso))
+        self._fijar(cama, fila, _BOMBA, bool(bomba))
+        self._fijar(cama, fila, _ESTADO_SUERO, estado)
+        self._fijar(cama, fila, _MIN_VACIO, round(min_hasta_critico) if min_hasta_critico is not None else None)
+
+    def vitales(self, cama: str, paciente_id: int | None, fc: int, spo2: int, estado: str):
+        fila = self._cama(cama, paciente_id).fila
+        self._fijar(cama, fila, _FC, fc)
+        self._fijar(cama, fila, _SPO2, spo2)
+        self._fijar(cama, fila, _ESTADO_VITALES, estado)
+
+    # ── Lectura ──────────────────────────────────────────────
+    def instantanea(self) -> dict:
+        return {"type": "sala", "v": self.v, "tick": SALA_TICK, "campos": CAMPOS,
+                "camas": [estado.fila for estado in self._camas.values()]}
+
+    def delta(self) -> dict | None:
+        """Filas que cambiaron desde el delta anterior (None si ninguna)."""
+        if self._version_alertas != ciclo_alertas.version:
+            self._version_alertas = ciclo_alertas.version
+            for cama, estado in self._camas.items():
+                self._fijar(cama, estado.fila, _ALERTA, ciclo_alertas.nivel(estado.fila[_PACIENTE]))
+        limite = time.monotonic() - SALA_SIN_SENAL
+        for cama, estado in self._camas.items():
+            if estado.fila[_SENAL] and estado.visto < limite:
+                self._fijar(cama, estado.fila, _SENAL, False)
+        if not self._cambiadas:
+            return None
+        self.v += 1
+        filas = [list(self._camas[cama].fila) for cama in self._cambiadas]
+        self._cambiadas.clear()
+        return {"type": "sala_delta", "v": self.v, "camas": filas}
+
+    def camas(self) -> int:
+        return len(self._camas)
+
+
+tablero = Tablero()
+
+
+async def transmitir(enviar):
+    """Tarea del lifespan: cada SALA_TICK s manda el delta (si hay) con enviar(dict) — async."""
+    while True:
+        await asyncio.sleep(SALA_TICK)
+        inicio = time.perf_counter()
+        try:
+            cambios = tablero.delta()
+            if cambios is not None:
+                await enviar(cambios)
+        except Exception:
+            log.exception("❌ Error enviando el delta de sala")
+        TICK.observe(time.perf_counter() - inicio)
+
+
+Medidor("sala_camas", "Camas en la vista de sala", funcion=lambda: tablero.camas())
@@ -0,0 +1,266 @@
+"""
+spool.py
+- Buffer store-and-forward de la ingesta: toda lectura se escribe primero en un log local
+  append-only, segmentado (SPOOL_DIR/000000000001.log, ...), una línea JSON por fila
+- Un reenviador (tarea del lifespan) drena el log a la BD en lotes de SPOOL_LOTE filas,
+  en orden, y guarda un checkpoint (segmento + offset) después de cada commit
+- Si la BD no responde, reintenta con backoff y el log sigue creciendo: al volver la BD
+  el backlog se reenvía en orden a toda velocidad; los segmentos ya confirmados se borran
+- Caída del proceso: al reiniciar se retoma desde el checkpoint (un lote repetido no duplica:
+  el índice único (dispositivo, seq) + INSERT IGNORE lo descarta)
+- Métricas: backlog (filas y bytes), filas reenviadas y tasa de reenvío
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from database import engine
+from logs import obtener
+from metricas import Contador, Medidor, DB_COMMIT
+from models import Suero, Vitales
+
+SPOOL_DIR         = os.environ.get("SPOOL_DIR", "spool")
+SPOOL_SEGMENTO_MB = int(os.environ.get("SPOOL_SEGMENTO_MB", "16"))
+SPOOL_LOTE        = int(os.environ.get("SPOOL_LOTE", "2000"))         # filas por transacción
+SPOOL_INTERVALO   = float(os.environ.get("SPOOL_INTERVALO", "0.2"))   # s; agrupa la ingesta en vivo
+SPOOL_FSYNC       = float(os.environ.get("SPOOL_FSYNC", "1.0"))       # s entre fsync del segmento activo
+
+ESPERA_MIN, ESPERA_MAX = 1.0, 30.0     # backoff con la BD caída
+
+TABLAS = {"suero": Suero.__table__, "vitales": Vitales.__table__}
+
+# Duplicados (dispositivo, seq) que ya estén en la BD se descartan en silencio:
+# reenvío de un lote tras una caída del proceso, o redelivery fuera de la ventana en memoria
+_INSERTAR = {
+    nombre: insert(tabla).prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite")
+    for nombre, tabla in TABLAS.items()
+}
+
+log = obtener("spool")
+
+REENVIADOS = Contador("spool_reenviados_total", "Filas reenviadas del spool a la BD", ("tabla",))
+for _tabla in TABLAS:
+    REENVIADOS.de(_tabla)
+
+
+def _serializar(valor):
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    raise TypeError(type(valor))
+
+
+class Spool:
+    def __init__(self, directorio: str, segmento_max: int = SPOOL_SEGMENTO_MB * 1024 * 1024):
+        os.makedirs(directorio, exist_ok=True)
+        self.dir          = directorio
+        self.segmento_max = segmento_max
+        self.cp_segmento, self.cp_offset = self._leer_checkpoint()
+
+        segmentos = self._segmentos()
+        self.seg_escritura = max(segmentos[-1] if segmentos else 1, self.cp_segmento)
+        self._archivo      = open(self._ruta(self.seg_escritura), "ab")
+        self._sin_fsync    = False
+        self._ultimo_fsync = time.monotonic()
+
+        self.pendientes = self._contar_pendientes()
+        self.tasa       = 0.0          # filas/s del último lote reenviado
+        self.bd_ok      = True
+        self._hay_datos = asyncio.Event()
+        if self.pendientes:
+            log.warning("📼 Spool con %s filas pendientes de una ejecución anterior", self.pendientes)
+
+    # ── Archivos ─────────────────────────────────────────────
+    def _ruta(self, segmento: int) -> str:
+        return os.path.join(self.dir, f"{segmento:012d}.log")
+
+    def _segmentos(self) -> list[int]:
+        return sorted(int(f[:-4]) for f in os.listdir(self.dir) if f.endswith(".log") and f[:-4].isdigit())
+
+    def _leer_checkpoint(self) -> tuple[int, int]:
+        try:
+            with open(os.path.join(self.dir, "checkpoint.json"), encoding="utf-8") as f:
+                cp = json.load(f)
+            return cp["segmento"], cp["offset"]
+        except FileNotFoundError:
+            segmentos = self._segmentos()
+            return (segmentos[0] if segmentos else 1), 0
+
+    def _guardar_checkpoint(self, segmento: int, offset: int):
+        tmp = os.path.join(self.dir, "checkpoint.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"segmento": segmento, "offset": offset}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.dir, "checkpoint.json"))
+        for viejo in self._segmentos():
+            if viejo >= segmento:
+                break
+            os.remove(self._ruta(viejo))
+
+    def _contar_pendientes(self) -> int:
+        total = 0
+        for segmento in self._segmentos():
+            if segmento < self.cp_segmento:
+                continue
+            with open(self._ruta(segmento), "rb") as f:
+                if segmento == self.cp_segmento:
+                    f.seek(self.cp_offset)
+                total += sum(1 for _ in f)
+        return total
+
+    def backlog_bytes(self) -> int:
+        total = 0
+        for segmento in self._segmentos():
+            if segmento >= self.cp_segmento:
+                total += os.path.getsize(self._ruta(segmento))
+        return max(0, total - self.cp_offset)
+
+    # ── Escritura (event loop) ───────────────────────────────
+    def agregar(self, tabla: str, fila: dict):
+        linea = json.dumps({"t": tabla, "d": fila}, default=_serializar, separators=(",", ":"))
+        self._archivo.write(linea.encode() + b"\n")
+        self._archivo.flush()
+        self._sin_fsync = True
+        self.pendientes += 1
+        if self._archivo.tell() >= self.segmento_max:
+            self._rotar()
+        self._hay_datos.set()
+
+    def _rotar(self):
+        os.fsync(self._archivo.fileno())
+        self._archivo.close()
+        self.seg_escritura += 1
+        self._archivo = open(self._ruta(self.seg_escritura), "ab")
+
+    async def _sincronizar(self):
+        if self._sin_fsync and time.monotonic() - self._ultimo_fsync >= SPOOL_FSYNC:
+            self._sin_fsync, self._ultimo_fsync = False, time.monotonic()
+            await asyncio.to_thread(os.fsync, self._archivo.fileno())
+
+    # ── Lectura + reenvío (hilo aparte) ──────────────────────
+    def _leer(self, maximo: int) -> tuple[list, int, int]:
+        registros, segmento, offset = [], self.cp_segmento, self.cp_offset
+        while len(registros) < maximo:
+            try:
+                f = open(self._ruta(segmento), "rb")
+            except FileNotFoundError:
+                if segmento >= self.seg_escritura:
+                    break
+                segmento, offset = segmento + 1, 0
+                continue
+            with f:
+                f.seek(offset)
+                for linea in f:
+                    if not linea.endswith(b"\n"):      # escritura en curso
+                        break
+                    registros.append(json.loads(linea))
+                    offset += len(linea)
+                    if len(registros) >= maximo:
+                        break
+            if len(registros) >= maximo or segmento >= self.seg_escritura:
+                break
+            segmento, offset = segmento + 1, 0
+        return registros, segmento, offset
+
+    def _reenviar_lote(self) -> int:
+        registros, segmento, offset = self._leer(SPOOL_LOTE)
+        if not registros:
+            return 0
+        por_tabla = {tabla: [] for tabla in TABLAS}
+        for r in registros:
+            fila = r["d"]
+            fila["timestamp"] = datetime.fromisoformat(fila["timestamp"])
+            por_tabla[r["t"]].append(fila)
+
+        with DB_COMMIT.de("spool_lote").medir(), engine.begin() as conn:
+            for tabla, filas in por_tabla.items():
+                if filas:
+                    conn.execute(_INSERTAR[tabla], filas)
+        self._guardar_checkpoint(segmento, offset)
+        self.cp_segmento, self.cp_offset = segmento, offset
+        for tabla, filas in por_tabla.items():
+            REENVIADOS.de(tabla).inc(len(filas))
+        return len(registros)
+
+    async def reenviar(self):
+        espera = ESPERA_MIN
+        while True:
+            await self._sincronizar()
+            if self.pendientes <= 0:
+                self._hay_datos.clear()
+                try:
+                    await asyncio.wait_for(self._hay_datos.wait(), SPOOL_FSYNC)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            inicio = time.perf_counter()
+            try:
+                n = await asyncio.to_thread(self._reenviar_lote)
+            except Exception as e:
+                if self.bd_ok:
+                    log.error("❌ BD no disponible — lecturas retenidas en el spool: %s", e)
+                self.bd_ok = False
+                await asyncio.sleep(espera)
+                espera = min(espera * 2, ESPERA_MAX)
+                continue
+
+            if not self.bd_ok:
+                log.info("✅ BD recuperada — reenviando %s filas del spool", self.pendientes)
+                self.bd_ok = True
+            espera = ESPERA_MIN
+            if n == 0:
+                self.pendientes = 0
+                continue
+            self.pendientes -= n
+            self.tasa = n / max(time.perf_counter() - inicio, 1e-6)
+            if n < SPOOL_LOTE:
+                await asyncio.sleep(SPOOL_INTERVALO)      # en vivo: juntar filas para el próximo lote
+
+    def estado(self) -> dict:
+        return {
+            "pendientes":    self.pendientes,
+            "backlog_bytes": self.backlog_bytes(),
+            "tasa_reenvio":  round(self.tasa, 1),
+            "bd_ok":         self.bd_ok,
+            "segmentos":     len(self._segmentos()),
+        }
+
+    def cerrar(self):
+        self._archivo.flush()
+        os.fsync(self._archivo.fileno())
+        self._archivo.close()
+
+
+# ══════════════════════════════════════════════════════════════
+#  API
+# ══════════════════════════════════════════════════════════════
+_spool: Spool | None = None
+
+
+def obtener_spool() -> Spool:
+    global _spool
+    if _spool is None:
+        _spool = Spool(SPOOL_DIR)
+    return _spool
+
+
+def agregar(tabla: str, fila: dict):
+    obtener_spool().agregar(tabla, fila)
+
+
+async def reenviar():
+    await obtener_spool().reenviar()
+
+
+Medidor("spool_backlog_filas", "Filas en el spool pendientes de llegar a la BD",
+        funcion=lambda: _spool.pendientes if _spool else 0)
+Medidor("spool_backlog_bytes", "Bytes del spool pendientes de llegar a la BD",
+        funcion=lambda: _spool.backlog_bytes() if _spool else 0)
+Medidor("spool_tasa_reenvio", "Filas/s del último lote reenviado",
+        funcion=lambda: _spool.tasa if _spool else 0)
@@ -4,31 +4,64 @@ telegram_bot.py
 - Los botones de bomba SOLO aparecen en alertas de suero
 - Link directo al dashboard en Vercel (no JSON)
 - Polling para escuchar botones presionados por el médico
+- Anti-spam compartido por chat: como mucho un mensaje cada INTERVALO_TELEGRAM s, sumando alertas
+  en vivo y escalados (las alertas en vivo dentro del intervalo se descartan; los escalados esperan turno)
+- aiohttp se importa al primer envío / al iniciar el polling: sin token no se carga
 """
 
 import os
 import asyncio
-import aiohttp
+import time
+
+from logs import obtener
+from metricas import NOTIFICACION, NOTIFICACION_FALLOS
 
 TELEGRAM_TOKEN   = os.environ.get("TELEGRAM_TOKEN", "")
 TELEGRAM_CHAT_ID = os.environ.get("TELEGRAM_CHAT_ID", "")
 BACKEND_URL   = os.environ.get("BACKEND_URL", "https://proyecto-monitoreo-posta-medica-production.up.railway.app")
 DASHBOARD_URL = "https://proyecto-monitoreo-posta-medica.vercel.app"
 TELEGRAM_URL  = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}"
+INTERVALO_TELEGRAM = float(os.environ.get("INTERVALO_TELEGRAM", "5"))   # s mínimos entre mensajes a un chat
+
+log = obtener("telegram")
+
+TIPOS_CON_BOTONES = {"SUERO_CRITICO", "SUERO_BAJO", "SUERO_PREDICTIVO", "BOMBA_ON"}
+
+_turno: dict[str, float] = {}    # chat_id → monotonic desde el que puede salir el próximo mensaje
+
+
+# ── Anti-spam ──────────────────────────────────────────────────
+def turno_restante(chat_id: str | None = None) -> float:
+    """Segundos hasta que el chat acepte otro mensaje (0 = ya)."""
+    return max(0.0, _turno.get(chat_id or TELEGRAM_CHAT_ID, 0.0) - time.monotonic())
 
-TIPOS_CON_BOTONES = {"SUERO_CRITICO", "SUERO_BAJO", "BOMBA_ON"}
+
+def ocupar_turno(chat_id: str | None = None):
+    """Un mensaje sale ahora: el siguiente al mismo chat espera INTERVALO_TELEGRAM s."""
+    chat_id = chat_id or TELEGRAM_CHAT_ID
+    _turno[chat_id] = max(time.monotonic(), _turno.get(chat_id, 0.0)) + INTERVALO_TELEGRAM
+
+
+async def esperar_turno(chat_id: str | None = None):
+    """Reserva el próximo turno libre del chat y duerme hasta él (los escalados se encolan)."""
+    chat_id = chat_id or TELEGRAM_CHAT_ID
+    ahora   = time.monotonic()
+    sale    = max(ahora, _turno.get(chat_id, 0.0))
+    _turno[chat_id] = sale + INTERVALO_TELEGRAM
+    await asyncio.sleep(sale - ahora)
 
 
 # ── Enviar mensaje ─────────────────────────────────────────────
-async def enviar_alerta(mensaje: str, tipos_alerta: set = None):
-    if not TELEGRAM_TOKEN or not TELEGRAM_CHAT_ID:
-        print("⚠️ Telegram no configurado")
+async def enviar_alerta(mensaje: str, tipos_alerta: set = None, chat_id: str | None = None):
+    chat_id = chat_id or TELEGRAM_CHAT_ID
+    if not TELEGRAM_TOKEN or not chat_id:
+        log.warning("⚠️ Telegram no configurado")
         return
 
     es_suero = bool(tipos_alerta and tipos_alerta & TIPOS_CON_BOTONES)
 
     payload_msg = {
-        "chat_id":    TELEGRAM_CHAT_ID,
+        "chat_id":    chat_id,
         "text":       mensaje,
         "parse_mode": "HTML",
     }
@@ -52,16 +85,26 @@ async def enviar_alerta(mensaje: str, tipos_alerta: set = None):
             ]]
         }
 
+    import aiohttp
+
+    inicio = time.perf_counter()
     try:
         async with aiohttp.ClientSession() as session:
-            await session.post(f"{TELEGRAM_URL}/sendMessage", json=payload_msg)
-            print(f"📱 Telegram enviado {'con botones bomba ✅' if es_suero else 'sin botones'}")
+            res = await session.post(f"{TELEGRAM_URL}/sendMessage", json=payload_msg)
+            if res.status >= 400:
+                NOTIFICACION_FALLOS.de("telegram").inc()
+            log.info("📱 Telegram enviado %s", "con botones bomba ✅" if es_suero else "sin botones")
     except Exception as e:
-        print(f"❌ Error Telegram enviar: {e}")
+        NOTIFICACION_FALLOS.de("telegram").inc()
+        log.error("❌ Error Telegram enviar: %s", e)
+    finally:
+        NOTIFICACION.de("telegram").observe(time.perf_counter() - inicio)
 
 
 # ── Responder al callback ──────────────────────────────────────
 async def responder_callback(callback_query_id: str, texto: str):
+    import aiohttp
+
     try:
         async with aiohttp.ClientSession() as session:
             await session.post(f"{TELEGRAM_URL}/answerCallbackQuery", json={
@@ -70,11 +113,13 @@ async def responder_callback(callback_query_id: str, texto: str):
                 "show_alert":        False,
             })
     except Exception as e:
-        print(f"❌ Error Telegram callback: {e}")
+        log.error("❌ Error Telegram callback: %s", e)
 
 
 # ── Enviar comando al backend ──────────────────────────────────
 async def ejecutar_comando(cmd: str):
+    import aiohttp
+
     try:
         async with aiohttp.ClientSession() as session:
             res = await session.post(
@@ -83,21 +128,22 @@ async def ejecutar_comando(cmd: str):
                 headers={"Content-Type": "application/json"},
             )
             data = await res.json()
-            print(f"📤 Comando {cmd} enviado → {data}")
+            log.info("📤 Comando %s enviado → %s", cmd, data)
             return True
     except Exception as e:
-        print(f"❌ Error enviando comando: {e}")
+        log.error("❌ Error enviando comando: %s", e)
         return False
 
 
 # ── Polling ────────────────────────────────────────────────────
 async def polling():
     if not TELEGRAM_TOKEN:
-        print("⚠️ Telegram polling desactivado — sin token")
+        log.warning("⚠️ Telegram polling desactivado — sin token")
         return
+    import aiohttp
 
     offset = 0
-    print("🤖 Telegram polling iniciado")
+    log.info("🤖 Telegram polling iniciado")
 
     while True:
         try:
@@ -120,7 +166,7 @@ async def polling():
                 cb_id   = cb["id"]
                 usuario = cb["from"].get("first_name", "Médico")
 
-                print(f"🎛️ Botón presionado: {cmd} por {usuario}")
+                log.info("🎛️ Botón presionado: %s por %s", cmd, usuario)
 
                 if cmd == "bomba_on":
                     ok = await ejecutar_comando("bomba_on")
@@ -136,7 +182,7 @@ async def polling():
         except asyncio.CancelledError:
             break
         except Exception as e:
-            print(f"❌ Polling error: {e}")
+            log.error("❌ Polling error: %s", e)
             await asyncio.sleep(5)
 
 
@@ -190,6 +236,22 @@ def construir_mensaje(payload: dict, alertas: list, paciente: dict | None = None
             "",
         ]
 
+    if "SPO2_TENDENCIA" in tipos_presentes:
+        lineas += [
+            "📉 <b>SpO2 en descenso sostenido</b>",
+            f"   SpO2 actual: <b>{spo2}%</b>",
+            "   Vigilar evolución antes de que cruce el umbral.",
+            "",
+        ]
+
+    if "FC_TENDENCIA" in tipos_presentes:
+        lineas += [
+            "📈 <b>Cambio sostenido de frecuencia cardíaca</b>",
+            f"   FC actual: <b>{fc} lpm</b>",
+            "   Vigilar evolución.",
+            "",
+        ]
+
     if "SUERO_CRITICO" in tipos_presentes:
         lineas += [
             "💉 <b>Suero IV en nivel CRÍTICO</b>",
@@ -201,7 +263,16 @@ def construir_mensaje(payload: dict, alertas: list, paciente: dict | None = None
         lineas += [
             "💧 <b>Nivel de suero bajo</b>",
             f"   Nivel actual: <b>{peso:.0f} ml</b>",
-            f"   Preparar bolsa de reemplazo.",
+            "   Preparar bolsa de reemplazo.",
+            "",
+        ]
+
+    if "SUERO_PREDICTIVO" in tipos_presentes:
+        minutos = next((a.get("valor") for a in alertas if a.get("tipo") == "SUERO_PREDICTIVO"), None)
+        lineas += [
+            "⏳ <b>Suero llegará a nivel crítico pronto</b>",
+            f"   Tiempo estimado: <b>~{minutos:.0f} min</b>" if minutos is not None else "   Tiempo estimado: --",
+            "   Preparar bolsa de reemplazo.",
             "",
         ]
 
@@ -0,0 +1,241 @@
+"""
+trazas.py
+- Trazas livianas por mensaje MQTT: un span por etapa (decode → filtro → persistir → broadcast → alertas → telegram)
+- Modelo compatible con OpenTelemetry (trace_id 128 bits, span_id 64 bits, tiempos en ns, export OTLP/JSON)
+- La traza viaja en un ContextVar: asyncio.create_task la copia, así las etapas no reciben parámetros extra
+- Exportadores locales: anillo en memoria (GET /trazas/lentas) y archivo JSONL opcional (hilo aparte)
+- El timestamp del ESP32 (campo "ts") permite medir la latencia real sensor → pantalla
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+TRAZAS_ACTIVAS = os.environ.get("TRAZAS_ACTIVAS", "1") == "1"
+TRAZAS_ANILLO  = int(os.environ.get("TRAZAS_ANILLO", "2048"))
+TRAZAS_ARCHIVO = os.environ.get("TRAZAS_ARCHIVO", "")       # ruta JSONL; vacío = sin archivo
+
+SPAN_BROADCAST = "broadcast"
+
+_actual: ContextVar = ContextVar("traza_actual", default=None)
+_anillo: deque = deque(maxlen=TRAZAS_ANILLO)
+
+
+def _ts_dispositivo_ns(ts) -> int | None:
+    """Convierte el "ts" del ESP32 a ns epoch; None si no es un epoch (p.ej. millis() desde el arranque)."""
+    if isinstance(ts, bool) or not isinstance(ts, (int, float)):
+        return None
+    if ts > 1e12:
+        return int(ts * 1_000_000)        # ms epoch
+    if ts > 1e9:
+        return int(ts * 1_000_000_000)    # s epoch
+    return None
+
+
+def _atributos_otlp(atributos: dict) -> list:
+    salida = []
+    for clave, valor in atributos.items():
+        if isinstance(valor, bool):
+            v = {"boolValue": valor}
+        elif isinstance(valor, int):
+            v = {"intValue": str(valor)}
+        elif isinstance(valor, float):
+            v = {"doubleValue": valor}
+        else:
+            v = {"stringValue": str(valor)}
+        salida.append({"key": clave, "value": v})
+    return salida
+
+
+class Span:
+    __slots__ = ("nombre", "span_id", "inicio_ns", "fin_ns")
+
+    def __init__(self, nombre: str):
+        self.nombre    = nombre
+        self.span_id   = os.urandom(8).hex()
+        self.inicio_ns = time.time_ns()
+        self.fin_ns    = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+        return False
+
+    def cerrar(self):
+        """Cierre explícito, para etapas que no caben en un `with` (espera en el buffer de reorden)."""
+        self.fin_ns = time.time_ns()
+
+
+class _SpanNulo:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_SPAN_NULO = _SpanNulo()
+
+
+class Traza:
+    __slots__ = ("trace_id", "raiz_id", "nombre", "inicio_ns", "fin_ns", "ts_dispositivo_ns", "atributos", "spans")
+
+    def __init__(self, nombre: str, ts_dispositivo_ns: int | None, atributos: dict):
+        self.trace_id          = os.urandom(16).hex()
+        self.raiz_id           = os.urandom(8).hex()
+        self.nombre            = nombre
+        self.inicio_ns         = time.time_ns()
+        self.fin_ns            = 0
+        self.ts_dispositivo_ns = ts_dispositivo_ns
+        self.atributos         = atributos
+        self.spans: list[Span] = []
+
+    def fijar_ts_dispositivo(self, ts):
+        self.ts_dispositivo_ns = _ts_dispositivo_ns(ts)
+
+    def span(self, nombre: str) -> Span:
+        s = Span(nombre)
+        self.spans.append(s)
+        return s
+
+    @property
+    def duracion_ms(self) -> float:
+        return ((self.fin_ns or time.time_ns()) - self.inicio_ns) / 1e6
+
+    def latencia_sensor_pantalla_ms(self) -> float | None:
+        if self.ts_dispositivo_ns is None:
+            return None
+        for s in self.spans:
+            if s.nombre == SPAN_BROADCAST and s.fin_ns:
+                return round((s.fin_ns - self.ts_dispositivo_ns) / 1e6, 2)
+        return None
+
+    def a_dict(self) -> dict:
+        return {
+            "trace_id":                  self.trace_id,
+            "nombre":                    self.nombre,
+            "inicio":                    self.inicio_ns / 1e9,
+            "duracion_ms":               round(self.duracion_ms, 2),
+            "latencia_sensor_pantalla_ms": self.latencia_sensor_pantalla_ms(),
+            "atributos":                 self.atributos,
+            "etapas": [
+                {
+                    "nombre":      s.nombre,
+                    "offset_ms":   round((s.inicio_ns - self.inicio_ns) / 1e6, 2),
+                    "duracion_ms": round(((s.fin_ns or s.inicio_ns) - s.inicio_ns) / 1e6, 2),
+                }
+                for s in self.spans
+            ],
+        }
+
+    def a_otlp(self) -> list[dict]:
+        """Spans en el formato JSON de OTLP (resourceSpans → scopeSpans → spans)."""
+        raiz = {
+            "traceId":           self.trace_id,
+            "spanId":            self.raiz_id,
+            "name":              self.nombre,
+            "startTimeUnixNano": str(self.inicio_ns),
+            "endTimeUnixNano":   str(self.fin_ns),
+            "attributes":        _atributos_otlp({**self.atributos,
+                                                  "latencia_sensor_pantalla_ms": self.latencia_sensor_pantalla_ms()}
+                                                 if self.ts_dispositivo_ns else self.atributos),
+        }
+        hijos = [
+            {
+                "traceId":           self.trace_id,
+                "spanId":            s.span_id,
+                "parentSpanId":      self.raiz_id,
+                "name":              s.nombre,
+                "startTimeUnixNano": str(s.inicio_ns),
+                "endTimeUnixNano":   str(s.fin_ns),
+            }
+            for s in self.spans
+        ]
+        return [raiz, *hijos]
+
+
+# ── Exportador a archivo (hilo aparte, nunca bloquea el loop) ─
+class _ExportadorArchivo:
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self.cola = queue.SimpleQueue()
+        threading.Thread(target=self._escribir, name="trazas-export", daemon=True).start()
+
+    def exportar(self, traza: Traza):
+        self.cola.put(traza)
+
+    def _escribir(self):
+        with open(self.ruta, "a", encoding="utf-8") as f:
+            while True:
+                traza = self.cola.get()
+                linea = {"resourceSpans": [{
+                    "resource":   {"attributes": _atributos_otlp({"service.name": "monitor-posta"})},
+                    "scopeSpans": [{"scope": {"name": "trazas"}, "spans": traza.a_otlp()}],
+                }]}
+                f.write(json.dumps(linea) + "\n")
+                if self.cola.empty():
+                    f.flush()
+
+
+_exportador = _ExportadorArchivo(TRAZAS_ARCHIVO) if TRAZAS_ACTIVAS and TRAZAS_ARCHIVO else None
+
+
+# ══════════════════════════════════════════════════════════════
+#  API
+# ══════════════════════════════════════════════════════════════
+def iniciar(nombre: str, ts_dispositivo=None, **atributos) -> Traza | None:
+    """Abre una traza y la deja como actual en el contexto (la heredan las tareas creadas después)."""
+    if not TRAZAS_ACTIVAS:
+        return None
+    traza = Traza(nombre, _ts_dispositivo_ns(ts_dispositivo), atributos)
+    _actual.set(traza)
+    return traza
+
+
+def actual() -> Traza | None:
+    return _actual.get()
+
+
+def span(nombre: str):
+    """Span de la etapa `nombre` en la traza actual; no-op si no hay traza."""
+    traza = _actual.get()
+    if traza is None:
+        return _SPAN_NULO
+    return traza.span(nombre)
+
+
+def reanudar(traza: Traza | None):
+    """Vuelve a dejar como actual una traza que se soltó antes (la retoma el worker que la procesa)."""
+    _actual.set(traza)
+
+
+def soltar():
+    """Quita la traza del contexto actual sin cerrarla (ya la lleva la tarea que la procesa)."""
+    _actual.set(None)
+
+
+def finalizar():
+    """Cierra la traza actual y la envía a los exportadores."""
+    traza = _actual.get()
+    if traza is None or traza.fin_ns:
+        return
+    traza.fin_ns = time.time_ns()
+    _actual.set(None)
+    _anillo.append(traza)
+    if _exportador:
+        _exportador.exportar(traza)
+
+
+def lentas(limit: int = 20, nombre: str | None = None) -> list[dict]:
+    """Las `limit` trazas más lentas del anillo (opcionalmente filtradas por nombre)."""
+    candidatas = [t for t in list(_anillo) if nombre is None or t.nombre == nombre]
+    candidatas.sort(key=lambda t: t.fin_ns - t.inicio_ns, reverse=True)
+    return [t.a_dict() for t in candidatas[:limit]]